@@ -1,6 +1,9 @@
 from django.contrib import admin
 from django.contrib.auth.admin import UserAdmin as BaseUserAdmin
 from core.models.custom_user import AccountUser
+from core.models.outbox_email import OutboxEmail
+from core.models.photo_blob import PhotoBlob
+from core.models.photo_job import PhotoJob
 
 
 class AccountUserAdmin(BaseUserAdmin):
@@ -32,3 +35,23 @@ class AccountUserAdmin(BaseUserAdmin):
 
 admin.site.register(AccountUser, AccountUserAdmin)
 
+
+@admin.register(PhotoJob)
+class PhotoJobAdmin(admin.ModelAdmin):
+    list_display = ['job_id', 'content_type', 'object_id', 'status', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['created_at', 'started_at', 'finished_at']
+
+
+@admin.register(PhotoBlob)
+class PhotoBlobAdmin(admin.ModelAdmin):
+    list_display = ['name', 'ref_count', 'released_at']
+    readonly_fields = ['name', 'ref_count', 'released_at']
+
+
+@admin.register(OutboxEmail)
+class OutboxEmailAdmin(admin.ModelAdmin):
+    list_display = ['subject', 'status', 'attempts', 'created_at', 'next_attempt_at', 'sent_at']
+    list_filter = ['status']
+    search_fields = ['subject']
+    readonly_fields = ['created_at', 'claimed_at', 'sent_at']
@@ -3,3 +3,8 @@ from django.apps import AppConfig
 
 class CoreConfig(AppConfig):
     name = 'core'
+
+    def ready(self):
+        import core.checks
+        import core.services.photo_job_service
+        import core.services.user_cache_service
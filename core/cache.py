@@ -0,0 +1,32 @@
+import os
+import tempfile
+
+from django.core.cache.backends import filebased
+from django.core.cache.backends.base import DEFAULT_TIMEOUT
+
+
+class FileBasedCache(filebased.FileBasedCache):
+    '''
+    Django's file cache with an add() that is atomic across processes.
+
+    The stock add() checks for the key and then writes it, so two processes
+    can both succeed. Here the entry is written to a temporary file and
+    hard linked into place, which fails if another add() got there first.
+    '''
+
+    def add(self, key, value, timeout=DEFAULT_TIMEOUT, version=None):
+        if self.has_key(key, version):
+            return False
+        self._createdir()
+        fname = self._key_to_file(key, version)
+        self._cull()
+        fd, tmp_path = tempfile.mkstemp(dir=self._dir)
+        try:
+            with open(fd, 'wb') as f:
+                self._write_content(f, timeout, value)
+            os.link(tmp_path, fname)
+        except FileExistsError:
+            return False
+        finally:
+            os.remove(tmp_path)
+        return True
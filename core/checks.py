@@ -0,0 +1,25 @@
+from django.core.cache import caches
+from django.core.cache.backends.locmem import LocMemCache
+from django.core.checks import Error, Tags, register
+
+
+@register(Tags.caches)
+def check_shared_cache(app_configs, **kwargs):
+    """
+    Require a default cache that every process shares
+
+    Sessions, the logged in user and the students a parent may access are
+    cached and dropped from the cache when they change. With a per-process
+    cache the other processes keep serving the old value, so a revoked
+    relationship or a changed password would still be honoured there.
+    """
+    if isinstance(caches['default'], LocMemCache):
+        return [Error(
+            "The default cache is local to each process, so cached sessions, users and "
+            "student access are not invalidated in the other processes.",
+            hint="Point CACHES['default'] at a cache all processes share "
+                 "(core.cache.FileBasedCache on one host, Redis or Memcached on several).",
+            obj='CACHES',
+            id='core.E001',
+        )]
+    return []
@@ -0,0 +1,57 @@
+from django.conf import settings
+from django.contrib.auth import hashers
+
+from core.services.password_hash_service import run_hash
+
+
+class PooledHasherMixin:
+    '''
+    Runs a hasher's encode() and verify() on the password hashing thread pool.
+
+    The algorithm names are Django's own, so stored hashes stay readable by
+    the stock hashers and by each other.
+    '''
+
+    def encode(self, password, salt, *args, **kwargs):
+        return run_hash(super().encode, password, salt, *args, **kwargs)
+
+    def verify(self, password, encoded):
+        return run_hash(super().verify, password, encoded)
+
+
+class ScryptPasswordHasher(PooledHasherMixin, hashers.ScryptPasswordHasher):
+    '''
+    Memory-hard scrypt hasher tuned through settings.
+
+    Uses PASSWORD_SCRYPT_WORK_FACTOR, PASSWORD_SCRYPT_BLOCK_SIZE and
+    PASSWORD_SCRYPT_PARALLELISM; hashes made with other values are upgraded
+    the next time their user logs in.
+    '''
+    # Only an upper limit; OpenSSL's default of 32 MiB rules out work factors above 2**14
+    maxmem = 512 * 1024 * 1024
+
+    @property
+    def work_factor(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_WORK_FACTOR', 2**14)
+
+    @property
+    def block_size(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_BLOCK_SIZE', 8)
+
+    @property
+    def parallelism(self):
+        return getattr(settings, 'PASSWORD_SCRYPT_PARALLELISM', 5)
+
+
+class Argon2PasswordHasher(PooledHasherMixin, hashers.Argon2PasswordHasher):
+    '''
+    Memory-hard Argon2id hasher; needs the optional argon2-cffi package.
+    '''
+
+
+class PBKDF2PasswordHasher(PooledHasherMixin, hashers.PBKDF2PasswordHasher):
+    pass
+
+
+class PBKDF2SHA1PasswordHasher(PooledHasherMixin, hashers.PBKDF2SHA1PasswordHasher):
+    pass
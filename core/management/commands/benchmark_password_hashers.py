@@ -0,0 +1,36 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.password_hash_service import benchmark_hashers
+
+
+class Command(BaseCommand):
+    help = 'Measure how many logins per second per core each hasher in settings.PASSWORD_HASHERS can check.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--seconds',
+            type=float,
+            default=2.0,
+            help='How long each measurement runs (default 2).',
+        )
+        parser.add_argument(
+            '--concurrency',
+            type=int,
+            help='Logins checked at once (defaults to settings.PASSWORD_HASH_WORKERS).',
+        )
+
+    def handle(self, *args, **options):
+        if options['seconds'] <= 0:
+            raise CommandError('--seconds must be positive.')
+        if options['concurrency'] is not None and options['concurrency'] < 1:
+            raise CommandError('--concurrency must be at least 1.')
+
+        self.stdout.write(f"{'Hasher':<45} {'ms/login':>9} {'logins/s':>9} {'per core':>9}")
+        for path, result in benchmark_hashers(options['seconds'], options['concurrency']):
+            if result is None:
+                self.stdout.write(f"{path:<45} {'library not installed':>29}")
+                continue
+            self.stdout.write(
+                f"{path:<45} {result['ms_per_login']:>9.1f} "
+                f"{result['per_second']:>9.1f} {result['per_second_per_core']:>9.2f}"
+            )
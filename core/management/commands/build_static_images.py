@@ -0,0 +1,30 @@
+from django.core.management.base import BaseCommand
+
+from core.services.static_image_service import build_static_images, get_static_build_dir
+
+
+class Command(BaseCommand):
+    help = (
+        'Build optimized, content hashed copies of the bundled images (recompressed PNG, '
+        'WebP, AVIF, minified SVG with .gz/.br siblings) and their manifest. '
+        'Run before collectstatic.'
+    )
+
+    def handle(self, *args, **options):
+        manifest = build_static_images()
+
+        before = after = 0
+        for name, entry in sorted(manifest['images'].items()):
+            smallest = min(file['size'] for file in entry['files'].values())
+            before += entry['source_size']
+            after += smallest
+            formats = ', '.join(
+                f"{content_type.split('/')[1].split('+')[0]} {file['size']}"
+                for content_type, file in sorted(entry['files'].items(), key=lambda item: item[1]['size'])
+            )
+            self.stdout.write(f"{name}: {entry['source_size']} -> {formats}")
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Built {len(manifest['images'])} image(s) into {get_static_build_dir()}: "
+            f"{before} -> {after} bytes in the smallest format."
+        ))
@@ -0,0 +1,27 @@
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+
+from core.services.photo_blob_service import collect_photo_garbage
+
+
+class Command(BaseCommand):
+    help = (
+        'Delete profile photo files that no profile has used for the grace period '
+        '(settings.PHOTO_GC_GRACE_SECONDS).'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--grace-seconds',
+            type=int,
+            help='Override the grace period.',
+        )
+
+    def handle(self, *args, **options):
+        grace = options['grace_seconds']
+        if grace is not None and grace < 0:
+            raise CommandError('--grace-seconds must not be negative.')
+
+        deleted = collect_photo_garbage(timedelta(seconds=grace) if grace is not None else None)
+        self.stdout.write(self.style.SUCCESS(f"Deleted {deleted} unused photo file(s)."))
@@ -0,0 +1,54 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import close_old_connections
+
+from core.services.email_outbox_service import deliver_outbox, requeue_stale_emails, seconds_until_next_email
+
+
+class Command(BaseCommand):
+    help = (
+        'Deliver the queued outbox emails that are due, in batches over one mail server connection. '
+        'Emails left SENDING by a worker that died are put back in the queue first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            help='Emails sent per connection (defaults to settings.EMAIL_OUTBOX_BATCH_SIZE).',
+        )
+        parser.add_argument(
+            '--loop',
+            action='store_true',
+            help='Keep running, delivering emails as they come due.',
+        )
+        parser.add_argument(
+            '--interval',
+            type=float,
+            default=5.0,
+            help='With --loop, the most seconds to wait between checks (default 5).',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] is not None and options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        if options['interval'] <= 0:
+            raise CommandError('--interval must be positive.')
+
+        while True:
+            requeued = requeue_stale_emails()
+            if requeued:
+                self.stdout.write(f"Requeued {requeued} stale email(s).")
+
+            counts = deliver_outbox(options['batch_size'])
+            if any(counts.values()) or not options['loop']:
+                self.stdout.write(self.style.SUCCESS(
+                    f"Sent {counts['SENT']} email(s), {counts['PENDING']} to retry, {counts['FAILED']} failed."
+                ))
+            if not options['loop']:
+                return
+
+            wait = seconds_until_next_email()
+            close_old_connections()
+            time.sleep(options['interval'] if wait is None else min(wait, options['interval']))
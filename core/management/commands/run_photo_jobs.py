@@ -0,0 +1,65 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from core.models.photo_job import PhotoJob
+from core.services.photo_job_service import enqueue_photo, requeue_stale_jobs, run_photo_job
+from core.services.photo_worker import init_worker
+from parent.models.parent_profile import ParentProfile
+from student.models.student_profile import StudentProfile
+
+
+class Command(BaseCommand):
+    help = (
+        'Process queued profile photo jobs. Jobs left RUNNING by a worker that died '
+        'are put back in the queue first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes to process photos in (default 1, in-process).',
+        )
+        parser.add_argument(
+            '--backfill',
+            action='store_true',
+            help='First queue a job for every photo uploaded before size variants were built.',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('--workers must be at least 1.')
+
+        if options['backfill']:
+            queued = 0
+            for model in (ParentProfile, StudentProfile):
+                for profile in model.objects.exclude(photo='').exclude(photo__isnull=True).filter(photo_variants={}):
+                    with profile.photo.open('rb'):
+                        enqueue_photo(profile, profile.photo, submit=False)
+                    queued += 1
+            self.stdout.write(f"Queued {queued} photo(s) without variants.")
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        job_ids = list(
+            PhotoJob.objects.filter(status='PENDING').order_by('created_at').values_list('job_id', flat=True)
+        )
+
+        if workers == 1:
+            statuses = [run_photo_job(job_id) for job_id in job_ids]
+        else:
+            # Child processes must not inherit this process's database connection
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                statuses = list(executor.map(run_photo_job, job_ids))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Processed {statuses.count('DONE')} photo(s), {statuses.count('FAILED')} failed, "
+            f"{statuses.count('CANCELLED')} cancelled."
+        ))
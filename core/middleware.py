@@ -0,0 +1,34 @@
+from functools import partial
+
+from asgiref.sync import sync_to_async
+from django.contrib.auth.middleware import AuthenticationMiddleware
+from django.utils.functional import SimpleLazyObject
+
+from core.services.user_cache_service import get_cached_user
+
+
+def _get_user(request):
+    if not hasattr(request, '_cached_user'):
+        request._cached_user = get_cached_user(request)
+    return request._cached_user
+
+
+async def _auser(request):
+    if not hasattr(request, '_acached_user'):
+        request._acached_user = await sync_to_async(get_cached_user)(request)
+    return request._acached_user
+
+
+class CachedAuthenticationMiddleware(AuthenticationMiddleware):
+    '''
+    AuthenticationMiddleware that loads request.user from the user cache.
+
+    Replaces django.contrib.auth.middleware.AuthenticationMiddleware. With a
+    cached session and a cached user a page view makes no auth queries; see
+    core.services.user_cache_service.
+    '''
+
+    def process_request(self, request):
+        super().process_request(request)
+        request.user = SimpleLazyObject(lambda: _get_user(request))
+        request.auser = partial(_auser, request)
@@ -0,0 +1,25 @@
+# Generated by Django 6.0 on 2026-10-17 10:02
+
+import django.utils.timezone
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0002_photojob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='PhotoBlob',
+            fields=[
+                ('name', models.CharField(max_length=255, primary_key=True, serialize=False)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('released_at', models.DateTimeField(default=django.utils.timezone.now)),
+            ],
+            options={
+                'indexes': [models.Index(fields=['ref_count', 'released_at'], name='photoblob_gc_idx')],
+            },
+        ),
+    ]
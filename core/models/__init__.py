@@ -1 +1,4 @@
-from .custom_user import AccountUser
\ No newline at end of file
+from .custom_user import AccountUser
+from .outbox_email import OutboxEmail
+from .photo_blob import PhotoBlob
+from .photo_job import PhotoJob
@@ -0,0 +1,46 @@
+import uuid
+from django.db import models
+from django.utils import timezone
+
+
+class OutboxEmail(models.Model):
+    '''
+    An email waiting to be delivered by the outbox worker.
+
+    Written in the same transaction as whatever the email is about, so the
+    email goes out if and only if that change is committed, and the request
+    never waits on the mail server. A failed delivery is retried with
+    exponential backoff until it runs out of attempts.
+    '''
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('SENDING', 'Sending'),
+        ('SENT', 'Sent'),
+        ('FAILED', 'Failed'),
+    ]
+
+    email_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    subject = models.CharField(max_length=255)
+    body = models.TextField()
+    from_email = models.CharField(max_length=255)
+    to = models.JSONField(default=list)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    attempts = models.PositiveIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    next_attempt_at = models.DateTimeField(default=timezone.now)
+    claimed_at = models.DateTimeField(blank=True, null=True)
+    sent_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Worker queue: emails due for delivery
+            models.Index(fields=['status', 'next_attempt_at'], name='outboxemail_due_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.subject} to {', '.join(self.to)} {self.status}"
@@ -0,0 +1,27 @@
+from django.db import models
+from django.utils import timezone
+
+
+class PhotoBlob(models.Model):
+    '''
+    A content addressed profile photo file and how many profiles use it.
+
+    Profiles that share a photo (siblings with the same family picture)
+    share its files. A file no longer used by any profile is deleted by
+    collect_photo_garbage once it has been unused for a grace period, so
+    pages and caches that still link to it keep working for a while.
+    '''
+    # Storage name, e.g. profile_photos/3f/3f9c....webp
+    name = models.CharField(max_length=255, primary_key=True)
+    ref_count = models.PositiveIntegerField(default=0)
+    # When the file was last stored or last lost its final reference
+    released_at = models.DateTimeField(default=timezone.now)
+
+    class Meta:
+        indexes = [
+            # Garbage collection: unused files, oldest first
+            models.Index(fields=['ref_count', 'released_at'], name='photoblob_gc_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.name} ({self.ref_count})"
@@ -0,0 +1,52 @@
+import uuid
+from django.contrib.contenttypes.fields import GenericForeignKey
+from django.contrib.contenttypes.models import ContentType
+from django.db import models
+
+
+class PhotoJob(models.Model):
+    '''
+    An uploaded profile photo waiting to be processed in the background.
+
+    The upload is stored decoded and scaled down, as a lossless PNG (see
+    validate_photo). A worker process builds the size and format variants
+    from it and swaps them into the profile, which keeps showing its previous
+    photo until then. A newer upload or removing the photo cancels the jobs
+    still queued for the profile.
+    '''
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+        ('CANCELLED', 'Cancelled'),
+    ]
+
+    job_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+
+    # ParentProfile or StudentProfile the photo belongs to
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    profile = GenericForeignKey('content_type', 'object_id')
+
+    source = models.FileField(upload_to='photo_uploads/')
+    rotation = models.IntegerField(default=0)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Worker queue: oldest jobs in a given status
+            models.Index(fields=['status', 'created_at'], name='photojob_status_idx'),
+            # Jobs still queued for a profile
+            models.Index(fields=['content_type', 'object_id', 'status'], name='photojob_profile_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.content_type.model} {self.object_id} photo {self.status}"
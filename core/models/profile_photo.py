@@ -0,0 +1,35 @@
+DEFAULT_PHOTO_URL = '/static/images/default_user.png'
+
+
+class ProfilePhotoMixin:
+    '''
+    Photo URLs of a profile with a `photo` image field and `photo_variants`.
+
+    photo_variants maps each size variant to its width and the stored file of
+    each format, e.g. {'thumb': {'width': 96, 'jpeg': '...', 'webp': '...'}}.
+    It is filled in by the photo pipeline once an upload has been processed;
+    `photo` holds the full size JPEG.
+    '''
+
+    def get_photo_url(self, size='full'):
+        ''' Return the JPEG url of a photo variant, or the photo, or the default image '''
+        variant = self.photo_variants.get(size) if self.photo_variants else None
+        if variant:
+            return self.photo.storage.url(variant['jpeg'])
+        if self.photo:
+            return self.photo.url
+        return DEFAULT_PHOTO_URL
+
+    def get_photo_srcset(self):
+        ''' JPEG variants as an img srcset, empty when there are none '''
+        return self._photo_srcset('jpeg')
+
+    def get_photo_webp_srcset(self):
+        ''' WebP variants as a picture source srcset, empty when there are none '''
+        return self._photo_srcset('webp')
+
+    def _photo_srcset(self, image_format):
+        if not self.photo_variants:
+            return ''
+        variants = sorted(self.photo_variants.values(), key=lambda variant: variant['width'])
+        return ', '.join(f"{self.photo.storage.url(variant[image_format])} {variant['width']}w" for variant in variants)
@@ -0,0 +1,223 @@
+"""
+Service for queueing emails in the outbox and delivering them in batches
+
+queue_email() only writes an OutboxEmail row, in the caller's transaction,
+so a view returns as fast as its database write whatever state the mail
+server is in. Once the transaction commits, a delivery thread in the web
+process drains the outbox; the deliver_outbox command does the same from a
+separate worker. Both first requeue emails a dead process left half sent.
+
+Each batch is sent over one connection to the mail server. A failed email
+is retried with exponential backoff and marked FAILED after
+EMAIL_OUTBOX_MAX_ATTEMPTS. Delivery is at least once: an email whose worker
+died while sending it is sent again once it is requeued.
+"""
+import logging
+import random
+import threading
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.mail import EmailMessage, get_connection
+from django.db import close_old_connections, transaction
+from django.utils import timezone
+
+from core.models.outbox_email import OutboxEmail
+
+logger = logging.getLogger(__name__)
+
+_wakeup = threading.Event()
+_worker = None
+_worker_lock = threading.Lock()
+
+
+def queue_email(subject, body, to, from_email=None):
+    """
+    Queue an email for delivery once the current transaction commits
+
+    Args:
+        subject: str
+        body: str - plain text body
+        to: list of recipient addresses
+        from_email: sender (defaults to settings.DEFAULT_FROM_EMAIL)
+
+    Returns:
+        OutboxEmail
+    """
+    email = OutboxEmail.objects.create(
+        subject=subject,
+        body=body,
+        from_email=from_email or settings.DEFAULT_FROM_EMAIL,
+        to=list(to),
+    )
+    if getattr(settings, 'EMAIL_OUTBOX_DELIVER_IN_PROCESS', True):
+        transaction.on_commit(wake_delivery_worker)
+    return email
+
+
+def _retry_delay(attempts):
+    # Exponential backoff with jitter, so emails failing together do not retry together
+    base = getattr(settings, 'EMAIL_OUTBOX_RETRY_SECONDS', 60)
+    delay = min(base * 2 ** (attempts - 1), getattr(settings, 'EMAIL_OUTBOX_MAX_RETRY_SECONDS', 3600))
+    return timedelta(seconds=delay * random.uniform(0.8, 1.2))
+
+
+def claim_batch(batch_size):
+    """
+    Claim the emails that are due, oldest first
+
+    An email is claimed by moving it from PENDING to SENDING; one another
+    worker claimed first is skipped.
+
+    Returns:
+        list: OutboxEmail
+    """
+    now = timezone.now()
+    due = OutboxEmail.objects.filter(status='PENDING', next_attempt_at__lte=now).order_by('next_attempt_at')
+    claimed = []
+    for email in due[:batch_size]:
+        if OutboxEmail.objects.filter(email_id=email.email_id, status='PENDING').update(
+            status='SENDING', claimed_at=now, attempts=email.attempts + 1,
+        ):
+            email.attempts += 1
+            claimed.append(email)
+    return claimed
+
+
+def _failed(email, error):
+    max_attempts = getattr(settings, 'EMAIL_OUTBOX_MAX_ATTEMPTS', 8)
+    if email.attempts >= max_attempts:
+        logger.error("Giving up on outbox email %s after %d attempts: %s", email.email_id, email.attempts, error)
+        OutboxEmail.objects.filter(email_id=email.email_id).update(status='FAILED', last_error=error)
+        return 'FAILED'
+    OutboxEmail.objects.filter(email_id=email.email_id).update(
+        status='PENDING',
+        last_error=error,
+        next_attempt_at=timezone.now() + _retry_delay(email.attempts),
+    )
+    return 'PENDING'
+
+
+def deliver_batch(batch_size=None):
+    """
+    Send one batch of due emails over a single mail server connection
+
+    Returns:
+        list: resulting status of each claimed email ('SENT', 'PENDING' to
+              be retried, or 'FAILED')
+    """
+    batch = claim_batch(batch_size or getattr(settings, 'EMAIL_OUTBOX_BATCH_SIZE', 50))
+    if not batch:
+        return []
+
+    connection = get_connection(fail_silently=False)
+    try:
+        connection.open()
+    except Exception as e:
+        logger.warning("Could not connect to the mail server: %s", e)
+        return [_failed(email, f"Could not connect: {e}") for email in batch]
+
+    statuses = []
+    sent = []
+    try:
+        for email in batch:
+            message = EmailMessage(email.subject, email.body, email.from_email, email.to, connection=connection)
+            try:
+                message.send()
+            except Exception as e:
+                statuses.append(_failed(email, str(e) or type(e).__name__))
+            else:
+                sent.append(email.email_id)
+                statuses.append('SENT')
+    finally:
+        try:
+            connection.close()
+        except Exception:
+            pass
+        OutboxEmail.objects.filter(email_id__in=sent).update(status='SENT', sent_at=timezone.now(), last_error='')
+    return statuses
+
+
+def deliver_outbox(batch_size=None):
+    """
+    Deliver batches until no email is due
+
+    Returns:
+        dict: number of emails sent, left for a retry and failed for good
+    """
+    counts = {'SENT': 0, 'PENDING': 0, 'FAILED': 0}
+    while True:
+        statuses = deliver_batch(batch_size)
+        if not statuses:
+            return counts
+        for status in statuses:
+            counts[status] += 1
+
+
+def seconds_until_next_email():
+    """
+    Seconds until the next pending email is due, or None if there is none
+    """
+    next_attempt_at = (
+        OutboxEmail.objects.filter(status='PENDING').order_by('next_attempt_at')
+        .values_list('next_attempt_at', flat=True).first()
+    )
+    if next_attempt_at is None:
+        return None
+    return max(0.0, (next_attempt_at - timezone.now()).total_seconds())
+
+
+def requeue_stale_emails(older_than=None):
+    """
+    Put SENDING emails whose worker died back in the queue
+
+    Args:
+        older_than: timedelta an email may be sending before it counts as stale
+                    (defaults to settings.EMAIL_OUTBOX_STALE_SECONDS)
+
+    Returns:
+        int: number of emails requeued
+    """
+    if older_than is None:
+        older_than = timedelta(seconds=getattr(settings, 'EMAIL_OUTBOX_STALE_SECONDS', 300))
+    return OutboxEmail.objects.filter(
+        status='SENDING',
+        claimed_at__lt=timezone.now() - older_than,
+    ).update(status='PENDING', claimed_at=None)
+
+
+def _delivery_pass(poll):
+    # Requeue, deliver, and return the seconds until the next email is due (at most poll)
+    requeue_stale_emails()
+    deliver_outbox()
+    wait = seconds_until_next_email()
+    return poll if wait is None else min(wait, poll)
+
+
+def _delivery_loop():
+    poll = getattr(settings, 'EMAIL_OUTBOX_POLL_SECONDS', 60)
+    timeout = poll
+    while True:
+        # Wake up when an email is queued, or when the next retry comes due
+        _wakeup.wait(timeout)
+        _wakeup.clear()
+        timeout = poll
+        close_old_connections()
+        try:
+            timeout = _delivery_pass(poll)
+        except Exception:
+            logger.exception("Email outbox delivery failed")
+        finally:
+            close_old_connections()
+
+
+def wake_delivery_worker():
+    """
+    Have this process's delivery thread drain the outbox, starting it on first use
+    """
+    global _worker
+    with _worker_lock:
+        if _worker is None or not _worker.is_alive():
+            _worker = threading.Thread(target=_delivery_loop, name='email-outbox', daemon=True)
+            _worker.start()
+    _wakeup.set()
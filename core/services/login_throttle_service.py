@@ -0,0 +1,242 @@
+"""
+Service for throttling login attempts before any password is hashed
+
+Every login attempt takes a token from two buckets: one for the client's IP
+address and one for the email it tries. A bucket holds a burst of tokens
+and refills at a steady rate (settings.LOGIN_THROTTLE_RATES). An attempt
+that finds either bucket empty is rejected without calling authenticate(),
+so a credential stuffing burst costs a cache lookup per request instead of
+a PBKDF2 hash.
+
+Buckets live in the memory of each process ('local') or in the default
+cache, shared by every process using it ('cache'), depending on
+settings.LOGIN_THROTTLE_BACKEND.
+"""
+import hashlib
+import ipaddress
+import logging
+import math
+import threading
+import time
+from collections import Counter, OrderedDict
+
+from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+logger = logging.getLogger(__name__)
+
+# (burst, seconds to refill the whole burst) per bucket scope
+DEFAULT_LOGIN_THROTTLE_RATES = {
+    'ip': (20, 60),
+    'email': (5, 300),
+}
+
+_backend = None
+_backend_lock = threading.Lock()
+
+_metrics = Counter()
+_metrics_lock = threading.Lock()
+
+
+def _refill(tokens, updated, now, capacity, rate):
+    # Tokens a bucket holds at `now`, given what it held at `updated`
+    return min(capacity, tokens + max(0.0, now - updated) * rate)
+
+
+class LocalMemoryBackend:
+    '''
+    Token buckets in the memory of this process.
+
+    Fast and lock protected, but every process throttles on its own. At most
+    max_keys buckets are kept; the least recently used one is dropped first,
+    which only ever gives a client a full bucket again.
+    '''
+
+    def __init__(self, max_keys=10000, clock=time.monotonic):
+        self.max_keys = max_keys
+        self.clock = clock
+        self._buckets = OrderedDict()
+        self._lock = threading.Lock()
+
+    def take(self, key, capacity, rate):
+        """
+        Take one token from a bucket
+
+        Args:
+            key: bucket name
+            capacity: tokens a full bucket holds
+            rate: tokens added per second
+
+        Returns:
+            float: 0 if a token was taken, otherwise seconds until one is available
+        """
+        with self._lock:
+            now = self.clock()
+            tokens, updated = self._buckets.pop(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            self._buckets[key] = (tokens, now)
+            while len(self._buckets) > self.max_keys:
+                self._buckets.popitem(last=False)
+            return wait
+
+
+class CacheBackend:
+    '''
+    Token buckets in a Django cache, shared by every process that uses it.
+
+    A bucket is read and written under a short lock taken with cache.add(),
+    so concurrent attempts cannot spend the same token. That needs an atomic
+    add(): memcached, Redis, the database cache and core.cache's file cache
+    have one; Django's own FileBasedCache does not. An attempt that cannot
+    get the lock within lock_wait seconds counts as throttled: the bucket is
+    being hammered.
+    '''
+    key_prefix = 'login_throttle:'
+
+    def __init__(self, cache_alias='default', lock_wait=0.05, clock=time.time):
+        self.cache = caches[cache_alias]
+        self.lock_wait = lock_wait
+        self.clock = clock
+
+    def take(self, key, capacity, rate):
+        key = self.key_prefix + key
+        lock_key = key + ':lock'
+        deadline = time.monotonic() + self.lock_wait
+        while not self.cache.add(lock_key, 1, timeout=2):
+            if time.monotonic() >= deadline:
+                return 1 / rate
+            time.sleep(0.001)
+
+        try:
+            now = self.clock()
+            tokens, updated = self.cache.get(key, (capacity, now))
+            tokens = _refill(tokens, updated, now, capacity, rate)
+            wait = 0.0
+            if tokens >= 1:
+                tokens -= 1
+            else:
+                wait = (1 - tokens) / rate
+            # Once it could have refilled, a missing bucket is the same as a full one
+            self.cache.set(key, (tokens, now), timeout=math.ceil(capacity / rate) + 1)
+            return wait
+        finally:
+            self.cache.delete(lock_key)
+
+
+LOGIN_THROTTLE_BACKENDS = {
+    'local': LocalMemoryBackend,
+    'cache': CacheBackend,
+}
+
+
+def get_backend():
+    """
+    The throttle backend named by settings.LOGIN_THROTTLE_BACKEND, created on first use
+    """
+    global _backend
+    with _backend_lock:
+        if _backend is None:
+            name = getattr(settings, 'LOGIN_THROTTLE_BACKEND', 'local')
+            try:
+                _backend = LOGIN_THROTTLE_BACKENDS[name]()
+            except KeyError:
+                raise ImproperlyConfigured(f"Unknown LOGIN_THROTTLE_BACKEND {name!r}")
+        return _backend
+
+
+def get_client_ip(request):
+    """
+    The address a login attempt is throttled by
+
+    IPv6 clients are grouped by /64, the smallest network a host is usually given.
+    """
+    try:
+        address = ipaddress.ip_address(request.META.get('REMOTE_ADDR', ''))
+    except ValueError:
+        return 'unknown'
+    if address.version == 6:
+        return str(ipaddress.ip_network(f"{address}/64", strict=False))
+    return str(address)
+
+
+def _bucket_key(scope, value):
+    # Hashed so any email is a safe cache key
+    return f"{scope}:{hashlib.sha256(value.encode()).hexdigest()}"
+
+
+def throttle_login(request, email):
+    """
+    Take a login attempt from the client's IP bucket and the email's bucket
+
+    Call before authenticate(); a throttled attempt must not be checked.
+
+    Args:
+        request: HttpRequest of the attempt
+        email: email the attempt logs in with
+
+    Returns:
+        int: 0 if the attempt may go ahead, otherwise seconds to wait before retrying
+    """
+    rates = {**DEFAULT_LOGIN_THROTTLE_RATES, **getattr(settings, 'LOGIN_THROTTLE_RATES', {})}
+    backend = get_backend()
+    values = {
+        'ip': get_client_ip(request),
+        'email': (email or '').strip().lower(),
+    }
+
+    for scope, value in values.items():
+        capacity, period = rates[scope]
+        wait = backend.take(_bucket_key(scope, value), capacity, capacity / period)
+        if wait:
+            with _metrics_lock:
+                _metrics[f'rejected_{scope}'] += 1
+            logger.warning("Login attempt from %s throttled by its %s bucket", values['ip'], scope)
+            return math.ceil(wait)
+
+    with _metrics_lock:
+        _metrics['allowed'] += 1
+    return 0
+
+
+def get_login_throttle_metrics():
+    """
+    Login attempts this process has allowed and rejected
+
+    Returns:
+        dict: {'allowed': int, 'rejected_ip': int, 'rejected_email': int}
+    """
+    with _metrics_lock:
+        return {
+            'allowed': _metrics['allowed'],
+            'rejected_ip': _metrics['rejected_ip'],
+            'rejected_email': _metrics['rejected_email'],
+        }
+
+
+def reset_login_throttle():
+    """
+    Drop this process's backend, emptying its local buckets, and its metrics
+    """
+    global _backend
+    with _backend_lock:
+        _backend = None
+    with _metrics_lock:
+        _metrics.clear()
+
+
+# ============================================
+# SIGNALS
+# ============================================
+
+@receiver(setting_changed)
+def throttle_settings_changed(sender, setting, **kwargs):
+    if setting in ('LOGIN_THROTTLE_BACKEND', 'LOGIN_THROTTLE_RATES'):
+        reset_login_throttle()
@@ -0,0 +1,82 @@
+"""
+Service for sending media files once a view has checked access to them
+
+Django only decides whether a file may be sent and which cache headers it
+gets. Depending on settings.SENDFILE_BACKEND the bytes are then sent by the
+web server (X-Sendfile for Apache and lighttpd, X-Accel-Redirect for nginx)
+or by FileResponse, which WSGI servers with a wsgi.file_wrapper (gunicorn,
+uWSGI, mod_wsgi) send with os.sendfile without copying them through Python.
+"""
+import mimetypes
+from pathlib import Path
+from urllib.parse import quote
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from django.http import FileResponse, HttpResponse
+from django.utils.cache import get_conditional_response, patch_cache_control
+from django.utils.http import content_disposition_header
+
+# Cache lifetime of a URL whose content never changes
+IMMUTABLE_MAX_AGE = 365 * 24 * 60 * 60
+
+
+def _accel_redirect_url(path):
+    # The internal nginx location that serves the directory the file is in
+    path = Path(path).resolve()
+    for root, url in getattr(settings, 'SENDFILE_ACCEL_URLS', {}).items():
+        try:
+            relative = path.relative_to(Path(root).resolve())
+        except ValueError:
+            continue
+        return url.rstrip('/') + '/' + quote(relative.as_posix())
+    raise ImproperlyConfigured(f"No SENDFILE_ACCEL_URLS entry covers {path}")
+
+
+def send_file(request, path, etag, immutable=False, content_type=None, filename=None, as_attachment=False):
+    """
+    Respond with a file, or with 304 Not Modified when the client has it
+
+    Args:
+        request: HttpRequest, already checked for access
+        path: Path of the file
+        etag: strong ETag of the file's content, quoted
+        immutable: True if the URL always returns these exact bytes; the
+                   browser then keeps the file for a year without asking again
+        content_type: MIME type (guessed from the file name if not given)
+        filename: name the browser saves the file as
+        as_attachment: download the file instead of displaying it
+
+    Returns:
+        HttpResponse
+    """
+    response = get_conditional_response(request, etag=etag)
+    if response is None:
+        content_type = content_type or mimetypes.guess_type(path)[0] or 'application/octet-stream'
+        backend = getattr(settings, 'SENDFILE_BACKEND', None)
+
+        if backend is None:
+            response = FileResponse(
+                open(path, 'rb'),
+                as_attachment=as_attachment,
+                filename=filename or '',
+                content_type=content_type,
+            )
+        else:
+            response = HttpResponse(content_type=content_type)
+            if backend == 'x-accel-redirect':
+                response['X-Accel-Redirect'] = _accel_redirect_url(path)
+            elif backend == 'x-sendfile':
+                response['X-Sendfile'] = str(Path(path).resolve())
+            else:
+                raise ImproperlyConfigured(f"Unknown SENDFILE_BACKEND {backend!r}")
+            if filename or as_attachment:
+                response['Content-Disposition'] = content_disposition_header(as_attachment, filename)
+
+    response['ETag'] = etag
+    if immutable:
+        patch_cache_control(response, private=True, max_age=IMMUTABLE_MAX_AGE, immutable=True)
+    else:
+        # Let the browser keep the file but always revalidate it
+        patch_cache_control(response, private=True, no_cache=True)
+    return response
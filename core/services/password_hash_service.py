@@ -0,0 +1,136 @@
+"""
+Service for running password hashes on a small thread pool and benchmarking them
+
+The hashers in core.hashers run every hash here. hashlib and argon2-cffi
+release the GIL while they hash, so a slow login no longer holds up the
+other requests of a threaded worker, and the pool caps how many hashes run
+at once, so a burst of logins cannot oversubscribe the CPU.
+"""
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.conf import settings
+from django.contrib.auth.hashers import get_hashers
+from django.core.signals import setting_changed
+from django.dispatch import receiver
+
+_executor = None
+_executor_lock = threading.Lock()
+_local = threading.local()
+
+
+def get_hash_workers():
+    return getattr(settings, 'PASSWORD_HASH_WORKERS', None) or os.cpu_count() or 1
+
+
+def get_executor():
+    """
+    The password hashing thread pool of this process, started on first use
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ThreadPoolExecutor(max_workers=get_hash_workers(), thread_name_prefix='password-hash')
+        return _executor
+
+
+def _run_in_pool(func, args, kwargs):
+    _local.in_pool = True
+    try:
+        return func(*args, **kwargs)
+    finally:
+        _local.in_pool = False
+
+
+def run_hash(func, *args, **kwargs):
+    """
+    Run a hashing call on the pool and wait for its result
+
+    A call made from a pool thread (a hasher's verify() calling its own
+    encode()) runs in place, so a full pool never waits on itself.
+    """
+    if getattr(_local, 'in_pool', False):
+        return func(*args, **kwargs)
+    return get_executor().submit(_run_in_pool, func, args, kwargs).result()
+
+
+def benchmark_hasher(hasher, seconds=2.0, concurrency=None):
+    """
+    Logins a hasher can check per second, serially and with concurrent logins
+
+    Args:
+        hasher: password hasher instance
+        seconds: how long each phase runs
+        concurrency: logins checked at once (defaults to the pool size)
+
+    Returns:
+        dict: ms per login, logins per second and logins per second per core
+    """
+    concurrency = concurrency or get_hash_workers()
+    password = 'correct horse battery staple'
+    encoded = hasher.encode(password, hasher.salt())
+
+    logins = 0
+    start = time.perf_counter()
+    while time.perf_counter() - start < seconds:
+        hasher.verify(password, encoded)
+        logins += 1
+    ms_per_login = (time.perf_counter() - start) * 1000 / logins
+
+    counts = [0] * concurrency
+    deadline = time.perf_counter() + seconds
+
+    def login(client):
+        while time.perf_counter() < deadline:
+            hasher.verify(password, encoded)
+            counts[client] += 1
+
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=concurrency) as clients:
+        list(clients.map(login, range(concurrency)))
+    per_second = sum(counts) / (time.perf_counter() - start)
+
+    cores = min(concurrency, get_hash_workers(), os.cpu_count() or 1)
+    return {
+        'algorithm': hasher.algorithm,
+        'ms_per_login': ms_per_login,
+        'per_second': per_second,
+        'per_second_per_core': per_second / cores,
+    }
+
+
+def benchmark_hashers(seconds=2.0, concurrency=None):
+    """
+    Benchmark every hasher in settings.PASSWORD_HASHERS
+
+    Hashers whose library is not installed are skipped.
+
+    Returns:
+        list: (hasher path, benchmark_hasher() result or None if skipped)
+    """
+    results = []
+    for path, hasher in zip(settings.PASSWORD_HASHERS, get_hashers()):
+        try:
+            if hasher.library:
+                hasher._load_library()
+        except ValueError:
+            results.append((path, None))
+            continue
+        results.append((path, benchmark_hasher(hasher, seconds, concurrency)))
+    return results
+
+
+# ============================================
+# SIGNALS
+# ============================================
+
+@receiver(setting_changed)
+def hash_workers_changed(sender, setting, **kwargs):
+    global _executor
+    if setting == 'PASSWORD_HASH_WORKERS':
+        with _executor_lock:
+            if _executor is not None:
+                _executor.shutdown(wait=False)
+            _executor = None
@@ -0,0 +1,16 @@
+"""
+Start-up of password hashing worker processes
+
+Kept apart from password_hash_service: a spawned worker imports this module
+before Django is set up, so it must not import any models.
+"""
+
+
+def init_worker():
+    import django
+    django.setup()
+
+
+def hash_password(password):
+    from django.contrib.auth.hashers import make_password
+    return make_password(password)
@@ -0,0 +1,95 @@
+"""
+Service for reference counting content addressed profile photo files
+
+Every photo file lives in ContentAddressedStorage and has a PhotoBlob row
+counting the profiles that use it. Replacing or removing a photo only drops
+references; collect_photo_garbage() deletes the files nobody has used for a
+grace period.
+"""
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.files.base import ContentFile
+from django.db import transaction
+from django.db.models import F
+from django.utils import timezone
+
+from core.models.photo_blob import PhotoBlob
+from core.storage import get_photo_storage
+
+
+def store_photo_file(storage, filename, data):
+    """
+    Store a photo file, or find the identical one that is already stored
+
+    The file starts without references; the caller acquires them once a
+    profile uses it.
+
+    Args:
+        storage: ContentAddressedStorage
+        filename: requested name; only its extension is kept
+        data: bytes of the file
+
+    Returns:
+        str: storage name of the file
+    """
+    content = ContentFile(data)
+    name = storage.hashed_name(filename, content)
+    # Touched before the file is written, so garbage collection spares it
+    # until the profile that is about to use it holds a reference
+    PhotoBlob.objects.update_or_create(name=name, defaults={'released_at': timezone.now()})
+    return storage.save(name, content)
+
+
+def acquire_photo_files(names):
+    """
+    Add a reference to each stored photo file
+    """
+    PhotoBlob.objects.filter(name__in=names).update(ref_count=F('ref_count') + 1)
+
+
+def release_photo_files(storage, names):
+    """
+    Drop a reference to each photo file
+
+    Files left without references are kept until collect_photo_garbage().
+    Files stored before photos were content addressed have no PhotoBlob and
+    belong to one profile only; they are deleted once the transaction
+    commits.
+    """
+    names = set(names)
+    counted = set(PhotoBlob.objects.filter(name__in=names).values_list('name', flat=True))
+
+    # The last reference first, so a count of 2 is decremented only once
+    PhotoBlob.objects.filter(name__in=counted, ref_count=1).update(ref_count=0, released_at=timezone.now())
+    PhotoBlob.objects.filter(name__in=counted, ref_count__gt=1).update(ref_count=F('ref_count') - 1)
+
+    uncounted = names - counted
+    if uncounted:
+        transaction.on_commit(lambda: [storage.delete(name) for name in uncounted])
+
+
+def collect_photo_garbage(older_than=None):
+    """
+    Delete the photo files no profile has used for a grace period
+
+    Args:
+        older_than: timedelta a file must have been unused
+                    (defaults to settings.PHOTO_GC_GRACE_SECONDS)
+
+    Returns:
+        int: number of files deleted
+    """
+    if older_than is None:
+        older_than = timedelta(seconds=getattr(settings, 'PHOTO_GC_GRACE_SECONDS', 24 * 60 * 60))
+    cutoff = timezone.now() - older_than
+    storage = get_photo_storage()
+
+    unused = PhotoBlob.objects.filter(ref_count=0, released_at__lt=cutoff)
+    deleted = 0
+    for name in list(unused.values_list('name', flat=True)):
+        # Only if it is still unused; a new upload may have just stored it again
+        if unused.filter(name=name).delete()[0]:
+            storage.delete(name)
+            deleted += 1
+    return deleted
@@ -0,0 +1,257 @@
+"""
+Service for processing uploaded profile photos in background processes
+
+An upload is decoded once at a reduced size by validate_photo, stored as a
+lossless PNG and queued as a PhotoJob, so the request returns at once. Each
+web process keeps a small pool of worker processes that build every size
+variant from it in WebP and JPEG and swap them into the profile. Photo files are content addressed and shared
+between profiles, see photo_blob_service.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+from pathlib import PurePath
+
+from django.conf import settings
+from django.contrib.contenttypes.models import ContentType
+from django.db import transaction
+from django.db.models.signals import post_delete
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models.photo_job import PhotoJob
+from core.services.photo_blob_service import acquire_photo_files, release_photo_files, store_photo_file
+from core.services.photo_utils import render_photo_variants
+from core.services.photo_worker import init_worker
+from parent.models.parent_profile import ParentProfile
+from student.models.student_profile import StudentProfile
+
+logger = logging.getLogger(__name__)
+
+# File extension of each photo format
+PHOTO_EXTENSIONS = {
+    'webp': 'webp',
+    'jpeg': 'jpg',
+}
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def get_executor():
+    """
+    The photo process pool of this web process, started on first use
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'PHOTO_JOB_WORKERS', 2),
+                # Forking a threaded web server is unsafe; start clean interpreters instead
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+            )
+        return _executor
+
+
+def _reset_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_job(job_id):
+    """
+    Hand a job to the process pool
+
+    A job whose worker dies stays RUNNING until run_photo_jobs requeues it.
+    """
+    executor = get_executor()
+    try:
+        future = executor.submit(run_photo_job, job_id)
+    except RuntimeError:
+        # The pool is broken (a worker was killed); start a new one
+        _reset_executor(executor)
+        future = get_executor().submit(run_photo_job, job_id)
+
+    def _log_failure(done):
+        if done.exception() is not None:
+            logger.error("Photo job %s crashed", job_id, exc_info=done.exception())
+
+    future.add_done_callback(_log_failure)
+
+
+def _profile_jobs(profile):
+    return PhotoJob.objects.filter(content_type=ContentType.objects.get_for_model(profile), object_id=profile.pk)
+
+
+def cancel_photo_jobs(profile):
+    """
+    Cancel the photo jobs still queued or running for a profile
+
+    Returns:
+        int: number of jobs cancelled
+    """
+    cancelled = 0
+    now = timezone.now()
+    for job in _profile_jobs(profile).filter(status__in=['PENDING', 'RUNNING']):
+        if PhotoJob.objects.filter(job_id=job.job_id, status='PENDING').update(status='CANCELLED', finished_at=now):
+            # No worker has it; a running job deletes its own upload when it sees it was cancelled
+            transaction.on_commit(lambda source=job.source: source.storage.delete(source.name))
+            cancelled += 1
+        else:
+            cancelled += PhotoJob.objects.filter(job_id=job.job_id, status='RUNNING').update(
+                status='CANCELLED', finished_at=now,
+            )
+    return cancelled
+
+
+def enqueue_photo(profile, upload, rotation=0, submit=True):
+    """
+    Queue an uploaded photo to become a profile's photo
+
+    The profile keeps its current photo until the job is done. Jobs still
+    queued for the profile are cancelled: the latest upload wins.
+
+    Args:
+        profile: ParentProfile or StudentProfile
+        upload: UploadedFile (or any File) with the image
+        rotation: int - degrees to rotate (0, 90, 180, 270)
+        submit: hand the job to this process's pool once committed; False
+                leaves it for run_photo_jobs
+
+    Returns:
+        PhotoJob
+    """
+    cancel_photo_jobs(profile)
+
+    job = PhotoJob(content_type=ContentType.objects.get_for_model(profile), object_id=profile.pk, rotation=rotation)
+    job.source.save(PurePath(upload.name).name, upload, save=False)
+    job.save()
+
+    if submit:
+        transaction.on_commit(lambda: submit_job(job.job_id))
+    return job
+
+
+def photo_files(profile):
+    """
+    Names of all stored files of a profile's photo
+    """
+    names = {profile.photo.name} if profile.photo else set()
+    for variant in (profile.photo_variants or {}).values():
+        names.update(variant[image_format] for image_format in PHOTO_EXTENSIONS if image_format in variant)
+    return names
+
+
+def clear_photo(profile):
+    """
+    Remove a profile's photo and its variants and cancel queued uploads
+    """
+    cancel_photo_jobs(profile)
+
+    names = photo_files(profile)
+    profile.photo = None
+    profile.photo_variants = {}
+    type(profile).objects.filter(pk=profile.pk).update(photo=None, photo_variants={})
+
+    release_photo_files(profile._meta.get_field('photo').storage, names)
+
+
+def _claim_job(job_id):
+    # Only one worker wins the PENDING -> RUNNING transition
+    return PhotoJob.objects.filter(job_id=job_id, status='PENDING').update(
+        status='RUNNING', started_at=timezone.now(),
+    ) == 1
+
+
+def _store_variants(storage, variants):
+    photo_variants = {}
+    for name, variant in variants.items():
+        photo_variants[name] = stored = {'width': variant['width']}
+        for image_format, extension in PHOTO_EXTENSIONS.items():
+            stored[image_format] = store_photo_file(storage, f"{name}.{extension}", variant[image_format])
+    return photo_variants
+
+
+def _swap_photo(job, model, photo_variants):
+    with transaction.atomic():
+        # A newer upload or a removal cancels the job while it runs
+        if not PhotoJob.objects.filter(job_id=job.job_id, status='RUNNING').update(
+            status='DONE', finished_at=timezone.now(),
+        ):
+            return False
+
+        profile = model.objects.only('photo', 'photo_variants').get(pk=job.object_id)
+        replaced = photo_files(profile)
+
+        largest = max(photo_variants.values(), key=lambda variant: variant['width'])
+        # Only the photo fields are written, never a stale copy of the rest of the profile
+        model.objects.filter(pk=job.object_id).update(photo=largest['jpeg'], photo_variants=photo_variants)
+
+        # Acquired before releasing, so a file the new photo shares with the old one is never unused
+        acquire_photo_files(photo_files(model(photo=largest['jpeg'], photo_variants=photo_variants)))
+        release_photo_files(model._meta.get_field('photo').storage, replaced)
+    return True
+
+
+def run_photo_job(job_id):
+    """
+    Process one queued photo. Runs in a worker process.
+
+    Files stored for a job that fails or is cancelled are left without
+    references for collect_photo_garbage(); other profiles may share them.
+
+    Returns:
+        str: the job's final status, or None when another worker has it
+    """
+    if not _claim_job(job_id):
+        return None
+
+    job = PhotoJob.objects.select_related('content_type').get(job_id=job_id)
+    model = job.content_type.model_class()
+    try:
+        with job.source.open('rb') as source:
+            variants = render_photo_variants(source, job.rotation)
+        photo_variants = _store_variants(model._meta.get_field('photo').storage, variants)
+        status = 'DONE' if _swap_photo(job, model, photo_variants) else 'CANCELLED'
+    except Exception as e:
+        logger.exception("Photo job %s failed", job_id)
+        PhotoJob.objects.filter(job_id=job_id).update(status='FAILED', error=str(e), finished_at=timezone.now())
+        status = 'FAILED'
+
+    job.source.delete(save=False)
+    return status
+
+
+def requeue_stale_jobs(older_than=None):
+    """
+    Put RUNNING jobs whose worker died back in the queue
+
+    Args:
+        older_than: timedelta a job may run before it counts as stale
+                    (defaults to settings.PHOTO_JOB_STALE_SECONDS)
+
+    Returns:
+        int: number of jobs requeued
+    """
+    if older_than is None:
+        older_than = timedelta(seconds=getattr(settings, 'PHOTO_JOB_STALE_SECONDS', 300))
+    return PhotoJob.objects.filter(
+        status='RUNNING',
+        started_at__lt=timezone.now() - older_than,
+    ).update(status='PENDING', started_at=None)
+
+
+# ============================================
+# SIGNALS
+# ============================================
+
+@receiver(post_delete, sender=ParentProfile)
+@receiver(post_delete, sender=StudentProfile)
+def profile_deleted(sender, instance, **kwargs):
+    release_photo_files(sender._meta.get_field('photo').storage, photo_files(instance))
@@ -1,27 +1,128 @@
 from PIL import Image
 from io import BytesIO
-from django.core.files.uploadedfile import InMemoryUploadedFile
 from django.conf import settings
-import sys
+from django.core.files.base import ContentFile
 
 
-def process_profile_photo(photo, rotation=0):
+# Pillow formats a photo may be uploaded in; no other decoder is ever tried
+PHOTO_UPLOAD_FORMATS = ('JPEG', 'PNG', 'GIF', 'WEBP')
+
+# Upload formats that may be animated and have no reduced scale decoding
+ANIMATED_PHOTO_FORMATS = ('GIF', 'WEBP')
+
+# Pillow format and save options of each format a photo is stored in
+PHOTO_FORMATS = {
+    'webp': ('WEBP', {'quality': 80, 'method': 6}),
+    'jpeg': ('JPEG', {'quality': 85, 'optimize': True, 'progressive': True}),
+}
+
+
+def get_photo_variant_dimensions():
+    """
+    Returns:
+        dict: variant name -> (width, height) of each square size variant
+    """
+    return getattr(settings, 'PHOTO_VARIANTS', {'full': getattr(settings, 'PHOTO_DIMENSIONS', (400, 400))})
+
+
+def open_photo(photo):
     """
-    Process uploaded photo: resize, rotate, and optimize
+    Open an uploaded photo, reading only its header
+
+    Nothing is decoded yet, so the format and the pixel count are checked
+    before a large or hostile image costs any memory. GIF and WebP can't be
+    decoded at a reduced scale and may be animated, so they have a lower cap.
 
     Args:
-        photo: UploadedFile object
-        rotation: int - degrees to rotate (0, 90, 180, 270)
+        photo: UploadedFile or file object of the image
 
     Returns:
-        InMemoryUploadedFile: processed image
+        Image: the lazily loaded image
+
+    Raises:
+        ValueError: if the file is not a supported image or has too many pixels
     """
-    # Open the image
-    img = Image.open(photo)
+    max_pixels = getattr(settings, 'MAX_PHOTO_PIXELS', 50 * 1000 * 1000)
+
+    try:
+        img = Image.open(photo, formats=PHOTO_UPLOAD_FORMATS)
+    except Image.DecompressionBombError:
+        raise ValueError(f'Image is too large. Maximum is {max_pixels / 1000 / 1000:g} megapixels.')
+    except Exception:
+        raise ValueError('Invalid image file. Please upload a JPG, PNG, GIF, or WebP image.')
+
+    if img.format in ANIMATED_PHOTO_FORMATS:
+        max_pixels = getattr(settings, 'MAX_ANIMATED_PHOTO_PIXELS', 12 * 1000 * 1000)
+
+    # Checked here rather than by Pillow, whose own limit is far higher
+    if img.width * img.height > max_pixels:
+        raise ValueError(f'Image is too large. Maximum is {max_pixels / 1000 / 1000:g} megapixels.')
+
+    return img
+
+
+def decode_photo(photo):
+    """
+    Decode a photo once, scaled down to about twice the largest variant
+
+    A JPEG is decoded straight at 1/2, 1/4 or 1/8 scale with draft(); other
+    formats are decoded in full and box reduced with reduce(), so only the
+    small copy is kept. Decoding reads all of the image data, so a truncated
+    or corrupt file is caught here.
+
+    Args:
+        photo: UploadedFile or file object of the image
+
+    Returns:
+        Image: decoded L, RGB or RGBA image
+
+    Raises:
+        ValueError: if the file is not a supported image, has too many pixels
+                    or its data is damaged or incomplete
+    """
+    img = open_photo(photo)
+    # Variants are square, so the longer side is enough whichever way the photo is turned
+    target = 2 * max(max(size) for size in get_photo_variant_dimensions().values())
+
+    try:
+        if img.format == 'JPEG':
+            img.draft(None, (target, target))
+        img.load()
+    except Exception:
+        raise ValueError('The image file is damaged or incomplete. Please upload it again.')
+
+    # Palette and other unusual modes can't be reduced or resampled smoothly
+    if img.mode not in ('L', 'RGB', 'RGBA', 'CMYK'):
+        img = img.convert('RGB')
+
+    factor = min(img.width, img.height) // target
+    if factor > 1:
+        img = img.reduce(factor)
 
-    # Convert to RGB if necessary (handles RGBA, P, etc.)
-    if img.mode not in ('RGB', 'RGBA'):
+    if img.mode == 'CMYK':
         img = img.convert('RGB')
+    return img
+
+
+def square_profile_photo(img, rotation, dimensions):
+    """
+    Rotate a decoded photo and fit it onto a white canvas of the given size
+
+    Args:
+        img: Image from decode_photo()
+        rotation: int - degrees to rotate (0, 90, 180, 270)
+        dimensions: (width, height) of the canvas
+
+    Returns:
+        Image: RGB image of exactly the given size
+    """
+    target_width, target_height = dimensions
+
+    # Calculate aspect ratio and resize; the canvas sides swap when the photo is turned on its side
+    img.thumbnail(
+        (target_height, target_width) if rotation in [90, 270] else (target_width, target_height),
+        Image.Resampling.LANCZOS,
+    )
 
     # Handle RGBA images
     if img.mode == 'RGBA':
@@ -29,17 +130,13 @@ def process_profile_photo(photo, rotation=0):
         background = Image.new('RGB', img.size, (255, 255, 255))
         background.paste(img, mask=img.split()[3])  # Use alpha channel as mask
         img = background
+    elif img.mode != 'RGB':
+        img = img.convert('RGB')
 
     # Rotate if needed
     if rotation in [90, 180, 270]:
         img = img.rotate(-rotation, expand=True)
 
-    # Get target dimensions
-    target_width, target_height = getattr(settings, 'PHOTO_DIMENSIONS', (400, 400))
-
-    # Calculate aspect ratio and resize
-    img.thumbnail((target_width, target_height), Image.Resampling.LANCZOS)
-
     # Create a square canvas with white background
     canvas = Image.new('RGB', (target_width, target_height), (255, 255, 255))
 
@@ -48,44 +145,70 @@ def process_profile_photo(photo, rotation=0):
     offset_y = (target_height - img.height) // 2
     canvas.paste(img, (offset_x, offset_y))
 
-    # Save to BytesIO
-    output = BytesIO()
-    canvas.save(output, format='JPEG', quality=85, optimize=True)
-    output.seek(0)
-
-    # Create InMemoryUploadedFile
-    return InMemoryUploadedFile(
-        output,
-        'ImageField',
-        f"{photo.name.split('.')[0]}.jpg",
-        'image/jpeg',
-        sys.getsizeof(output),
-        None
-    )
+    return canvas
+
+
+def render_photo_variants(photo, rotation=0):
+    """
+    Build every size variant of a profile photo in every format
+
+    The photo is decoded once (see decode_photo) and fitted to the largest
+    variant; the smaller ones are scaled down from that.
+
+    Args:
+        photo: UploadedFile or file object of the image
+        rotation: int - degrees to rotate (0, 90, 180, 270)
+
+    Returns:
+        dict: variant name -> {'width': int, <format>: encoded bytes, ...}
+    """
+    dimensions = get_photo_variant_dimensions()
+    largest = max(dimensions.values())
+    canvas = square_profile_photo(decode_photo(photo), rotation, largest)
+
+    variants = {}
+    for name, size in dimensions.items():
+        image = canvas if size == largest else canvas.resize(size, Image.Resampling.LANCZOS)
+        variant = {'width': size[0]}
+        for image_format, (pillow_format, options) in PHOTO_FORMATS.items():
+            output = BytesIO()
+            image.save(output, format=pillow_format, **options)
+            variant[image_format] = output.getvalue()
+        variants[name] = variant
+
+    return variants
 
 
 def validate_photo(photo):
     """
-    Validate photo file
+    Validate photo file and decode it for the photo job
+
+    The header is checked before anything is decoded; then the photo is
+    decoded once at a reduced size (see decode_photo), so a damaged upload is
+    rejected with the form and the photo job never reads the full upload.
 
     Returns:
-        tuple: (is_valid, error_message)
+        tuple: (photo, error_message) - photo is a lossless PNG ContentFile of
+               the decoded photo to pass to enqueue_photo(), or None
     """
     # Check file size
     max_size = getattr(settings, 'MAX_PHOTO_SIZE', 5 * 1024 * 1024)
     if photo.size > max_size:
-        return False, f'Image file too large. Maximum size is {max_size / 1024 / 1024}MB.'
+        return None, f'Image file too large. Maximum size is {max_size / 1024 / 1024}MB.'
 
     # Check file type
     valid_types = ['image/jpeg', 'image/jpg', 'image/png', 'image/gif', 'image/webp']
     if photo.content_type not in valid_types:
-        return False, 'Invalid file type. Please upload a JPG, PNG, GIF, or WebP image.'
+        return None, 'Invalid file type. Please upload a JPG, PNG, GIF, or WebP image.'
 
     try:
-        # Try to open as image
-        img = Image.open(photo)
-        img.verify()
+        img = decode_photo(photo)
+    except ValueError as e:
+        return None, str(e)
+    finally:
         photo.seek(0)  # Reset file pointer
-        return True, None
-    except Exception as e:
-        return False, f'Invalid image file: {str(e)}'
\ No newline at end of file
+
+    output = BytesIO()
+    # Fast compression: the file only lives until the photo job has read it
+    img.save(output, format='PNG', compress_level=1)
+    return ContentFile(output.getvalue(), name='photo.png'), None
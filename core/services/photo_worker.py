@@ -0,0 +1,15 @@
+"""
+Start-up of background photo processing worker processes
+
+Kept apart from photo_job_service: a spawned worker imports this module
+before Django is set up, so it must not import any models.
+"""
+
+
+def init_worker():
+    import django
+    django.setup()
+
+    # Load the Pillow codecs once per worker, not per job
+    from PIL import Image
+    Image.init()
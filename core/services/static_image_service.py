@@ -0,0 +1,335 @@
+"""
+Service for building optimized copies of the bundled static images
+
+build_static_images() is run at deploy time (see the build_static_images
+command). For every image under images/ in STATICFILES_DIRS it writes to
+STATIC_BUILD_DIR, under content hashed names:
+
+- PNGs recompressed losslessly, plus lossless WebP and AVIF variants
+  when those are smaller
+- SVGs minified
+- .gz and .br siblings of the text formats, for web servers that send
+  precompressed files (nginx gzip_static / brotli_static)
+
+and a manifest the static_picture template tag reads to offer browsers
+each image in the smallest format they accept. Brotli needs the optional
+brotli package; without it only .gz files are written.
+"""
+import gzip
+import hashlib
+import json
+import os
+import re
+import tempfile
+import threading
+from io import BytesIO
+from pathlib import Path, PurePosixPath
+
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+from PIL import Image, features
+
+MANIFEST_NAME = 'images.json'
+
+# Formats browsers understand, in the order <source> elements are preferred when equally small
+IMAGE_TYPES = {
+    '.avif': 'image/avif',
+    '.webp': 'image/webp',
+    '.png': 'image/png',
+    '.svg': 'image/svg+xml',
+}
+
+_manifest = None
+_manifest_mtime = None
+_manifest_lock = threading.Lock()
+
+
+def get_static_build_dir():
+    return Path(getattr(settings, 'STATIC_BUILD_DIR', Path(settings.BASE_DIR) / 'static' / 'build'))
+
+
+def _static_dir_paths():
+    for static_dir in settings.STATICFILES_DIRS:
+        yield Path(static_dir[1] if isinstance(static_dir, (list, tuple)) else static_dir).resolve()
+
+
+def get_static_build_prefix():
+    """
+    Static name of STATIC_BUILD_DIR, e.g. 'build'
+
+    Raises:
+        ImproperlyConfigured: if the directory is not inside STATICFILES_DIRS
+    """
+    build_dir = get_static_build_dir().resolve()
+    for static_dir in _static_dir_paths():
+        if build_dir == static_dir or static_dir in build_dir.parents:
+            return build_dir.relative_to(static_dir).as_posix()
+    raise ImproperlyConfigured('STATIC_BUILD_DIR must be inside one of the STATICFILES_DIRS.')
+
+
+def _hashed_name(name, data):
+    # images/Signal.png -> images/Signal.3f9c1a2b7d4e.png
+    path = PurePosixPath(name)
+    digest = hashlib.sha256(data).hexdigest()[:12]
+    return str(path.with_name(f"{path.stem}.{digest}{path.suffix}"))
+
+
+def _png_bytes(img, **options):
+    output = BytesIO()
+    img.save(output, format='PNG', optimize=True, **options)
+    return output.getvalue()
+
+
+def recompress_png(data):
+    """
+    Smallest lossless PNG encoding of an image
+
+    Besides zlib's best compression, images with at most 256 colors are tried
+    as a palette image, which is kept only if it decodes to the same pixels.
+
+    Returns:
+        bytes: the smallest PNG, possibly the original one
+    """
+    img = Image.open(BytesIO(data))
+    img.load()
+    candidates = [data, _png_bytes(img)]
+
+    if img.mode in ('RGB', 'RGBA') and img.getcolors(256) is not None:
+        palette = img.quantize(256, method=Image.Quantize.FASTOCTREE if img.mode == 'RGBA' else Image.Quantize.MEDIANCUT)
+        if palette.convert(img.mode).tobytes() == img.tobytes():
+            candidates.append(_png_bytes(palette))
+
+    return min(candidates, key=len)
+
+
+def visible_pixels(img):
+    """
+    An image's pixels with the colour of fully transparent ones dropped
+
+    Returns:
+        bytes
+    """
+    if img.mode in ('RGBA', 'LA', 'PA') or 'transparency' in img.info:
+        return img.convert('RGBA').convert('RGBa').tobytes()
+    return img.convert('RGB').tobytes()
+
+
+def _decodes_to(data, pixels):
+    with Image.open(BytesIO(data)) as decoded:
+        return visible_pixels(decoded) == pixels
+
+
+def image_variants(data):
+    """
+    Lossless WebP and AVIF encodings of a PNG
+
+    Every variant must decode to exactly the PNG's visible pixels. WebP
+    has a lossless mode (it may only recolour fully transparent pixels).
+    AVIF is encoded at full quality without chroma subsampling, but Pillow
+    always converts to YUV, so most images come back slightly changed;
+    AVIF is then left out and browsers get the WebP or the PNG. This gives
+    up AVIF's smaller lossy files so a sign never reads differently
+    depending on the browser.
+
+    Returns:
+        dict: suffix -> bytes
+    """
+    img = Image.open(BytesIO(data))
+    img.load()
+    if img.mode not in ('RGB', 'RGBA'):
+        img = img.convert('RGBA' if 'transparency' in img.info or img.mode in ('LA', 'PA') else 'RGB')
+
+    variants = {}
+    output = BytesIO()
+    img.save(output, format='WEBP', lossless=True, method=6)
+    variants['.webp'] = output.getvalue()
+
+    if features.check('avif'):
+        output = BytesIO()
+        img.save(output, format='AVIF', quality=100, subsampling='4:4:4')
+        if _decodes_to(output.getvalue(), visible_pixels(img)):
+            variants['.avif'] = output.getvalue()
+    return variants
+
+
+def minify_svg(data):
+    """
+    Drop comments, metadata and whitespace between tags from an SVG
+
+    Whitespace inside <text> elements, their <tspan>s included, is left alone.
+    """
+    text = data.decode('utf-8')
+    text = re.sub(r'<\?xml.*?\?>|<!--.*?-->|<metadata\b.*?</metadata>', '', text, flags=re.S)
+    # Odd parts are whole <text> elements and are kept as they are; the
+    # others start and end at a tag, so whitespace at their ends goes too
+    parts = re.split(r'(<text\b.*?</text>)', text, flags=re.S)
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r'\s+', ' ', re.sub(r'>\s+<', '><', parts[i].strip()))
+    return ''.join(parts).encode('utf-8')
+
+
+def _precompressed(data):
+    siblings = {'.gz': gzip.compress(data, compresslevel=9, mtime=0)}
+    try:
+        import brotli
+    except ImportError:
+        pass
+    else:
+        siblings['.br'] = brotli.compress(data, quality=11)
+    return {suffix: compressed for suffix, compressed in siblings.items() if len(compressed) < len(data)}
+
+
+def find_source_images():
+    """
+    The bundled images to optimize
+
+    Returns:
+        dict: static name (e.g. images/Signal.png) -> Path, first match wins
+    """
+    build_dir = get_static_build_dir().resolve()
+    sources = {}
+    for static_dir in _static_dir_paths():
+        for path in sorted((static_dir / 'images').rglob('*')):
+            if build_dir in path.parents or path.suffix.lower() not in IMAGE_TYPES or not path.is_file():
+                continue
+            sources.setdefault(path.relative_to(static_dir).as_posix(), path)
+    return sources
+
+
+def build_image(name, data):
+    """
+    Optimized files of one image
+
+    Args:
+        name: static name of the source image
+        data: bytes of the source image
+
+    Returns:
+        tuple: (manifest entry, {hashed static name: bytes} of the files to write)
+    """
+    suffix = PurePosixPath(name).suffix.lower()
+    files = {}
+    entry = {'files': {}}
+
+    if suffix == '.svg':
+        # Text, so it also gets precompressed siblings
+        minified = minify_svg(data)
+        hashed = _hashed_name(name, minified)
+        files[hashed] = minified
+        entry['files'][IMAGE_TYPES[suffix]] = {'name': hashed, 'size': len(minified)}
+        for compressed_suffix, compressed in _precompressed(minified).items():
+            files[hashed + compressed_suffix] = compressed
+        return entry, files
+
+    recompressed = recompress_png(data) if suffix == '.png' else data
+    with Image.open(BytesIO(recompressed)) as img:
+        entry['width'], entry['height'] = img.size
+
+    encodings = {suffix: recompressed}
+    if suffix == '.png':
+        # Only variants smaller than the PNG are worth a <source>
+        encodings.update({
+            variant_suffix: variant for variant_suffix, variant in image_variants(recompressed).items()
+            if len(variant) < len(recompressed)
+        })
+
+    for encoding_suffix, encoded in encodings.items():
+        hashed = _hashed_name(str(PurePosixPath(name).with_suffix(encoding_suffix)), encoded)
+        files[hashed] = encoded
+        entry['files'][IMAGE_TYPES[encoding_suffix]] = {'name': hashed, 'size': len(encoded)}
+    return entry, files
+
+
+def _write_atomic(path, data):
+    path.parent.mkdir(parents=True, exist_ok=True)
+    fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.chmod(tmp_path, 0o644)
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def build_static_images(sources=None):
+    """
+    Write the optimized images and their manifest to STATIC_BUILD_DIR
+
+    Files of the previous build that are no longer in the manifest are
+    deleted after the new manifest is in place.
+
+    Args:
+        sources: dict of static name -> Path (defaults to find_source_images())
+
+    Returns:
+        dict: the manifest
+    """
+    if sources is None:
+        sources = find_source_images()
+    build_dir = get_static_build_dir()
+
+    images = {}
+    written = set()
+    for name, path in sources.items():
+        entry, files = build_image(name, path.read_bytes())
+        entry['source_size'] = path.stat().st_size
+        images[name] = entry
+        for hashed, data in files.items():
+            target = build_dir / hashed
+            # Hashed names never change content; skip files an earlier build wrote
+            if not target.exists():
+                _write_atomic(target, data)
+            written.add(target.resolve())
+
+    manifest = {'version': 1, 'images': images}
+    _write_atomic(build_dir / MANIFEST_NAME, json.dumps(manifest, indent=2, sort_keys=True).encode())
+    written.add((build_dir / MANIFEST_NAME).resolve())
+
+    for path in build_dir.rglob('*'):
+        if path.is_file() and path.resolve() not in written:
+            path.unlink()
+    return manifest
+
+
+def get_static_image_manifest():
+    """
+    The manifest of the last build, or an empty one before the first build
+
+    Reloaded when the build changes it, so a running server picks up a
+    rebuild without a restart.
+    """
+    global _manifest, _manifest_mtime
+    path = get_static_build_dir() / MANIFEST_NAME
+    try:
+        mtime = path.stat().st_mtime_ns
+    except FileNotFoundError:
+        return {'images': {}}
+
+    with _manifest_lock:
+        if mtime != _manifest_mtime:
+            with open(path) as manifest_file:
+                _manifest = json.load(manifest_file)
+            _manifest_mtime = mtime
+        return _manifest
+
+
+def get_static_image(name):
+    """
+    Built files of a static image, smallest first
+
+    Args:
+        name: static name of the source image, e.g. 'images/default_user.png'
+
+    Returns:
+        tuple: (list of (MIME type, static name) pairs, manifest entry), or
+               (None, None) if the image has not been built
+    """
+    entry = get_static_image_manifest()['images'].get(name)
+    if entry is None:
+        return None, None
+    prefix = get_static_build_prefix()
+    order = list(IMAGE_TYPES.values())
+    files = sorted(entry['files'].items(), key=lambda item: (item[1]['size'], order.index(item[0])))
+    return [(content_type, f"{prefix}/{file['name']}") for content_type, file in files], entry
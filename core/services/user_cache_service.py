@@ -0,0 +1,94 @@
+"""
+Service for loading the logged in user from the cache instead of the database
+
+The cache keeps a compact record of each logged in AccountUser: the fields
+pages use, plus the session auth hash sessions are verified against. A
+request whose session matches the record gets its user without a query.
+The record is dropped whenever the user is saved or deleted, so a password,
+profile or permission change takes effect on the next request.
+"""
+from django.conf import settings
+from django.contrib import auth
+from django.core.cache import cache
+from django.db import DEFAULT_DB_ALIAS, transaction
+from django.db.models.signals import post_delete, post_save
+from django.dispatch import receiver
+from django.utils.crypto import constant_time_compare
+
+from core.models.custom_user import AccountUser
+
+# Loaded from the cache; any other field is fetched from the database on first access
+CACHED_USER_FIELDS = (
+    'id',
+    'email',
+    'first_name',
+    'last_name',
+    'user_type',
+    'is_active',
+    'is_staff',
+    'is_superuser',
+)
+
+
+def _user_cache_key(user_id):
+    return f'user:{user_id}:auth'
+
+
+def _user_record(user):
+    return {
+        'fields': [getattr(user, field) for field in CACHED_USER_FIELDS],
+        'session_auth_hash': user.get_session_auth_hash(),
+    }
+
+
+def _user_from_record(record):
+    # Fields that are not cached stay deferred, so saving this user only
+    # writes the cached fields and never blanks out the others
+    values = dict(zip(CACHED_USER_FIELDS, record['fields']))
+    field_names = [field.attname for field in AccountUser._meta.concrete_fields if field.attname in values]
+    return AccountUser.from_db(DEFAULT_DB_ALIAS, field_names, [values[name] for name in field_names])
+
+
+def get_cached_user(request):
+    """
+    The user of a request's session, from the cache when possible
+
+    Sessions are verified exactly like django.contrib.auth.get_user(); on a
+    cache miss, or when the session's auth hash does not match the cached
+    one, that function does the work (including flushing a session whose
+    password has changed) and its user is cached for the next request.
+
+    Returns:
+        AccountUser or AnonymousUser
+    """
+    session = request.session
+    user_id = session.get(auth.SESSION_KEY)
+    session_hash = session.get(auth.HASH_SESSION_KEY)
+    if user_id is None or session.get(auth.BACKEND_SESSION_KEY) not in settings.AUTHENTICATION_BACKENDS:
+        return auth.get_user(request)
+
+    record = cache.get(_user_cache_key(user_id))
+    if record is not None and session_hash and constant_time_compare(session_hash, record['session_auth_hash']):
+        return _user_from_record(record)
+
+    user = auth.get_user(request)
+    if user.is_authenticated:
+        cache.set(_user_cache_key(user.pk), _user_record(user), getattr(settings, 'USER_CACHE_TIMEOUT', 3600))
+    return user
+
+
+def invalidate_cached_user(user_id):
+    key = _user_cache_key(user_id)
+    cache.delete(key)
+    # Also drop anything cached by another request before this transaction commits
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+# ============================================
+# SIGNALS
+# ============================================
+
+@receiver(post_save, sender=AccountUser)
+@receiver(post_delete, sender=AccountUser)
+def user_changed(sender, instance, **kwargs):
+    invalidate_cached_user(instance.pk)
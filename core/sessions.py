@@ -0,0 +1,69 @@
+"""
+Session engine that reads from the cache and writes to the database lazily
+
+Use with SESSION_ENGINE = 'core.sessions'.
+"""
+import logging
+import time
+
+from django.conf import settings
+from django.contrib.sessions.backends.cached_db import SessionStore as CachedDBStore
+from django.contrib.sessions.backends.db import SessionStore as DBStore
+
+logger = logging.getLogger('django.contrib.sessions')
+
+
+class SessionStore(CachedDBStore):
+    '''
+    Cache-first sessions with write-behind to the database.
+
+    Sessions are read from the cache like the cached_db engine; the database
+    row is only read when the cache has lost the session. A new or changed
+    session is written through to the database, so losing the cache can
+    never log anyone in or out or lose session data. Saving an unchanged
+    session (SESSION_SAVE_EVERY_REQUEST refreshing its expiry) only updates
+    the cache, and writes the database row at most once per
+    SESSION_WRITE_BEHIND_SECONDS; at worst the cache's loss then shortens a
+    session by one write-behind interval.
+    '''
+    cache_key_prefix = 'core.sessions'
+
+    def _synced_key(self, session_key):
+        # When the database row was last written, kept next to the cached session
+        return f"{self.cache_key_prefix}{session_key}:synced"
+
+    def load(self):
+        try:
+            data = self._cache.get(self.cache_key)
+        except Exception:
+            data = None
+        if data is None:
+            data = super().load()
+            if data:
+                # Just read from the database, so the row is current
+                self._cache.set(self._synced_key(self.session_key), time.time(), self.get_expiry_age())
+        return data
+
+    def save(self, must_create=False):
+        if not must_create and not self.modified and self.session_key is not None:
+            synced_at = self._cache.get(self._synced_key(self.session_key))
+            if synced_at is not None and time.time() - synced_at < getattr(settings, 'SESSION_WRITE_BEHIND_SECONDS', 300):
+                try:
+                    self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+                    return
+                except Exception:
+                    logger.exception("Error saving to cache (%s); writing the session to the database", self._cache)
+
+        DBStore.save(self, must_create)
+        try:
+            self._cache.set(self.cache_key, self._session, self.get_expiry_age())
+            self._cache.set(self._synced_key(self.session_key), time.time(), self.get_expiry_age())
+        except Exception:
+            logger.exception("Error saving to cache (%s)", self._cache)
+
+    def delete(self, session_key=None):
+        if session_key is None:
+            session_key = self.session_key
+        super().delete(session_key)
+        if session_key is not None:
+            self._cache.delete(self._synced_key(session_key))
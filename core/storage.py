@@ -0,0 +1,88 @@
+import hashlib
+import os
+import tempfile
+from pathlib import PurePath
+
+from django.core.files.storage import FileSystemStorage
+
+
+class ContentAddressedStorage(FileSystemStorage):
+    '''
+    File system storage that names every file by the SHA-256 of its content.
+
+    The directory and name a file is saved under are replaced with
+    <prefix>/<first two hex digits>/<digest><extension>, so identical files
+    are stored once and a name always stands for the same bytes: its URL can
+    be cached forever. Saving content that is already stored writes nothing.
+
+    Files are shared, so they are never deleted by the code that saved them;
+    see core.services.photo_blob_service for reference counting.
+    '''
+
+    def __init__(self, prefix='', **kwargs):
+        super().__init__(**kwargs)
+        self.prefix = prefix
+
+    def hashed_name(self, name, content):
+        """
+        The name a file with this content is stored under
+
+        Args:
+            name: requested name; only its extension is kept
+            content: File to be saved
+        """
+        digest = hashlib.sha256()
+        content.seek(0)
+        for chunk in content.chunks():
+            digest.update(chunk)
+        content.seek(0)
+        digest = digest.hexdigest()
+        return str(PurePath(self.prefix, digest[:2], digest + PurePath(name).suffix.lower()))
+
+    def content_digest(self, name):
+        """
+        The SHA-256 a stored name was made from
+
+        Returns:
+            str: hex digest, or None for a file not saved by this storage
+        """
+        path = PurePath(name)
+        digest = path.stem
+        if (len(digest) == 64 and all(c in '0123456789abcdef' for c in digest)
+                and path.parent == PurePath(self.prefix, digest[:2])):
+            return digest
+        return None
+
+    def get_available_name(self, name, max_length=None):
+        # A name is its content; never make up another one
+        return name
+
+    def _save(self, name, content):
+        name = self.hashed_name(name, content)
+        path = self.path(name)
+        if os.path.exists(path):
+            return name
+
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Written under a temporary name and renamed into place, so a
+        # concurrent save of the same content never sees a partial file
+        fd, tmp_path = tempfile.mkstemp(dir=directory, suffix='.tmp')
+        try:
+            with os.fdopen(fd, 'wb') as tmp:
+                for chunk in content.chunks():
+                    tmp.write(chunk)
+            if self.file_permissions_mode is not None:
+                os.chmod(tmp_path, self.file_permissions_mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            os.unlink(tmp_path)
+            raise
+        return name
+
+
+photo_storage = ContentAddressedStorage(prefix='profile_photos')
+
+
+def get_photo_storage():
+    return photo_storage
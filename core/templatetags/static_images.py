@@ -0,0 +1,47 @@
+from django import template
+from django.templatetags.static import static
+from django.utils.html import format_html, format_html_join
+
+from core.services.static_image_service import get_static_image
+
+register = template.Library()
+
+
+@register.simple_tag
+def static_picture(name, alt='', css_class='', style=''):
+    """
+    A bundled image as a <picture> offering its built formats, smallest first
+
+    The browser takes the first format it accepts. Before the images are
+    built (see the build_static_images command) this is a plain <img> of
+    the source file.
+
+    Usage:
+        {% static_picture 'images/default_user.png' alt='' css_class='user-photo' %}
+    """
+    files, entry = get_static_image(name)
+    if not files:
+        return format_html(
+            '<img src="{}" alt="{}"{}{}>', static(name), alt,
+            format_html(' class="{}"', css_class) if css_class else '',
+            format_html(' style="{}"', style) if style else '',
+        )
+
+    # Every browser shows the source format, so it is the <img> and nothing larger is offered
+    fallback_type = next(content_type for content_type, _ in files if content_type in ('image/png', 'image/svg+xml'))
+    sources = []
+    for content_type, file_name in files:
+        if content_type == fallback_type:
+            break
+        sources.append((content_type, static(file_name)))
+    fallback = dict(files)[fallback_type]
+
+    return format_html(
+        '<picture style="display: contents;">{}<img src="{}" alt="{}"{}{}{}></picture>',
+        format_html_join('', '<source type="{}" srcset="{}">', sources),
+        static(fallback),
+        alt,
+        format_html(' width="{}" height="{}"', entry['width'], entry['height']) if 'width' in entry else '',
+        format_html(' class="{}"', css_class) if css_class else '',
+        format_html(' style="{}"', style) if style else '',
+    )
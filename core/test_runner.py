@@ -0,0 +1,36 @@
+"""
+Test runner that keeps test runs apart from the development server
+
+Use with TEST_RUNNER = 'core.test_runner.TestRunner'.
+"""
+from copy import deepcopy
+from pathlib import Path
+
+from django.conf import settings
+from django.test import override_settings
+from django.test.runner import DiscoverRunner
+
+
+class TestRunner(DiscoverRunner):
+    '''
+    Runs the tests with their own cache directory and a fast password hasher.
+
+    Tests clear the shared file cache, so they must never use the development
+    server's. Tests of the hashers override PASSWORD_HASHERS themselves.
+    Spawned worker processes load the plain settings and hash with the
+    configured hashers, so those still check passwords here.
+    '''
+
+    def setup_test_environment(self, **kwargs):
+        super().setup_test_environment(**kwargs)
+        caches = deepcopy(settings.CACHES)
+        caches['default']['LOCATION'] = Path(settings.BASE_DIR) / 'cache' / 'test'
+        self.test_settings = override_settings(
+            CACHES=caches,
+            PASSWORD_HASHERS=['django.contrib.auth.hashers.MD5PasswordHasher', *settings.PASSWORD_HASHERS],
+        )
+        self.test_settings.enable()
+
+    def teardown_test_environment(self, **kwargs):
+        self.test_settings.disable()
+        super().teardown_test_environment(**kwargs)
@@ -1,3 +1,744 @@
-from django.test import TestCase
+import tempfile
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from io import BytesIO, StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.contrib.auth.hashers import get_hasher, make_password
+from django.core import mail
+from django.core.cache import cache, caches
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.core.management import call_command
+from django.core.mail.backends.locmem import EmailBackend
+from django.test import RequestFactory, TestCase, override_settings
+from django.urls import reverse
+from django.utils import timezone
+from PIL import Image
+
+from core.checks import check_shared_cache
+from core.models.custom_user import AccountUser
+from core.models.outbox_email import OutboxEmail
+from core.models.photo_blob import PhotoBlob
+from core.models.photo_job import PhotoJob
+from core.services import login_throttle_service
+from core.services.email_outbox_service import _delivery_pass, deliver_outbox, queue_email, requeue_stale_emails
+from core.services.login_throttle_service import (
+    CacheBackend,
+    LocalMemoryBackend,
+    get_login_throttle_metrics,
+    reset_login_throttle,
+    throttle_login,
+)
+from core.services.photo_blob_service import (
+    acquire_photo_files,
+    collect_photo_garbage,
+    release_photo_files,
+    store_photo_file,
+)
+from core.services.photo_job_service import enqueue_photo, photo_files, run_photo_job
+from core.services.photo_utils import validate_photo
+from core.services.static_image_service import find_source_images, image_variants, minify_svg, visible_pixels
+from core.services.user_cache_service import _user_cache_key
+from core.sessions import SessionStore
+from core.storage import get_photo_storage
+from parent.models.parent_invitation import ParentInvitation
+from parent.models.parent_profile import ParentProfile
+from parent.models.parent_student_relationship import ParentStudentRelationship
+from student.models.student_profile import StudentProfile
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def burst(take, attempts):
+    '''
+    Run attempts at once from as many threads, released together by a barrier.
+    '''
+    barrier = threading.Barrier(attempts)
+
+    def attempt(number):
+        barrier.wait()
+        return take(number)
+
+    with ThreadPoolExecutor(max_workers=attempts) as pool:
+        return list(pool.map(attempt, range(attempts)))
+
+
+class TokenBucketTests(TestCase):
+    '''
+    Both backends spend and refill buckets the same way.
+    '''
+
+    def setUp(self):
+        cache.clear()
+
+    def backends(self, clock):
+        return [LocalMemoryBackend(clock=clock), CacheBackend(clock=clock)]
+
+    def test_burst_then_throttled(self):
+        for backend in self.backends(FakeClock()):
+            with self.subTest(backend=type(backend).__name__):
+                waits = [backend.take('bucket', 3, 0.5) for _ in range(4)]
+                self.assertEqual(waits[:3], [0, 0, 0])
+                self.assertAlmostEqual(waits[3], 2.0)
+
+    def test_refills_at_rate(self):
+        clock = FakeClock()
+        for backend in self.backends(clock):
+            with self.subTest(backend=type(backend).__name__):
+                for _ in range(3):
+                    backend.take('bucket', 3, 0.5)
+                clock.now += 2
+                self.assertEqual(backend.take('bucket', 3, 0.5), 0)
+                self.assertGreater(backend.take('bucket', 3, 0.5), 0)
+
+    def test_buckets_are_independent(self):
+        for backend in self.backends(FakeClock()):
+            with self.subTest(backend=type(backend).__name__):
+                backend.take('first', 1, 1)
+                self.assertGreater(backend.take('first', 1, 1), 0)
+                self.assertEqual(backend.take('second', 1, 1), 0)
+
+    def test_local_memory_is_bounded(self):
+        backend = LocalMemoryBackend(max_keys=10)
+        for number in range(100):
+            backend.take(f'bucket{number}', 1, 1)
+        self.assertEqual(len(backend._buckets), 10)
+
+    def test_cache_buckets_are_shared(self):
+        clock = FakeClock()
+        first, second = CacheBackend(clock=clock), CacheBackend(clock=clock)
+        first.take('bucket', 2, 0.1)
+        first.take('bucket', 2, 0.1)
+        self.assertGreater(second.take('bucket', 2, 0.1), 0)
+
+    def test_concurrent_burst_local_memory(self):
+        backend = LocalMemoryBackend(clock=FakeClock())
+        waits = burst(lambda number: backend.take('bucket', 10, 0.1), 50)
+        self.assertEqual(waits.count(0), 10)
+
+    def test_concurrent_burst_cache(self):
+        backend = CacheBackend(lock_wait=5, clock=FakeClock())
+        waits = burst(lambda number: backend.take('bucket', 10, 0.1), 50)
+        self.assertEqual(waits.count(0), 10)
+
+    def test_cache_lock_contention_throttles(self):
+        backend = CacheBackend(lock_wait=0)
+        cache.add(backend.key_prefix + 'bucket:lock', 1)
+        self.assertGreater(backend.take('bucket', 10, 0.1), 0)
+
+
+@override_settings(LOGIN_THROTTLE_BACKEND='local', LOGIN_THROTTLE_RATES={'ip': (5, 60), 'email': (3, 60)})
+class LoginThrottleTests(TestCase):
+    '''
+    Throttled logins are rejected before authenticate() hashes the password.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AccountUser.objects.create_user(email='parent@example.com', password='password123', user_type='PARENT')
+
+    def setUp(self):
+        reset_login_throttle()
+        self.addCleanup(reset_login_throttle)
+
+    def assertLogsThrottled(self):
+        return self.assertLogs('core.services.login_throttle_service', 'WARNING')
+
+    def test_concurrent_burst_from_one_ip(self):
+        factory = RequestFactory()
+        with self.assertLogsThrottled():
+            results = burst(
+                lambda number: throttle_login(factory.post('/login/', REMOTE_ADDR='203.0.113.7'), f'user{number}@example.com'),
+                40,
+            )
+        self.assertEqual(results.count(0), 5)
+        self.assertEqual(get_login_throttle_metrics(), {'allowed': 5, 'rejected_ip': 35, 'rejected_email': 0})
+
+    def test_concurrent_burst_against_one_email(self):
+        factory = RequestFactory()
+        with self.assertLogsThrottled():
+            results = burst(
+                lambda number: throttle_login(factory.post('/login/', REMOTE_ADDR=f'203.0.113.{number}'), 'Parent@Example.com '),
+                40,
+            )
+        self.assertEqual(results.count(0), 3)
+        self.assertEqual(get_login_throttle_metrics(), {'allowed': 3, 'rejected_ip': 0, 'rejected_email': 37})
+
+    def test_ipv6_clients_grouped_by_network(self):
+        factory = RequestFactory()
+        for host in range(5):
+            throttle_login(factory.post('/login/', REMOTE_ADDR=f'2001:db8::{host}'), f'user{host}@example.com')
+        with self.assertLogsThrottled() as logs:
+            self.assertGreater(throttle_login(factory.post('/login/', REMOTE_ADDR='2001:db8::ffff'), 'other@example.com'), 0)
+        self.assertIn('2001:db8::/64', logs.output[0])
+
+    def test_login_view_skips_authenticate_when_throttled(self):
+        with mock.patch('core.views.authenticate', return_value=None) as authenticate, self.assertLogsThrottled():
+            responses = [
+                self.client.post(reverse('login'), {'email': 'parent@example.com', 'password': 'wrong'})
+                for _ in range(5)
+            ]
+        self.assertEqual(authenticate.call_count, 3)
+        self.assertEqual([response.status_code for response in responses], [200, 200, 200, 429, 429])
+        self.assertEqual(int(responses[-1]['Retry-After']), 20)
+
+    def test_login_still_works_under_the_limit(self):
+        response = self.client.post(reverse('login'), {'email': 'parent@example.com', 'password': 'password123'})
+        self.assertEqual(response.status_code, 302)
+        self.assertEqual(int(self.client.session['_auth_user_id']), self.user.pk)
+
+    def test_accept_invitation_skips_authenticate_when_throttled(self):
+        inviter = ParentProfile.objects.get(user=self.user)
+        invitation = ParentInvitation.objects.create(
+            inviter=inviter,
+            student=StudentProfile.objects.create(first_name='Student', last_name='Test'),
+            invited_email='other@example.com',
+            expires_at=timezone.now() + timedelta(days=7),
+        )
+        url = reverse('accept_invitation', args=[invitation.token])
+        with mock.patch('parent.views.authenticate', return_value=None) as authenticate, self.assertLogsThrottled():
+            responses = [
+                self.client.post(url, {'action': 'login', 'email': 'other@example.com', 'password': 'wrong'})
+                for _ in range(4)
+            ]
+        self.assertEqual(authenticate.call_count, 3)
+        self.assertEqual(responses[-1].status_code, 429)
+
+    @override_settings(LOGIN_THROTTLE_BACKEND='cache')
+    def test_backend_follows_settings(self):
+        self.assertIsInstance(login_throttle_service.get_backend(), CacheBackend)
+
+
+class CountingBackend(EmailBackend):
+    '''
+    locmem backend that counts opened connections and bounces some recipients.
+    '''
+    opened = 0
+
+    def open(self):
+        CountingBackend.opened += 1
+        return True
+
+    def send_messages(self, messages):
+        for message in messages:
+            if any('bounce' in address for address in message.to):
+                raise ConnectionError('Recipient refused')
+        return super().send_messages(messages)
+
+
+class DownBackend(EmailBackend):
+    '''
+    A mail server that cannot be reached.
+    '''
+
+    def open(self):
+        raise ConnectionRefusedError('Connection refused')
+
+
+@override_settings(EMAIL_BACKEND='core.tests.CountingBackend', EMAIL_OUTBOX_BATCH_SIZE=50, EMAIL_OUTBOX_MAX_ATTEMPTS=3)
+class EmailOutboxTests(TestCase):
+    '''
+    Emails are only written to the outbox by requests and delivered in batches later.
+    '''
+
+    def setUp(self):
+        CountingBackend.opened = 0
+
+    def test_queue_does_not_send(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            email = queue_email('Subject', 'Body', ['parent@example.com'])
+        self.assertEqual(email.status, 'PENDING')
+        self.assertEqual(len(mail.outbox), 0)
+        self.assertEqual(len(callbacks), 1)
+
+    @override_settings(EMAIL_OUTBOX_DELIVER_IN_PROCESS=False)
+    def test_queue_leaves_delivery_to_the_worker(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            queue_email('Subject', 'Body', ['parent@example.com'])
+        self.assertEqual(callbacks, [])
+
+    def test_batches_share_a_connection(self):
+        for number in range(120):
+            queue_email(f'Email {number}', 'Body', [f'parent{number}@example.com'])
+        self.assertEqual(deliver_outbox(), {'SENT': 120, 'PENDING': 0, 'FAILED': 0})
+        self.assertEqual(len(mail.outbox), 120)
+        self.assertEqual(CountingBackend.opened, 3)
+        self.assertFalse(OutboxEmail.objects.exclude(status='SENT').exists())
+
+    def test_failed_email_is_retried_with_backoff(self):
+        queue_email('Good', 'Body', ['parent@example.com'])
+        bounced = queue_email('Bad', 'Body', ['bounce@example.com'])
+        before = timezone.now()
+        self.assertEqual(deliver_outbox(), {'SENT': 1, 'PENDING': 1, 'FAILED': 0})
+
+        bounced.refresh_from_db()
+        self.assertEqual((bounced.status, bounced.attempts), ('PENDING', 1))
+        self.assertIn('Recipient refused', bounced.last_error)
+        self.assertGreaterEqual(bounced.next_attempt_at, before + timedelta(seconds=48))
+        self.assertLessEqual(bounced.next_attempt_at, timezone.now() + timedelta(seconds=72))
+        # Not due yet
+        self.assertEqual(deliver_outbox(), {'SENT': 0, 'PENDING': 0, 'FAILED': 0})
+
+    def test_gives_up_after_max_attempts(self):
+        bounced = queue_email('Bad', 'Body', ['bounce@example.com'])
+        delays = []
+        with self.assertLogs('core.services.email_outbox_service', 'ERROR'):
+            for _ in range(3):
+                OutboxEmail.objects.filter(pk=bounced.pk).update(next_attempt_at=timezone.now())
+                started = timezone.now()
+                deliver_outbox()
+                bounced.refresh_from_db()
+                delays.append((bounced.next_attempt_at - started).total_seconds())
+        self.assertEqual((bounced.status, bounced.attempts), ('FAILED', 3))
+        # Each retry waits about twice as long as the one before
+        self.assertGreater(delays[1], delays[0] * 1.3)
+
+    @override_settings(EMAIL_BACKEND='core.tests.DownBackend')
+    def test_unreachable_server_retries_the_batch(self):
+        for number in range(3):
+            queue_email(f'Email {number}', 'Body', [f'parent{number}@example.com'])
+        with self.assertLogs('core.services.email_outbox_service', 'WARNING'):
+            self.assertEqual(deliver_outbox(), {'SENT': 0, 'PENDING': 3, 'FAILED': 0})
+        self.assertEqual(OutboxEmail.objects.filter(status='PENDING', attempts=1).count(), 3)
+
+    def test_stale_sending_email_is_requeued(self):
+        email = queue_email('Subject', 'Body', ['parent@example.com'])
+        OutboxEmail.objects.filter(pk=email.pk).update(status='SENDING', claimed_at=timezone.now() - timedelta(hours=1))
+        self.assertEqual(requeue_stale_emails(), 1)
+        self.assertEqual(deliver_outbox()['SENT'], 1)
+
+    def test_delivery_thread_requeues_stale_emails(self):
+        stale = queue_email('Stale', 'Body', ['parent@example.com'])
+        OutboxEmail.objects.filter(pk=stale.pk).update(status='SENDING', claimed_at=timezone.now() - timedelta(hours=1))
+        sending = queue_email('Sending', 'Body', ['parent@example.com'])
+        OutboxEmail.objects.filter(pk=sending.pk).update(status='SENDING', claimed_at=timezone.now())
+
+        self.assertEqual(_delivery_pass(60), 60)
+        self.assertEqual([message.subject for message in mail.outbox], ['Stale'])
+        self.assertEqual(OutboxEmail.objects.get(pk=sending.pk).status, 'SENDING')
+
+    @override_settings(EMAIL_BACKEND='core.tests.DownBackend')
+    def test_invite_parent_queues_the_email(self):
+        user = AccountUser.objects.create_user(email='parent@example.com', password='password123', user_type='PARENT')
+        student = StudentProfile.objects.create(first_name='Student', last_name='Test')
+        ParentStudentRelationship.objects.create(parent=ParentProfile.objects.get(user=user), student=student)
+        self.client.force_login(user)
+
+        response = self.client.post(reverse('invite_parent', args=[student.id]), {'invited_email': 'other@example.com'})
+
+        self.assertRedirects(response, reverse('view_student', args=[student.id]), fetch_redirect_response=False)
+        invitation = ParentInvitation.objects.get(student=student)
+        email = OutboxEmail.objects.get()
+        self.assertEqual(email.to, ['other@example.com'])
+        self.assertIn(str(invitation.token), email.body)
+        self.assertEqual(len(mail.outbox), 0)
+
+
+class SharedCacheTests(TestCase):
+    '''
+    Cached state must be invalidated in every process, so the cache has to be shared.
+    '''
+
+    def test_configured_cache_is_shared(self):
+        self.assertEqual(check_shared_cache(None), [])
+
+    @override_settings(CACHES={'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache'}})
+    def test_local_memory_cache_fails_the_check(self):
+        self.assertEqual([error.id for error in check_shared_cache(None)], ['core.E001'])
+
+    def test_add_is_atomic_across_connections(self):
+        cache.clear()
+        connections = [caches.create_connection('default') for _ in range(20)]
+        added = burst(lambda number: connections[number].add('lock', number), 20)
+        self.assertEqual(added.count(True), 1)
+
+
+def temporary_media(test):
+    '''
+    Point MEDIA_ROOT at a new directory for one test.
+    '''
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    settings_override = override_settings(MEDIA_ROOT=directory.name)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+
+
+def photo_upload(image_format, content_type, truncate=False, size=(640, 480)):
+    output = BytesIO()
+    Image.effect_noise(size, 64).convert('RGB').save(output, format=image_format)
+    data = output.getvalue()
+    if truncate:
+        data = data[:len(data) // 2]
+    return SimpleUploadedFile(f'photo.{image_format.lower()}', data, content_type=content_type)
+
+
+class PhotoValidationTests(TestCase):
+    '''
+    Photos are decoded once at upload: damaged ones are rejected before a
+    photo job is queued, and the job gets the decoded photo.
+    '''
+
+    def test_valid_photos(self):
+        for image_format, content_type in (
+            ('JPEG', 'image/jpeg'), ('PNG', 'image/png'), ('GIF', 'image/gif'), ('WEBP', 'image/webp'),
+        ):
+            with self.subTest(image_format=image_format):
+                photo = photo_upload(image_format, content_type)
+                decoded, error_message = validate_photo(photo)
+                self.assertIsNone(error_message)
+                self.assertEqual(photo.tell(), 0)
+                with Image.open(decoded) as img:
+                    self.assertEqual((img.format, img.size), ('PNG', (640, 480)))
+
+    def test_large_jpeg_is_decoded_at_reduced_scale(self):
+        decoded, error_message = validate_photo(photo_upload('JPEG', 'image/jpeg', size=(2400, 1800)))
+        self.assertIsNone(error_message)
+        # Decoded at 1/2 scale by draft(), still at least twice the 400px variant
+        with Image.open(decoded) as img:
+            self.assertEqual(img.size, (1200, 900))
+
+    def test_truncated_photos(self):
+        for image_format, content_type in (('JPEG', 'image/jpeg'), ('PNG', 'image/png'), ('GIF', 'image/gif')):
+            with self.subTest(image_format=image_format):
+                decoded, error_message = validate_photo(photo_upload(image_format, content_type, truncate=True))
+                self.assertIsNone(decoded)
+                self.assertIn('damaged or incomplete', error_message)
+
+    @override_settings(MAX_PHOTO_PIXELS=1000 * 1000, MAX_ANIMATED_PHOTO_PIXELS=200 * 1000)
+    def test_animated_formats_have_a_lower_pixel_cap(self):
+        for image_format, content_type in (('GIF', 'image/gif'), ('WEBP', 'image/webp')):
+            with self.subTest(image_format=image_format):
+                decoded, error_message = validate_photo(photo_upload(image_format, content_type))
+                self.assertIsNone(decoded)
+                self.assertEqual(error_message, 'Image is too large. Maximum is 0.2 megapixels.')
+        self.assertIsNone(validate_photo(photo_upload('JPEG', 'image/jpeg'))[1])
+
+    def test_upload_queues_the_decoded_photo(self):
+        temporary_media(self)
+        user = AccountUser.objects.create_user(email='parent@example.com', password='password123', user_type='PARENT')
+        self.client.force_login(user)
+        with self.captureOnCommitCallbacks():
+            self.client.post(reverse('edit_parent_profile'), {
+                'first_name': 'Pat',
+                'last_name': 'Lee',
+                'email': 'parent@example.com',
+                'photo': photo_upload('JPEG', 'image/jpeg'),
+            })
+        job = PhotoJob.objects.get()
+        with job.source.open('rb'), Image.open(job.source) as img:
+            self.assertEqual((img.format, img.size), ('PNG', (640, 480)))
+
+    def test_truncated_jpeg_upload_queues_no_job(self):
+        user = AccountUser.objects.create_user(email='parent@example.com', password='password123', user_type='PARENT')
+        self.client.force_login(user)
+        response = self.client.post(reverse('edit_parent_profile'), {
+            'first_name': 'Pat',
+            'last_name': 'Lee',
+            'email': 'parent@example.com',
+            'photo': photo_upload('JPEG', 'image/jpeg', truncate=True),
+        })
+        self.assertEqual(response.status_code, 200)
+        self.assertContains(response, 'damaged or incomplete')
+        self.assertFalse(PhotoJob.objects.exists())
+
+
+@override_settings(PHOTO_VARIANTS={'thumb': (48, 48), 'full': (120, 120)})
+class PhotoJobTests(TestCase):
+    '''
+    Uploads are queued and turned into size variants by run_photo_jobs.
+    '''
+
+    def setUp(self):
+        temporary_media(self)
+        self.student = StudentProfile.objects.create(first_name='Sam', last_name='Lee')
+
+    def run_jobs(self):
+        call_command('run_photo_jobs', stdout=StringIO())
+
+    def test_upload_is_queued(self):
+        with self.captureOnCommitCallbacks() as callbacks:
+            job = enqueue_photo(self.student, photo_upload('PNG', 'image/png'))
+        # Handed to the process pool only once the upload is committed
+        self.assertEqual(len(callbacks), 1)
+        self.assertEqual(job.status, 'PENDING')
+        self.assertTrue(job.source.storage.exists(job.source.name))
+        self.student.refresh_from_db()
+        self.assertFalse(self.student.photo)
+
+    def test_variants_are_written(self):
+        job = enqueue_photo(self.student, photo_upload('JPEG', 'image/jpeg'), rotation=90, submit=False)
+        self.run_jobs()
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'DONE')
+        self.assertFalse(job.source.storage.exists(job.source.name))
+        self.student.refresh_from_db()
+        self.assertEqual(self.student.photo.name, self.student.photo_variants['full']['jpeg'])
+        storage = get_photo_storage()
+        for name, size in (('thumb', 48), ('full', 120)):
+            variant = self.student.photo_variants[name]
+            self.assertEqual(variant['width'], size)
+            for image_format, pillow_format in (('webp', 'WEBP'), ('jpeg', 'JPEG')):
+                with self.subTest(name=name, image_format=image_format), storage.open(variant[image_format]) as f:
+                    with Image.open(f) as img:
+                        self.assertEqual((img.format, img.size), (pillow_format, (size, size)))
+        self.assertEqual(
+            set(PhotoBlob.objects.values_list('name', 'ref_count')),
+            {(name, 1) for name in photo_files(self.student)},
+        )
+
+    def test_damaged_upload_fails(self):
+        job = enqueue_photo(self.student, photo_upload('JPEG', 'image/jpeg', truncate=True), submit=False)
+        with self.assertLogs('core.services.photo_job_service', 'ERROR'):
+            self.assertEqual(run_photo_job(job.job_id), 'FAILED')
+
+        job.refresh_from_db()
+        self.assertEqual(job.status, 'FAILED')
+        self.assertTrue(job.error)
+        self.assertIsNotNone(job.finished_at)
+        self.assertFalse(job.source.storage.exists(job.source.name))
+        self.student.refresh_from_db()
+        self.assertFalse(self.student.photo)
+
+    def test_newer_upload_cancels_the_queued_one(self):
+        first = enqueue_photo(self.student, photo_upload('PNG', 'image/png'), submit=False)
+        enqueue_photo(self.student, photo_upload('GIF', 'image/gif'), submit=False)
+        self.run_jobs()
+        self.assertEqual(
+            sorted(PhotoJob.objects.values_list('status', flat=True)), ['CANCELLED', 'DONE'],
+        )
+        self.assertEqual(PhotoJob.objects.get(status='CANCELLED'), first)
+
+    def test_deleting_the_profile_releases_its_files(self):
+        enqueue_photo(self.student, photo_upload('PNG', 'image/png'), submit=False)
+        self.run_jobs()
+        self.student.refresh_from_db()
+        names = photo_files(self.student)
+
+        self.student.delete()
+        self.assertEqual(set(PhotoBlob.objects.filter(ref_count=0).values_list('name', flat=True)), names)
+
+
+@override_settings(PHOTO_VARIANTS={'full': (120, 120)})
+class PhotoBlobTests(TestCase):
+    '''
+    Photo files are stored once per content and deleted only when no profile
+    has used them for the grace period.
+    '''
+
+    def setUp(self):
+        temporary_media(self)
+        self.storage = get_photo_storage()
+
+    def set_photo(self, student, upload):
+        enqueue_photo(student, upload, submit=False)
+        call_command('run_photo_jobs', stdout=StringIO())
+        student.refresh_from_db()
+        return photo_files(student)
+
+    def age_blobs(self, days):
+        PhotoBlob.objects.update(released_at=timezone.now() - timedelta(days=days))
+
+    def test_identical_files_are_stored_once(self):
+        first = store_photo_file(self.storage, 'a.JPG', b'same bytes')
+        second = store_photo_file(self.storage, 'b.jpg', b'same bytes')
+        self.assertEqual(first, second)
+        digest = self.storage.content_digest(first)
+        self.assertEqual(first, f'profile_photos/{digest[:2]}/{digest}.jpg')
+        self.assertEqual(PhotoBlob.objects.get().ref_count, 0)
+
+    def test_release_drops_one_reference(self):
+        name = store_photo_file(self.storage, 'photo.jpg', b'shared')
+        acquire_photo_files([name])
+        acquire_photo_files([name])
+        release_photo_files(self.storage, [name])
+        self.assertEqual(PhotoBlob.objects.get(name=name).ref_count, 1)
+
+    def test_shared_file_survives_deleting_one_profile(self):
+        sibling = StudentProfile.objects.create(first_name='Ann', last_name='Lee')
+        student = StudentProfile.objects.create(first_name='Sam', last_name='Lee')
+        upload = photo_upload('PNG', 'image/png')
+        names = self.set_photo(sibling, upload)
+        upload.seek(0)
+        self.assertEqual(self.set_photo(student, upload), names)
+        self.assertEqual(set(PhotoBlob.objects.values_list('name', 'ref_count')), {(name, 2) for name in names})
+
+        sibling.delete()
+        self.age_blobs(days=2)
+        self.assertEqual(collect_photo_garbage(), 0)
+        self.assertTrue(all(self.storage.exists(name) for name in names))
+        self.assertEqual(set(PhotoBlob.objects.values_list('ref_count', flat=True)), {1})
+
+        student.delete()
+        self.age_blobs(days=2)
+        self.assertEqual(collect_photo_garbage(), len(names))
+        self.assertFalse(any(self.storage.exists(name) for name in names))
+        self.assertFalse(PhotoBlob.objects.exists())
+
+    def test_unused_files_are_kept_for_the_grace_period(self):
+        name = store_photo_file(self.storage, 'photo.jpg', b'orphan')
+        self.assertEqual(collect_photo_garbage(), 0)
+        self.assertTrue(self.storage.exists(name))
+
+        self.age_blobs(days=2)
+        output = StringIO()
+        call_command('collect_photo_garbage', stdout=output)
+        self.assertIn('Deleted 1 unused photo file(s).', output.getvalue())
+        self.assertFalse(self.storage.exists(name))
+
+    def test_file_stored_again_is_not_collected(self):
+        name = store_photo_file(self.storage, 'photo.jpg', b'again')
+        self.age_blobs(days=2)
+        # A new upload of the same content restarts the grace period
+        store_photo_file(self.storage, 'photo.jpg', b'again')
+        self.assertEqual(collect_photo_garbage(), 0)
+        self.assertTrue(self.storage.exists(name))
+
+
+class StaticImageTests(TestCase):
+    '''
+    Every format a static image is offered in shows exactly the same pixels.
+    '''
+
+    def test_variants_are_lossless(self):
+        sources = {name: path for name, path in find_source_images().items() if path.suffix == '.png'}
+        self.assertTrue(sources)
+        for name, path in sources.items():
+            with Image.open(path) as img:
+                pixels = visible_pixels(img)
+            for suffix, data in image_variants(path.read_bytes()).items():
+                with self.subTest(name=name, suffix=suffix), Image.open(BytesIO(data)) as variant:
+                    self.assertEqual(visible_pixels(variant), pixels)
+
+    def test_minified_svg_keeps_text_whitespace(self):
+        svg = (
+            b'<?xml version="1.0"?>\n<!-- sign -->\n<svg>\n  <metadata>x</metadata>\n'
+            b'  <rect  width="10"\n height="10"/>\n'
+            b'  <text xml:space="preserve">SLOW  <tspan> DOWN </tspan>\n</text>\n</svg>\n'
+        )
+        self.assertEqual(
+            minify_svg(svg),
+            b'<svg><rect width="10" height="10"/><text xml:space="preserve">SLOW  <tspan> DOWN </tspan>\n</text></svg>',
+        )
+
+
+class CachedSessionTests(TestCase):
+    '''
+    Losing the cache never logs anyone out; only unchanged sessions skip the database.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AccountUser.objects.create_user(email='parent@example.com', password='password123', user_type='PARENT')
+
+    def setUp(self):
+        cache.clear()
+
+    def test_login_survives_losing_the_cache(self):
+        self.assertTrue(self.client.login(email='parent@example.com', password='password123'))
+        cache.clear()
+        response = self.client.get(reverse('dashboard'))
+        self.assertEqual(response.wsgi_request.user, self.user)
+
+    def test_changed_session_is_written_through(self):
+        session = SessionStore()
+        session['step'] = 1
+        session.save()
+        session['step'] = 2
+        session.save()
+        cache.clear()
+        self.assertEqual(SessionStore(session.session_key)['step'], 2)
+
+    def test_unchanged_session_is_only_cached(self):
+        session = SessionStore()
+        session['step'] = 1
+        session.save()
+        session = SessionStore(session.session_key)
+        session.load()
+        with self.assertNumQueries(0):
+            session.save()
+
+
+class CachedUserTests(TestCase):
+    '''
+    Saving a user drops their cached record, so the change is seen on the next request.
+    '''
+
+    def setUp(self):
+        cache.clear()
+        self.user = AccountUser.objects.create_user(email='parent@example.com', password='password123', user_type='PARENT')
+        self.client.login(email='parent@example.com', password='password123')
+        self.assertEqual(self.client.get(reverse('dashboard')).wsgi_request.user, self.user)
+
+    def current_user(self):
+        return self.client.get(reverse('dashboard')).wsgi_request.user
+
+    def test_user_is_served_from_the_cache(self):
+        self.assertIsNotNone(cache.get(_user_cache_key(self.user.pk)))
+        with self.assertNumQueries(0):
+            self.assertTrue(self.client.get(reverse('dashboard')).wsgi_request.user.is_authenticated)
+
+    def test_saving_drops_the_cached_record(self):
+        self.user.save()
+        self.assertIsNone(cache.get(_user_cache_key(self.user.pk)))
+
+    def test_password_change_logs_out_other_sessions(self):
+        self.user.set_password('new password 456')
+        self.user.save()
+        self.assertFalse(self.current_user().is_authenticated)
+
+    def test_deactivated_user_is_logged_out(self):
+        self.user.is_active = False
+        self.user.save()
+        self.assertFalse(self.current_user().is_authenticated)
+
+    def test_permission_change_is_seen(self):
+        self.user.is_staff = True
+        self.user.save()
+        self.assertTrue(self.current_user().is_staff)
+
+
+@override_settings(
+    PASSWORD_HASHERS=['core.hashers.ScryptPasswordHasher', 'core.hashers.PBKDF2PasswordHasher'],
+    PASSWORD_SCRYPT_WORK_FACTOR=2**10,
+    PASSWORD_SCRYPT_PARALLELISM=1,
+    PASSWORD_HASH_WORKERS=1,
+)
+class PasswordHasherTests(TestCase):
+    '''
+    The pooled hashers hash like Django's own, on a pool that cannot deadlock itself.
+    '''
+
+    def test_pbkdf2_hash_is_upgraded_to_scrypt(self):
+        user = AccountUser.objects.create_user(email='parent@example.com', user_type='PARENT')
+        user.password = make_password('password123', hasher='pbkdf2_sha256')
+        user.save()
+        self.assertTrue(user.check_password('password123'))
+        user.refresh_from_db()
+        self.assertTrue(user.password.startswith('scrypt$'))
+        self.assertTrue(user.check_password('password123'))
+
+    def test_verify_on_a_full_pool(self):
+        # scrypt's verify() calls encode(), which must not wait for the pool's only thread
+        hasher = get_hasher('scrypt')
+        encoded = hasher.encode('password123', hasher.salt())
+        results = []
+        thread = threading.Thread(target=lambda: results.append(hasher.verify('password123', encoded)), daemon=True)
+        thread.start()
+        thread.join(10)
+        self.assertFalse(thread.is_alive())
+        self.assertEqual(results, [True])
+
+    def test_benchmark_command(self):
+        out = StringIO()
+        call_command('benchmark_password_hashers', seconds=0.05, stdout=out)
+        self.assertIn('core.hashers.ScryptPasswordHasher', out.getvalue())
+        self.assertIn('core.hashers.PBKDF2PasswordHasher', out.getvalue())
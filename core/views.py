@@ -3,6 +3,7 @@ from django.contrib.auth import login, authenticate, logout
 from django.contrib.auth.decorators import login_required
 from django.contrib import messages
 from core.models.custom_user import AccountUser
+from core.services.login_throttle_service import throttle_login
 
 
 def register_view(request):
@@ -74,6 +75,13 @@ def login_view(request):
             messages.error(request, 'Please provide both email and password.')
             return render(request, 'core/login.html')
 
+        retry_after = throttle_login(request, email)
+        if retry_after:
+            messages.error(request, f'Too many login attempts. Please try again in {retry_after} seconds.')
+            response = render(request, 'core/login.html', status=429)
+            response['Retry-After'] = retry_after
+            return response
+
         user = authenticate(request, username=email, password=password)
 
         if user is not None:
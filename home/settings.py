@@ -10,6 +10,7 @@ For the full list of settings and their values, see
 https://docs.djangoproject.com/en/6.0/ref/settings/
 """
 
+import os
 from pathlib import Path
 
 from django.conf.global_settings import MEDIA_URL
@@ -50,7 +51,8 @@ MIDDLEWARE = [
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
-    'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.CachedAuthenticationMiddleware',
+    'parent.middleware.ParentProfileMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
 ]
@@ -104,6 +106,25 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+# Password hashers, preferred first. Hashes made by the others (or with other
+# parameters) are upgraded to the first one the next time their user logs in.
+# Put core.hashers.Argon2PasswordHasher first to use Argon2 (needs argon2-cffi);
+# compare them on this hardware with `manage.py benchmark_password_hashers`
+PASSWORD_HASHERS = [
+    'core.hashers.ScryptPasswordHasher',
+    'core.hashers.Argon2PasswordHasher',
+    'core.hashers.PBKDF2PasswordHasher',
+    'core.hashers.PBKDF2SHA1PasswordHasher',
+]
+
+# scrypt cost: 2**14 * 8 * 128 bytes = 16 MiB of memory per hash, repeated 5 times
+PASSWORD_SCRYPT_WORK_FACTOR = 2**14
+PASSWORD_SCRYPT_BLOCK_SIZE = 8
+PASSWORD_SCRYPT_PARALLELISM = 5
+
+# Threads per process that hash passwords, capping the logins checked at once (None: one per core)
+PASSWORD_HASH_WORKERS = None
+
 
 # Internationalization
 # https://docs.djangoproject.com/en/6.0/topics/i18n/
@@ -124,11 +145,25 @@ STATIC_URL = 'static/'
 STATICFILES_DIRS = [
     BASE_DIR / 'static',
 ]
+# Optimized, content hashed images written by build_static_images (run before collectstatic)
+STATIC_BUILD_DIR = BASE_DIR / 'static' / 'build'
 MEDIA_URL = '/media/'
 MEDIA_ROOT = BASE_DIR / 'media'
 
 MAX_PHOTO_SIZE = 5 * 1024 * 1024
+# Photos with more pixels are rejected from their header, before decoding
+MAX_PHOTO_PIXELS = 50 * 1000 * 1000
+# Lower cap for GIF and WebP, which may be animated and are always decoded in full
+MAX_ANIMATED_PHOTO_PIXELS = 12 * 1000 * 1000
+# Write uploads straight to temporary files instead of holding them in memory
+FILE_UPLOAD_HANDLERS = ['django.core.files.uploadhandler.TemporaryFileUploadHandler']
 PHOTO_DIMENSIONS = (400, 400)
+# Square size variants built from each profile photo, each in WebP and JPEG
+PHOTO_VARIANTS = {
+    'thumb': (96, 96),
+    'medium': (200, 200),
+    'full': PHOTO_DIMENSIONS,
+}
 AUTH_USER_MODEL = 'core.AccountUser'
 
 USER_TYPES = [
@@ -157,6 +192,76 @@ TOTAL_REQ_HOURS_IN_MIN = TOTAL_REQUIRED_HOURS * 60
 DAY_HOURS_IN_MIN = REQUIRED_DAY_HOURS * 60
 NIGHT_HOURS_IN_MIN = REQUIRED_NIGHT_HOURS * 60
 
+# Sessions shown per page of a student's trip history
+TRIP_HISTORY_PAGE_SIZE = 25
+
+# Sessions, the logged in user and parents' student access are cached and must be
+# invalidated in every process at once, so the cache has to be shared (checked at
+# startup). This one is shared by the processes of one host; use Redis or
+# Memcached when running on several.
+CACHES = {
+    'default': {
+        'BACKEND': 'core.cache.FileBasedCache',
+        'LOCATION': BASE_DIR / 'cache' / 'default',
+        'OPTIONS': {
+            'MAX_ENTRIES': 10000,
+        },
+    },
+}
+
+# Seconds a parent's accessible student ids stay cached between requests
+STUDENT_ACCESS_CACHE_TIMEOUT = 300
+
+# Sessions are read from the cache; new and changed sessions are written to the database
+# at once, and an unchanged session's refreshed expiry at most this often
+SESSION_ENGINE = 'core.sessions'
+SESSION_WRITE_BEHIND_SECONDS = 300
+
+# Seconds the logged in user stays cached between requests (dropped whenever the user is saved)
+USER_CACHE_TIMEOUT = 3600
+
+# Login attempts allowed per client IP and per email, as (burst, seconds to refill the burst);
+# throttled attempts are rejected before the password is hashed
+LOGIN_THROTTLE_RATES = {
+    'ip': (20, 60),
+    'email': (5, 300),
+}
+# 'local' keeps the buckets in each process, 'cache' shares them through the default cache
+LOGIN_THROTTLE_BACKEND = 'local'
+
+# Generated hours reports are cached here, least recently used evicted past the size limit
+REPORT_CACHE_DIR = BASE_DIR / 'report_cache'
+REPORT_CACHE_MAX_BYTES = 256 * 1024 * 1024
+# Seconds the parents named in a report's session log stay cached for its ledger version
+REPORT_APPROVERS_CACHE_TIMEOUT = 24 * 60 * 60
+
+# Official state driving log forms (<STATE>.pdf plus a <STATE>.json field map), used when present
+STATE_FORM_DIR = BASE_DIR / 'state_forms'
+
+# Reports with more approved sessions than this are rendered by a background job
+EXPORT_JOB_TRIP_THRESHOLD = 500
+# Worker processes per web process for background and bulk PDF exports
+EXPORT_JOB_WORKERS = min(4, os.cpu_count() or 1)
+# Seconds before a running export job is considered abandoned by run_export_jobs
+EXPORT_JOB_STALE_SECONDS = 600
+
+# Worker processes per web process for resizing uploaded profile photos
+PHOTO_JOB_WORKERS = 2
+# Seconds before a running photo job is considered abandoned by run_photo_jobs
+PHOTO_JOB_STALE_SECONDS = 300
+# Seconds a photo file no profile uses is kept before collect_photo_garbage deletes it
+PHOTO_GC_GRACE_SECONDS = 24 * 60 * 60
+
+# How photos and reports are sent once a view has checked access: None sends them
+# from Django with FileResponse (os.sendfile under gunicorn/uWSGI/mod_wsgi),
+# 'x-accel-redirect' hands them to nginx and 'x-sendfile' to Apache or lighttpd
+SENDFILE_BACKEND = None
+# Internal nginx locations serving these directories, for X-Accel-Redirect
+SENDFILE_ACCEL_URLS = {
+    MEDIA_ROOT: '/protected/media/',
+    REPORT_CACHE_DIR: '/protected/reports/',
+}
+
 
 
 #========================================================
@@ -186,4 +291,23 @@ EMAIL_BACKEND = 'django.core.mail.backends.console.EmailBackend'
 # DEFAULT_FROM_EMAIL = 'DMV+ <noreply@dmvplus.com>'
 
 # For now, set a default for development
-DEFAULT_FROM_EMAIL = 'DMV+ <noreply@dmvplus.com>'
\ No newline at end of file
+DEFAULT_FROM_EMAIL = 'DMV+ <noreply@dmvplus.com>'
+
+# Emails are queued in the outbox and sent by a delivery thread in each web
+# process once the request's transaction commits; set to False to leave them
+# to a separate `manage.py deliver_outbox --loop` worker
+EMAIL_OUTBOX_DELIVER_IN_PROCESS = True
+# Seconds the delivery thread sleeps between checks for emails due a retry
+EMAIL_OUTBOX_POLL_SECONDS = 60
+# Emails sent over one mail server connection
+EMAIL_OUTBOX_BATCH_SIZE = 50
+# A failed email is retried after 1, 2, 4... minutes, at most an hour apart, then given up
+EMAIL_OUTBOX_RETRY_SECONDS = 60
+EMAIL_OUTBOX_MAX_RETRY_SECONDS = 60 * 60
+EMAIL_OUTBOX_MAX_ATTEMPTS = 8
+# Seconds before an email being sent is considered abandoned by deliver_outbox
+EMAIL_OUTBOX_STALE_SECONDS = 300
+
+# Test runs keep their cache apart from the development server's, and hash
+# passwords quickly (tests of the hashers override PASSWORD_HASHERS)
+TEST_RUNNER = 'core.test_runner.TestRunner'
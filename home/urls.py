@@ -4,6 +4,7 @@ URL configuration for home project.
 from django.contrib import admin
 from django.urls import path, include
 from core import views as core_views
+from parent import views as parent_views
 from django.conf import settings
 from django.conf.urls.static import static
 
@@ -20,6 +21,9 @@ urlpatterns = [
     path('dashboard/', core_views.dashboard_view, name='dashboard'),
     # Parent URLs
     path('parent/', include('parent.urls')),
+
+    # Profile photos are served after an access check, in production too
+    path('media/profile_photos/<path:name>', parent_views.profile_photo, name='profile_photo'),
 ]
 
 
@@ -6,3 +6,4 @@ class ParentConfig(AppConfig):
 
     def ready(self):
         import parent.services.parent_service
+        import parent.services.access_service
@@ -0,0 +1,38 @@
+from functools import wraps
+
+from django.contrib import messages
+from django.contrib.auth.decorators import login_required
+from django.core.exceptions import PermissionDenied
+from django.shortcuts import redirect
+
+from parent.services.access_service import get_parent_profile
+
+
+def parent_required(message="Only parents can access this page.", profile_missing_message="Parent profile not found."):
+    """
+    Restrict a view to logged in parents.
+
+    Sets request.parent_profile to the resolved ParentProfile before the view
+    runs. Users without a profile are sent back to the dashboard.
+
+    Args:
+        message: PermissionDenied message for users that aren't parents
+        profile_missing_message: error shown when the parent profile is missing
+    """
+    def decorator(view_func):
+        @wraps(view_func)
+        def _wrapped_view(request, *args, **kwargs):
+            if request.user.user_type != 'PARENT':
+                raise PermissionDenied(message)
+
+            parent_profile = get_parent_profile(request)
+            if parent_profile is None:
+                messages.error(request, profile_missing_message)
+                return redirect('dashboard')
+
+            request.parent_profile = parent_profile
+            return view_func(request, *args, **kwargs)
+
+        return login_required(_wrapped_view)
+
+    return decorator
@@ -0,0 +1,50 @@
+from django.core.management.base import BaseCommand, CommandError
+
+from parent.services.provisioning_service import PROVISIONING_COLUMNS, provision_accounts
+
+
+class Command(BaseCommand):
+    help = (
+        'Create guardian accounts, their students and the relationships between them from a CSV '
+        f"with the columns {', '.join(PROVISIONING_COLUMNS)} (only guardian_email is required)."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('csv_file', help='Path of the CSV file.')
+        parser.add_argument(
+            '--batch-size',
+            type=int,
+            default=1000,
+            help='Guardians written per transaction (default 1000).',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            help='Processes hashing passwords (defaults to one per core; 1 hashes in-process).',
+        )
+
+    def handle(self, *args, **options):
+        if options['batch_size'] < 1:
+            raise CommandError('--batch-size must be at least 1.')
+        if options['workers'] is not None and options['workers'] < 1:
+            raise CommandError('--workers must be at least 1.')
+
+        try:
+            with open(options['csv_file'], newline='', encoding='utf-8-sig') as csv_file:
+                stats = provision_accounts(csv_file, options['batch_size'], options['workers'])
+        except OSError as e:
+            raise CommandError(f"Could not read {options['csv_file']}: {e.strerror}")
+        except ValueError as e:
+            raise CommandError(f"Nothing was provisioned:\n{e}")
+
+        seconds = stats['seconds']
+        self.stdout.write(
+            f"Guardians: {stats['guardians_created']} created, {stats['guardians_existing']} already registered\n"
+            f"Students: {stats['students_created']} created, {stats['students_existing']} already registered\n"
+            f"Relationships: {stats['relationships_created']} created"
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Provisioned in {seconds:.2f}s "
+            f"({stats['guardians_created'] / seconds:.0f} guardians/s, "
+            f"{stats['students_created'] / seconds:.0f} students/s)."
+        ))
@@ -0,0 +1,19 @@
+from django.utils.functional import SimpleLazyObject
+
+from parent.services.access_service import get_parent_profile
+
+
+class ParentProfileMiddleware:
+    '''
+    Adds a lazy request.parent_profile (ParentProfile or None).
+
+    Must come after AuthenticationMiddleware. The profile is only queried the
+    first time it is used and at most once per request.
+    '''
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        request.parent_profile = SimpleLazyObject(lambda: get_parent_profile(request))
+        return self.get_response(request)
@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 09:31
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parent', '0004_parentinvitation'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='parentprofile',
+            name='photo_variants',
+            field=models.JSONField(blank=True, default=dict),
+        ),
+    ]
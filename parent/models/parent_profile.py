@@ -1,9 +1,11 @@
 from core.models.custom_user import AccountUser
+from core.models.profile_photo import ProfilePhotoMixin
+from core.storage import get_photo_storage
 from django.db import models
 
 
 
-class ParentProfile(models.Model):
+class ParentProfile(ProfilePhotoMixin, models.Model):
     user = models.OneToOneField(AccountUser, on_delete=models.CASCADE)
     address1 = models.CharField(max_length=100, blank=True, null=True)
     address2 = models.CharField(max_length=100, blank=True, null=True)
@@ -11,15 +13,10 @@ class ParentProfile(models.Model):
     state = models.CharField(max_length=2, blank=True, null=True)
     zipcode = models.CharField(max_length=20, blank=True, null=True)
     phone = models.CharField(max_length=20, blank=True, null=True)
-    photo = models.ImageField(upload_to='profile_photos/parents/', blank=True, null=True)
+    photo = models.ImageField(upload_to='profile_photos/parents/', storage=get_photo_storage, blank=True, null=True)
+    photo_variants = models.JSONField(default=dict, blank=True)
 
     def __str__(self):
         return f"{self.user.first_name} {self.user.last_name}"
 
-    def get_photo_url(self):
-        ''' Return photo url or default image '''
-        if self.photo:
-            return self.photo.url
-        return '/static/images/default_user.png'
-
 
@@ -0,0 +1,123 @@
+"""
+Service for resolving the current parent and the students they can access
+"""
+from django.conf import settings
+from django.core.cache import cache
+from django.core.exceptions import PermissionDenied
+from django.db import transaction
+from django.db.models.signals import post_delete, post_save, pre_delete
+from django.dispatch import receiver
+from django.shortcuts import get_object_or_404
+
+from core.services.photo_job_service import photo_files
+from parent.models.parent_profile import ParentProfile
+from parent.models.parent_student_relationship import ParentStudentRelationship
+from student.models.student_profile import StudentProfile
+
+
+def get_parent_profile(request):
+    """
+    Return the ParentProfile of the logged in user, or None.
+
+    The lookup runs at most once per request; the result is cached on the
+    request the same way Django caches request.user.
+    """
+    if not hasattr(request, '_cached_parent_profile'):
+        parent_profile = None
+        if request.user.is_authenticated:
+            parent_profile = ParentProfile.objects.filter(user_id=request.user.pk).first()
+            if parent_profile is not None:
+                # Reuse the already loaded user instead of fetching it again
+                parent_profile.user = request.user
+        request._cached_parent_profile = parent_profile
+    return request._cached_parent_profile
+
+
+def _student_ids_cache_key(parent_id):
+    return f'parent:{parent_id}:student_ids'
+
+
+def get_accessible_student_ids(parent_profile):
+    """
+    Return the ids of the students a parent is related to.
+
+    The set is kept in the cache across requests and dropped whenever one of
+    the parent's relationships is created or deleted. The cache is shared by
+    every process (see core.checks), so a revoked relationship stops granting
+    access everywhere at once.
+
+    Returns:
+        frozenset: StudentProfile ids
+    """
+    key = _student_ids_cache_key(parent_profile.id)
+    student_ids = cache.get(key)
+    if student_ids is None:
+        student_ids = frozenset(
+            ParentStudentRelationship.objects.filter(
+                parent_id=parent_profile.id,
+                student__isnull=False,
+            ).values_list('student_id', flat=True)
+        )
+        cache.set(key, student_ids, getattr(settings, 'STUDENT_ACCESS_CACHE_TIMEOUT', 300))
+    return student_ids
+
+
+def can_access_student(parent_profile, student_id):
+    return student_id in get_accessible_student_ids(parent_profile)
+
+
+def get_accessible_student(request, student_id, message):
+    """
+    Fetch a student and check the current parent may access them
+
+    Args:
+        request: request already resolved by the parent_required decorator
+        student_id: StudentProfile id from the URL
+        message: PermissionDenied message when the parent has no access
+
+    Returns:
+        StudentProfile
+    """
+    student = get_object_or_404(StudentProfile, id=student_id)
+    if not can_access_student(request.parent_profile, student.id):
+        raise PermissionDenied(message)
+    return student
+
+
+def can_view_photo(parent_profile, name):
+    """
+    Whether a stored photo file is used by the parent or one of their students
+
+    Args:
+        parent_profile: ParentProfile of the current parent
+        name: storage name of the file, e.g. profile_photos/3f/3f9c....jpg
+    """
+    if name in photo_files(parent_profile):
+        return True
+    students = StudentProfile.objects.filter(id__in=get_accessible_student_ids(parent_profile)).only('photo', 'photo_variants')
+    return any(name in photo_files(student) for student in students)
+
+
+def invalidate_accessible_student_ids(parent_id):
+    key = _student_ids_cache_key(parent_id)
+    cache.delete(key)
+    # Also drop anything cached by another request before this transaction commits
+    transaction.on_commit(lambda: cache.delete(key))
+
+
+# ============================================
+# SIGNALS
+# ============================================
+
+@receiver(post_save, sender=ParentStudentRelationship)
+@receiver(post_delete, sender=ParentStudentRelationship)
+def relationship_changed(sender, instance, **kwargs):
+    invalidate_accessible_student_ids(instance.parent_id)
+
+
+@receiver(pre_delete, sender=StudentProfile)
+def student_deleted(sender, instance, **kwargs):
+    # Relationships are nulled with a bulk UPDATE that sends no signals
+    parent_ids = ParentStudentRelationship.objects.filter(student=instance).values_list('parent_id', flat=True)
+    for parent_id in parent_ids:
+        invalidate_accessible_student_ids(parent_id)
@@ -0,0 +1,57 @@
+"""
+Service for emailing parent invitations
+"""
+from django.urls import reverse
+
+from core.services.email_outbox_service import queue_email
+
+
+def queue_invitation_email(request, invitation):
+    """
+    Queue the email inviting a parent to accept an invitation
+
+    Call in the transaction that creates the invitation, so the email is
+    only sent once the invitation is saved.
+
+    Args:
+        request: HttpRequest of the inviting parent
+        invitation: ParentInvitation
+
+    Returns:
+        OutboxEmail
+    """
+    student = invitation.student
+    invited_first_name = invitation.invited_first_name
+    message = invitation.message
+    invitation_url = request.build_absolute_uri(
+        reverse('accept_invitation', kwargs={'token': invitation.token})
+    )
+
+    subject = f"You've been invited to help track {student.first_name}'s driving hours"
+
+    email_message = f"""Hello{' ' + invited_first_name if invited_first_name else ''},
+
+{request.user.get_full_name()} has invited you to help track driving hours for {student.first_name} {student.last_name} on DMV+.
+
+"""
+    if message:
+        email_message += f"Personal message from {request.user.get_full_name()}:\n\"{message}\"\n\n"
+
+    email_message += f"""To accept this invitation and create your account (or link to your existing account), click the link below:
+
+{invitation_url}
+
+This invitation will expire on {invitation.expires_at.strftime('%B %d, %Y at %I:%M %p')}.
+
+Once you accept, you'll be able to:
+- Log driving sessions for {student.first_name}
+- Approve driving hours
+- View {student.first_name}'s progress
+- Export reports for the DMV
+
+---
+DMV+ - Drive, Manage, Verify
+This is an automated message. Please do not reply to this email.
+"""
+
+    return queue_email(subject, email_message, [invitation.invited_email])
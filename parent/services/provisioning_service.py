@@ -0,0 +1,333 @@
+"""
+Service for provisioning guardian accounts and their students in bulk
+
+A driving school uploads a CSV with one row per guardian and student:
+
+    guardian_email, guardian_first_name, guardian_last_name, guardian_password,
+    guardian_phone, student_ref, student_first_name, student_last_name,
+    permit_number, drivers_ed_completed
+
+Only guardian_email is required. A guardian is listed once per student;
+rows sharing a student_ref (or, without one, the same student name and
+permit number) are the same student, so two guardians can share one. A
+row without a student_ref is the student with a ref and the same name and
+permit number, if the file has one; if it has several, the row must say
+which.
+A guardian without a password gets an unusable one and signs in after a
+password reset.
+
+Passwords are hashed in a process pool while earlier batches are written.
+Users, profiles and relationships are written with bulk_create in one
+transaction per batch, so no per-row signals run; what those signals do
+(creating the ParentProfile, dropping cached student access) is done here.
+
+Guardians that already have an account are linked to the students in the
+file. A student already linked to such a guardian, with the same name and
+permit number, is reused, so importing a file twice creates nothing new.
+"""
+import csv
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.password_validation import validate_password
+from django.core.exceptions import ValidationError
+from django.core.validators import validate_email
+from django.db import NotSupportedError, connection, transaction
+
+from core.models.custom_user import AccountUser
+from core.services.password_worker import hash_password, init_worker
+from parent.models.parent_profile import ParentProfile
+from parent.models.parent_student_relationship import ParentStudentRelationship
+from parent.services.access_service import invalidate_accessible_student_ids
+from student.models.student_profile import StudentProfile
+
+PROVISIONING_COLUMNS = (
+    'guardian_email',
+    'guardian_first_name',
+    'guardian_last_name',
+    'guardian_password',
+    'guardian_phone',
+    'student_ref',
+    'student_first_name',
+    'student_last_name',
+    'permit_number',
+    'drivers_ed_completed',
+)
+
+GUARDIAN_FIELDS = {
+    'guardian_first_name': 'first_name',
+    'guardian_last_name': 'last_name',
+    'guardian_password': 'password',
+    'guardian_phone': 'phone',
+}
+
+TRUE_VALUES = {'1', 'true', 'yes', 'y', 'x'}
+
+
+def _student_identity(first_name, last_name, permit_number):
+    return first_name.strip().lower(), last_name.strip().lower(), permit_number.strip()
+
+
+def read_provisioning_csv(csv_file):
+    """
+    Parse and validate a provisioning CSV
+
+    Args:
+        csv_file: text file object
+
+    Returns:
+        tuple: (guardians: dict email -> details,
+                students: dict student key -> details,
+                links: list of (email, student key), in file order)
+
+    Raises:
+        ValueError: listing every invalid line
+    """
+    reader = csv.DictReader(csv_file)
+    headers = [header.strip() for header in reader.fieldnames or []]
+    if 'guardian_email' not in headers:
+        raise ValueError('The CSV needs a guardian_email column.')
+    unknown = set(headers) - set(PROVISIONING_COLUMNS)
+    if unknown:
+        raise ValueError(f"Unknown column(s): {', '.join(sorted(unknown))}.")
+    reader.fieldnames = headers
+
+    guardians = {}
+    students = {}
+    links = {}
+    errors = []
+    student_rows = []
+
+    for row in reader:
+        line = reader.line_num
+        row = {column: (row.get(column) or '').strip() for column in PROVISIONING_COLUMNS}
+
+        try:
+            validate_email(row['guardian_email'])
+        except ValidationError:
+            errors.append(f"Line {line}: {row['guardian_email']!r} is not a valid email.")
+            continue
+        email = AccountUser.objects.normalize_email(row['guardian_email'])
+
+        guardian = guardians.setdefault(email, {'email': email, 'line': line, **dict.fromkeys(GUARDIAN_FIELDS.values(), '')})
+        for column, field in GUARDIAN_FIELDS.items():
+            if row[column] and guardian[field] and row[column] != guardian[field]:
+                errors.append(f"Line {line}: {column} of {email} differs from line {guardian['line']}.")
+            elif row[column]:
+                guardian[field] = row[column]
+
+        if not row['student_first_name'] and not row['student_last_name'] and not row['student_ref']:
+            continue
+        if not row['student_first_name'] or not row['student_last_name']:
+            errors.append(f"Line {line}: a student needs a first and a last name.")
+            continue
+
+        identity = _student_identity(row['student_first_name'], row['student_last_name'], row['permit_number'])
+        student_rows.append((line, email, row, identity))
+
+    # The refs given to each student identity, so rows without one can be matched to them
+    ref_identities = {}
+    refs_by_identity = {}
+    for line, email, row, identity in student_rows:
+        if row['student_ref'] and ref_identities.setdefault(row['student_ref'], identity) == identity:
+            refs_by_identity.setdefault(identity, {})[row['student_ref']] = None
+
+    for line, email, row, identity in student_rows:
+        if row['student_ref']:
+            key = ('ref', row['student_ref'])
+        else:
+            refs = list(refs_by_identity.get(identity, {}))
+            if len(refs) > 1:
+                errors.append(
+                    f"Line {line}: {row['student_first_name']} {row['student_last_name']} could be student_ref "
+                    f"{' or '.join(repr(ref) for ref in refs)}; give the row a student_ref."
+                )
+                continue
+            key = ('ref', refs[0]) if refs else ('identity',) + identity
+        student = students.setdefault(key, {
+            'first_name': row['student_first_name'],
+            'last_name': row['student_last_name'],
+            'permit_number': row['permit_number'],
+            'drivers_ed_completed': row['drivers_ed_completed'].lower() in TRUE_VALUES,
+            'identity': identity,
+            'line': line,
+        })
+        if student['identity'] != identity:
+            errors.append(f"Line {line}: student_ref {row['student_ref']!r} differs from line {student['line']}.")
+            continue
+        links.setdefault((email, key), None)
+
+    for guardian in guardians.values():
+        if guardian['password']:
+            user = AccountUser(email=guardian['email'], first_name=guardian['first_name'], last_name=guardian['last_name'])
+            try:
+                validate_password(guardian['password'], user)
+            except ValidationError as e:
+                errors.append(f"Line {guardian['line']}: password of {guardian['email']}: {' '.join(e.messages)}")
+
+    if errors:
+        raise ValueError('\n'.join(errors))
+    return guardians, students, list(links)
+
+
+def _existing_guardians(emails, batch_size):
+    # email -> AccountUser for guardians that already have an account
+    users = {}
+    emails = list(emails)
+    for start in range(0, len(emails), batch_size):
+        for user in AccountUser.objects.filter(email__in=emails[start:start + batch_size]):
+            if user.user_type not in ('PARENT', 'UNDEFINED'):
+                raise ValueError(f"{user.email} already has a {user.get_user_type_display().lower()} account.")
+            users[user.email] = user
+    return users
+
+
+def _match_existing_students(students, links, profile_ids):
+    """
+    Resolve students the existing guardians are already linked to
+
+    Returns:
+        tuple: ({student key: StudentProfile id}, set of existing (parent id, student id) links)
+    """
+    relationships = ParentStudentRelationship.objects.filter(
+        parent_id__in=profile_ids.values(),
+        student__isnull=False,
+    ).select_related('student')
+    existing = {}
+    linked = set()
+    for relationship in relationships:
+        student = relationship.student
+        identity = _student_identity(student.first_name, student.last_name, student.permit_number)
+        existing.setdefault((relationship.parent_id, identity), student.id)
+        linked.add((relationship.parent_id, student.id))
+
+    student_ids = {}
+    for email, key in links:
+        if email in profile_ids and key not in student_ids:
+            student_id = existing.get((profile_ids[email], students[key]['identity']))
+            if student_id is not None:
+                student_ids[key] = student_id
+    return student_ids, linked
+
+
+def _hash_passwords(executor, passwords, workers):
+    if executor is None:
+        return map(make_password, passwords)
+    # Every hash is submitted now and the results are read in order, so the
+    # pool keeps hashing while the batches before are written
+    return executor.map(hash_password, passwords, chunksize=max(1, len(passwords) // (workers * 8)))
+
+
+def provision_accounts(csv_file, batch_size=1000, workers=None):
+    """
+    Create the guardians, students and relationships of a provisioning CSV
+
+    Args:
+        csv_file: text file object, see the module docstring for its columns
+        batch_size: guardians written per transaction
+        workers: processes hashing passwords (defaults to one per core; 1 hashes in-process)
+
+    Returns:
+        dict: counts of what was created and reused, and the seconds it took
+
+    Raises:
+        ValueError: if the CSV is invalid; nothing is written
+    """
+    if not connection.features.can_return_rows_from_bulk_insert:
+        raise NotSupportedError('Bulk provisioning needs a database that returns ids from bulk inserts.')
+
+    started = time.perf_counter()
+    workers = workers or os.cpu_count() or 1
+    guardians, students, links = read_provisioning_csv(csv_file)
+
+    existing_users = _existing_guardians(guardians, batch_size)
+    profile_ids = dict(
+        ParentProfile.objects.filter(user__in=existing_users.values()).values_list('user__email', 'id')
+    )
+    student_ids, linked = _match_existing_students(students, links, profile_ids)
+
+    links_by_guardian = {}
+    for email, key in links:
+        links_by_guardian.setdefault(email, []).append(key)
+
+    stats = {
+        'guardians_created': 0,
+        'guardians_existing': len(existing_users),
+        'students_created': 0,
+        'students_existing': len(student_ids),
+        'relationships_created': 0,
+    }
+    emails = list(guardians)
+
+    passwords = [guardians[email]['password'] for email in emails if email not in existing_users and guardians[email]['password']]
+    executor = None
+    if workers > 1 and passwords:
+        executor = ProcessPoolExecutor(
+            max_workers=workers,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=init_worker,
+        )
+
+    try:
+        hashes = _hash_passwords(executor, passwords, workers)
+
+        for start in range(0, len(emails), batch_size):
+            batch = emails[start:start + batch_size]
+            new_users = [
+                AccountUser(
+                    email=email,
+                    first_name=guardians[email]['first_name'],
+                    last_name=guardians[email]['last_name'],
+                    user_type='PARENT',
+                    password=next(hashes) if guardians[email]['password'] else make_password(None),
+                )
+                for email in batch if email not in existing_users
+            ]
+
+            with transaction.atomic():
+                AccountUser.objects.bulk_create(new_users, batch_size=batch_size)
+                profiles = [ParentProfile(user=user, phone=guardians[user.email]['phone'] or None) for user in new_users]
+                # Existing users the create_profile signal never gave a profile
+                profiles += [
+                    ParentProfile(user=existing_users[email])
+                    for email in batch if email in existing_users and email not in profile_ids
+                ]
+                ParentProfile.objects.bulk_create(profiles, batch_size=batch_size)
+                profile_ids.update((profile.user.email, profile.id) for profile in profiles)
+
+                new_students = {}
+                for email in batch:
+                    for key in links_by_guardian.get(email, []):
+                        if key not in student_ids and key not in new_students:
+                            details = students[key]
+                            new_students[key] = StudentProfile(
+                                first_name=details['first_name'],
+                                last_name=details['last_name'],
+                                permit_number=details['permit_number'],
+                                drivers_ed_completed=details['drivers_ed_completed'],
+                            )
+                StudentProfile.objects.bulk_create(new_students.values(), batch_size=batch_size)
+                student_ids.update((key, student.id) for key, student in new_students.items())
+
+                relationships = [
+                    ParentStudentRelationship(parent_id=profile_ids[email], student_id=student_ids[key])
+                    for email in batch
+                    for key in links_by_guardian.get(email, [])
+                    if (profile_ids[email], student_ids[key]) not in linked
+                ]
+                ParentStudentRelationship.objects.bulk_create(relationships, batch_size=batch_size)
+                for parent_id in {relationship.parent_id for relationship in relationships}:
+                    invalidate_accessible_student_ids(parent_id)
+
+            stats['guardians_created'] += len(new_users)
+            stats['students_created'] += len(new_students)
+            stats['relationships_created'] += len(relationships)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures=True)
+
+    stats['seconds'] = time.perf_counter() - started
+    return stats
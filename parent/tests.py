@@ -1,3 +1,187 @@
-from django.test import TestCase
+import tempfile
+from io import StringIO
+from unittest import mock
 
-# Create your tests here.
+from django.core.cache import cache, caches
+from django.core.files.base import ContentFile
+from django.db.models.signals import post_save
+from django.test import TestCase, override_settings
+from django.urls import reverse
+
+from core.models.custom_user import AccountUser
+from core.storage import get_photo_storage
+from parent.models.parent_profile import ParentProfile
+from parent.models.parent_student_relationship import ParentStudentRelationship
+from parent.services.access_service import _student_ids_cache_key
+from parent.services.provisioning_service import provision_accounts
+from student.models.student_profile import StudentProfile
+
+
+class StudentAccessTests(TestCase):
+    '''
+    Cached student access follows relationships as they are granted and revoked.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AccountUser.objects.create_user(email='parent@example.com', password='password', user_type='PARENT')
+        cls.parent = ParentProfile.objects.get(user=cls.user)
+        cls.student = StudentProfile.objects.create(first_name='Student', last_name='Access')
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+        self.url = reverse('view_student', args=[self.student.id])
+        # Another process reads the same cache through its own connection
+        self.other_process = caches.create_connection('default')
+        self.key = _student_ids_cache_key(self.parent.id)
+
+    def test_revoked_relationship_denies_access(self):
+        relationship = ParentStudentRelationship.objects.create(parent=self.parent, student=self.student)
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+        self.assertEqual(self.other_process.get(self.key), frozenset({self.student.id}))
+
+        relationship.delete()
+        self.assertIsNone(self.other_process.get(self.key))
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+
+    def test_granted_relationship_allows_access(self):
+        self.assertEqual(self.client.get(self.url).status_code, 403)
+        self.assertEqual(self.other_process.get(self.key), frozenset())
+
+        ParentStudentRelationship.objects.create(parent=self.parent, student=self.student)
+        self.assertIsNone(self.other_process.get(self.key))
+        self.assertEqual(self.client.get(self.url).status_code, 200)
+
+
+class ProfilePhotoTests(TestCase):
+    '''
+    A photo is served to any logged in user whose parent profile may see it, whatever their user type.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = StudentProfile.objects.create(first_name='Student', last_name='Photo')
+        cls.users = {}
+        for user_type, is_staff in (('PARENT', False), ('UNDEFINED', False), ('UNDEFINED', True)):
+            email = f"{user_type.lower()}{'-staff' if is_staff else ''}@example.com"
+            user = AccountUser.objects.create_user(email=email, password='password', user_type=user_type, is_staff=is_staff)
+            ParentStudentRelationship.objects.create(parent=ParentProfile.objects.get(user=user), student=cls.student)
+            cls.users[email] = user
+        cls.stranger = AccountUser.objects.create_user(email='stranger@example.com', password='password', user_type='PARENT')
+
+    def setUp(self):
+        cache.clear()
+        media_root = tempfile.TemporaryDirectory()
+        self.addCleanup(media_root.cleanup)
+        settings_override = override_settings(MEDIA_ROOT=media_root.name)
+        settings_override.enable()
+        self.addCleanup(settings_override.disable)
+
+        self.student.photo.name = get_photo_storage().save('photo.jpg', ContentFile(b'photo bytes'))
+        self.student.save()
+        self.url = reverse('profile_photo', args=[self.student.photo.name.removeprefix('profile_photos/')])
+
+    def test_allowed_viewers(self):
+        for email, user in self.users.items():
+            with self.subTest(email=email):
+                self.client.force_login(user)
+                response = self.client.get(self.url)
+                self.assertEqual(response.status_code, 200)
+                self.assertEqual(b''.join(response.streaming_content), b'photo bytes')
+
+    def test_denied_viewer(self):
+        self.client.force_login(self.stranger)
+        self.assertEqual(self.client.get(self.url).status_code, 404)
+
+    def test_anonymous_viewer_must_log_in(self):
+        self.assertEqual(self.client.get(self.url).status_code, 302)
+
+
+PROVISIONING_HEADER = 'guardian_email,guardian_first_name,guardian_last_name,guardian_password,student_ref,student_first_name,student_last_name,permit_number\n'
+
+
+def provision(rows, **kwargs):
+    return provision_accounts(StringIO(PROVISIONING_HEADER + ''.join(row + '\n' for row in rows)), workers=1, **kwargs)
+
+
+class ProvisioningTests(TestCase):
+    '''
+    A provisioning CSV creates each guardian and student once, and nothing if it is invalid.
+    '''
+
+    rows = [
+        'ann.parent@example.com,Ann,Parent,horse battery 81,S1,Ann,Lee,P1',
+        'bob.parent@example.com,Bob,Parent,,S1,Ann,Lee,P1',
+        'bob.parent@example.com,Bob,Parent,,,Cal,Lee,',
+    ]
+
+    def setUp(self):
+        cache.clear()
+
+    def test_provisioning(self):
+        stats = provision(self.rows)
+        self.assertEqual(
+            {key: value for key, value in stats.items() if key != 'seconds'},
+            {'guardians_created': 2, 'guardians_existing': 0, 'students_created': 2, 'students_existing': 0, 'relationships_created': 3},
+        )
+        ann = AccountUser.objects.get(email='ann.parent@example.com')
+        self.assertTrue(ann.check_password('horse battery 81'))
+        self.assertFalse(AccountUser.objects.get(email='bob.parent@example.com').has_usable_password())
+        self.assertEqual(ParentStudentRelationship.objects.filter(student__first_name='Ann').count(), 2)
+
+    def test_invalid_file_writes_nothing(self):
+        with self.assertRaisesMessage(ValueError, "Line 3: 'not an email' is not a valid email."):
+            provision(self.rows[:1] + ['not an email,,,,,Dee,Lee,'])
+        self.assertFalse(AccountUser.objects.exists())
+        self.assertFalse(StudentProfile.objects.exists())
+
+    def test_reimport_creates_nothing(self):
+        provision(self.rows)
+        stats = provision(self.rows)
+        self.assertEqual(
+            {key: value for key, value in stats.items() if key != 'seconds'},
+            {'guardians_created': 0, 'guardians_existing': 2, 'students_created': 0, 'students_existing': 2, 'relationships_created': 0},
+        )
+        self.assertEqual(StudentProfile.objects.count(), 2)
+        self.assertEqual(ParentStudentRelationship.objects.count(), 3)
+
+    def test_existing_guardian_is_linked(self):
+        user = AccountUser.objects.create_user(email='ann.parent@example.com', password='password', user_type='PARENT')
+        stats = provision(self.rows[:1])
+        self.assertEqual((stats['guardians_created'], stats['guardians_existing']), (0, 1))
+        self.assertTrue(user.check_password('password'))
+        self.assertTrue(ParentStudentRelationship.objects.filter(parent__user=user, student__first_name='Ann').exists())
+
+    def test_passwords_hashed_in_worker_processes(self):
+        provision_accounts(StringIO(PROVISIONING_HEADER + '\n'.join(self.rows[:1] + [
+            'cy.parent@example.com,Cy,Parent,staple horse 92,,,,',
+        ])), workers=2)
+        self.assertTrue(AccountUser.objects.get(email='ann.parent@example.com').check_password('horse battery 81'))
+        self.assertTrue(AccountUser.objects.get(email='cy.parent@example.com').check_password('staple horse 92'))
+
+    def test_signals_are_not_sent_per_user(self):
+        receiver = mock.Mock()
+        post_save.connect(receiver, sender=AccountUser, weak=False)
+        self.addCleanup(post_save.disconnect, receiver, sender=AccountUser)
+        provision(self.rows)
+        receiver.assert_not_called()
+        for user in AccountUser.objects.all():
+            self.assertEqual(ParentProfile.objects.filter(user=user).count(), 1)
+
+    def test_row_without_ref_is_the_student_with_one(self):
+        provision([
+            'bob.parent@example.com,Bob,Parent,,,ann,LEE,P1',
+            'ann.parent@example.com,Ann,Parent,,S1,Ann,Lee,P1',
+        ])
+        student = StudentProfile.objects.get()
+        self.assertEqual(ParentStudentRelationship.objects.filter(student=student).count(), 2)
+
+    def test_row_without_ref_matching_two_students_is_rejected(self):
+        with self.assertRaisesMessage(ValueError, "Line 4: Ann Lee could be student_ref 'S1' or 'S2'"):
+            provision([
+                'ann.parent@example.com,Ann,Parent,,S1,Ann,Lee,P1',
+                'ann.parent@example.com,Ann,Parent,,S2,Ann,Lee,P1',
+                'bob.parent@example.com,Bob,Parent,,,Ann,Lee,P1',
+            ])
+        self.assertFalse(StudentProfile.objects.exists())
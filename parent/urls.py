@@ -6,9 +6,15 @@ urlpatterns = [
     path('profile/edit/', views.edit_parent_profile, name='edit_parent_profile'),
     path('student/add/', views.add_student, name='add_student'),
     path('student/<int:student_id>/', views.view_student, name='view_student'),
+    path('student/<int:student_id>/trips/', views.student_trip_history, name='student_trip_history'),
     path('student/<int:student_id>/edit/', views.edit_student, name='edit_student'),
     path('student/<int:student_id>/delete/', views.delete_student, name='delete_student'),
     path('student/<int:student_id>/export-pdf/', views.export_student_hours_pdf, name='export_student_hours_pdf'),
+    path('student/<int:student_id>/trips/export/<str:export_format>/', views.export_student_trips, name='export_student_trips'),
+    path('export/students/', views.export_students_zip, name='export_students_zip'),
+    path('export/trips/<str:export_format>/', views.export_trips, name='export_trips'),
+    path('export/<uuid:job_id>/', views.export_job_status, name='export_job_status'),
+    path('export/<uuid:job_id>/download/', views.download_export_job, name='download_export_job'),
 
     # Parent Invitation URLs
     path('student/<int:student_id>/invite-parent/', views.invite_parent, name='invite_parent'),
@@ -1,34 +1,53 @@
 from django.shortcuts import render, redirect, get_object_or_404
-from django.contrib.auth.decorators import login_required
 from django.contrib import messages
+from django.contrib.auth import authenticate, login
+from django.contrib.auth.decorators import login_required
 from django.core.exceptions import PermissionDenied
 from django.utils import timezone
 from datetime import datetime
+from pathlib import Path
 from parent.models.parent_profile import ParentProfile
 from parent.models.parent_student_relationship import ParentStudentRelationship
 from student.models.student_profile import StudentProfile
 from student.models.driving_sessions import Trip
-from django.http import HttpResponse
-from student.services.pdf_export_service import generate_driving_hours_pdf
+from django.http import Http404, HttpResponse, JsonResponse, StreamingHttpResponse
+from django.utils.cache import get_conditional_response
+from django.template.loader import render_to_string
+from student.services.pdf_export_service import render_cached_report, report_filename
+from student.services.bulk_export_service import iter_reports_zip
+from student.services.hours_ledger_service import get_student_ledger
+from student.services.report_cache_service import get_cached_report, report_fingerprint
+from student.services.export_job_service import enqueue_export, requeue_export, should_render_in_background
+from student.models.pdf_export_job import PdfExportJob
+from student.services.trip_history_service import filter_trips, get_trip_page, parse_trip_filters, serialize_trip
+from student.services.trip_export_service import TRIP_EXPORT_FORMATS, get_export_trips
+from core.services.login_throttle_service import throttle_login
+from core.services.photo_job_service import clear_photo, enqueue_photo
+from core.services.media_service import send_file
+from core.storage import get_photo_storage
 from parent.models.parent_invitation import ParentInvitation
-from django.core.mail import send_mail
 from django.conf import settings
-from django.contrib.sites.shortcuts import get_current_site
+from django.db import transaction
 from django.urls import reverse
-
-@login_required
+from parent.decorators import parent_required
+from parent.services.access_service import (
+    can_access_student,
+    can_view_photo,
+    get_accessible_student,
+    get_accessible_student_ids,
+    get_parent_profile,
+)
+from parent.services.invitation_service import queue_invitation_email
+
+@parent_required(
+    "Only parents can access this page.",
+    profile_missing_message="Parent profile not found. Please contact support.",
+)
 def parent_dashboard(request):
     """
     Parent dashboard showing their students and recent activity
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can access this page.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found. Please contact support.")
-        return redirect('dashboard')
+    parent_profile = request.parent_profile
 
     # Get all students related to this parent
     relationships = ParentStudentRelationship.objects.filter(
@@ -41,7 +60,7 @@ def parent_dashboard(request):
     recent_trips = Trip.objects.filter(
         parent=parent_profile,
         student__in=students
-    ).order_by('-start_time')[:10]
+    ).select_related('student').order_by('-start_time')[:10]
 
     context = {
         'parent_profile': parent_profile,
@@ -53,19 +72,12 @@ def parent_dashboard(request):
     return render(request, 'parent/dashboard.html', context)
 
 
-@login_required
+@parent_required("Only parents can edit their profile.")
 def edit_parent_profile(request):
     """
     Edit parent profile information including photo
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can edit their profile.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+    parent_profile = request.parent_profile
 
     if request.method == 'POST':
         # Update user information
@@ -81,14 +93,15 @@ def edit_parent_profile(request):
         parent_profile.state = request.POST.get('state', '')
         parent_profile.zipcode = request.POST.get('zipcode', '')
 
-        # Handle photo upload
+        # Handle photo upload; the photo is processed in the background once the profile is saved
+        photo = None
         if 'photo' in request.FILES:
-            from core.services.photo_utils import validate_photo, process_profile_photo
+            from core.services.photo_utils import validate_photo
 
-            photo = request.FILES['photo']
-            is_valid, error_message = validate_photo(photo)
+            # The decoded, scaled down photo is queued rather than the upload
+            photo, error_message = validate_photo(request.FILES['photo'])
 
-            if not is_valid:
+            if photo is None:
                 messages.error(request, error_message)
                 return render(request, 'parent/edit_profile.html', {
                     'parent_profile': parent_profile
@@ -97,26 +110,8 @@ def edit_parent_profile(request):
             # Get rotation value
             rotation = int(request.POST.get('rotation', 0))
 
-            # Process the photo
-            try:
-                processed_photo = process_profile_photo(photo, rotation)
-
-                # Delete old photo if exists
-                if parent_profile.photo:
-                    parent_profile.photo.delete(save=False)
-
-                parent_profile.photo = processed_photo
-            except Exception as e:
-                messages.error(request, f'Error processing image: {str(e)}')
-                return render(request, 'parent/edit_profile.html', {
-                    'parent_profile': parent_profile
-                })
-
         # Handle photo removal
-        if request.POST.get('remove_photo') == 'true':
-            if parent_profile.photo:
-                parent_profile.photo.delete(save=False)
-                parent_profile.photo = None
+        remove_photo = request.POST.get('remove_photo') == 'true'
 
         # Validation
         if not request.user.first_name or not request.user.last_name:
@@ -133,7 +128,13 @@ def edit_parent_profile(request):
 
         try:
             request.user.save()
-            parent_profile.save()
+            # The photo fields belong to the photo service, which may be swapping in a new photo right now
+            parent_profile.save(update_fields=['phone', 'address1', 'address2', 'city', 'state', 'zipcode'])
+            if remove_photo:
+                clear_photo(parent_profile)
+            elif photo:
+                enqueue_photo(parent_profile, photo, rotation)
+                messages.info(request, 'Your new photo is being processed and will appear shortly.')
             messages.success(request, 'Profile updated successfully!')
             return redirect('parent_dashboard')
         except Exception as e:
@@ -146,18 +147,39 @@ def edit_parent_profile(request):
     return render(request, 'parent/edit_profile.html', context)
 
 @login_required
-def add_student(request):
+def profile_photo(request, name):
     """
-    Add a new student profile
+    Serve a profile photo of the user's parent profile or one of its students
+
+    Any logged in user with a parent profile may view them, whatever their
+    user type, since every page showing the photo is allowed to.
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can add students.")
+    name = f"profile_photos/{name}"
+    parent_profile = get_parent_profile(request)
+    if parent_profile is None or not can_view_photo(parent_profile, name):
+        raise Http404("Photo not found.")
 
+    storage = get_photo_storage()
+    path = Path(storage.path(name))
     try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+        stat = path.stat()
+    except FileNotFoundError:
+        raise Http404("Photo not found.")
+
+    # A content addressed file never changes, so its URL is cached for good;
+    # a photo stored before content addressing is revalidated instead
+    digest = storage.content_digest(name)
+    if digest:
+        return send_file(request, path, etag=f'"{digest}"', immutable=True)
+    return send_file(request, path, etag=f'"{stat.st_mtime_ns:x}-{stat.st_size:x}"')
+
+
+@parent_required("Only parents can add students.")
+def add_student(request):
+    """
+    Add a new student profile
+    """
+    parent_profile = request.parent_profile
 
     if request.method == 'POST':
         first_name = request.POST.get('first_name')
@@ -195,85 +217,77 @@ def add_student(request):
     return render(request, 'parent/add_student.html')
 
 
-@login_required
+@parent_required("Only parents can view student details.")
 def view_student(request, student_id):
     """
     View detailed information about a specific student
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can view student details.")
+    student = get_accessible_student(request, student_id, "You don't have permission to view this student.")
 
     try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
-
-    # Get student and verify relationship
-    student = get_object_or_404(StudentProfile, id=student_id)
-
-    relationship = ParentStudentRelationship.objects.filter(
-        parent=parent_profile,
-        student=student
-    ).first()
-
-    if not relationship:
-        raise PermissionDenied("You don't have permission to view this student.")
-
-    # Get all trips for this student
-    trips = Trip.objects.filter(student=student).order_by('-start_time')
-
-    # Check for active trip (NEW)
-    active_trip = trips.filter(is_active=True).first()
+        filters = parse_trip_filters(request.GET)
+        trips, next_cursor = get_trip_page(student, cursor=request.GET.get('cursor'), **filters)
+    except ValueError as e:
+        messages.error(request, str(e))
+        filters = parse_trip_filters({})
+        trips, next_cursor = get_trip_page(student)
+
+    # Check for active trip
+    active_trip = Trip.objects.filter(student=student, is_active=True).first()
     has_active_trip = active_trip is not None
     active_trip_id = active_trip.trip_id if active_trip else None
 
-    # Calculate total hours (only from approved, completed trips) - UPDATED
-    approved_completed_trips = trips.filter(is_approved=True, is_active=False)
-    total_minutes = sum(trip.duration for trip in approved_completed_trips if trip.duration)
-    total_hours = total_minutes / 60
-    night_trips = approved_completed_trips.filter(is_night=True)
-    night_minutes = sum(trip.duration for trip in night_trips if trip.duration)
-    night_hours = night_minutes / 60
+    # Hours and session counts come from the ledger
+    ledger = get_student_ledger(student)
+    trip_count = ledger.approved_session_count + ledger.pending_session_count + (1 if has_active_trip else 0)
 
     context = {
         'student': student,
         'trips': trips,
-        'total_hours': round(total_hours, 2),
-        'night_hours': round(night_hours, 2),
-        'day_hours': round(total_hours - night_hours, 2),
-        'trip_count': trips.count(),
-        'has_active_trip': has_active_trip,  # NEW
-        'active_trip_id': active_trip_id,    # NEW
+        'next_cursor': next_cursor,
+        'filters': filters,
+        'is_filtered': any(filters.values()),
+        'total_hours': ledger.total_hours,
+        'night_hours': ledger.night_hours,
+        'day_hours': ledger.day_hours,
+        'trip_count': trip_count,
+        'has_active_trip': has_active_trip,
+        'active_trip_id': active_trip_id,
     }
 
     return render(request, 'parent/view_student.html', context)
 
 
-@login_required
-def edit_student(request, student_id):
+@parent_required("Only parents can view student details.")
+def student_trip_history(request, student_id):
     """
-    Edit student information including photo
+    JSON page of a student's trip history for "load more"
+
+    A student the parent can't access is answered like one that doesn't exist.
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can edit student information.")
+    if not can_access_student(request.parent_profile, student_id):
+        return JsonResponse({'error': "Student not found."}, status=404)
+    student = get_object_or_404(StudentProfile, id=student_id)
 
     try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+        filters = parse_trip_filters(request.GET)
+        trips, next_cursor = get_trip_page(student, cursor=request.GET.get('cursor'), **filters)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
 
-    student = get_object_or_404(StudentProfile, id=student_id)
+    return JsonResponse({
+        'trips': [serialize_trip(trip) for trip in trips],
+        'html': render_to_string('parent/trip_rows.html', {'trips': trips}, request=request),
+        'next_cursor': next_cursor,
+    })
 
-    # Verify relationship
-    relationship = ParentStudentRelationship.objects.filter(
-        parent=parent_profile,
-        student=student
-    ).first()
 
-    if not relationship:
-        raise PermissionDenied("You don't have permission to edit this student.")
+@parent_required("Only parents can edit student information.")
+def edit_student(request, student_id):
+    """
+    Edit student information including photo
+    """
+    student = get_accessible_student(request, student_id, "You don't have permission to edit this student.")
 
     if request.method == 'POST':
         student.first_name = request.POST.get('first_name')
@@ -281,45 +295,36 @@ def edit_student(request, student_id):
         student.permit_number = request.POST.get('permit_number', '')
         student.drivers_ed_completed = request.POST.get('drivers_ed_completed') == 'on'
 
-        # Handle photo upload
+        # Handle photo upload; the photo is processed in the background once the student is saved
+        photo = None
         if 'photo' in request.FILES:
-            from core.services.photo_utils import validate_photo, process_profile_photo
+            from core.services.photo_utils import validate_photo
 
-            photo = request.FILES['photo']
-            is_valid, error_message = validate_photo(photo)
+            # The decoded, scaled down photo is queued rather than the upload
+            photo, error_message = validate_photo(request.FILES['photo'])
 
-            if not is_valid:
+            if photo is None:
                 messages.error(request, error_message)
                 return render(request, 'parent/edit_student.html', {'student': student})
 
             # Get rotation value
             rotation = int(request.POST.get('rotation', 0))
 
-            # Process the photo
-            try:
-                processed_photo = process_profile_photo(photo, rotation)
-
-                # Delete old photo if exists
-                if student.photo:
-                    student.photo.delete(save=False)
-
-                student.photo = processed_photo
-            except Exception as e:
-                messages.error(request, f'Error processing image: {str(e)}')
-                return render(request, 'parent/edit_student.html', {'student': student})
-
         # Handle photo removal
-        if request.POST.get('remove_photo') == 'true':
-            if student.photo:
-                student.photo.delete(save=False)
-                student.photo = None
+        remove_photo = request.POST.get('remove_photo') == 'true'
 
         if not student.first_name or not student.last_name:
             messages.error(request, 'First name and last name are required.')
             return render(request, 'parent/edit_student.html', {'student': student})
 
         try:
-            student.save()
+            # The photo fields belong to the photo service, which may be swapping in a new photo right now
+            student.save(update_fields=['first_name', 'last_name', 'permit_number', 'drivers_ed_completed'])
+            if remove_photo:
+                clear_photo(student)
+            elif photo:
+                enqueue_photo(student, photo, rotation)
+                messages.info(request, 'The new photo is being processed and will appear shortly.')
             messages.success(request, f'Student {student.first_name} {student.last_name} updated successfully!')
             return redirect('view_student', student_id=student.id)
         except Exception as e:
@@ -332,34 +337,18 @@ def edit_student(request, student_id):
     return render(request, 'parent/edit_student.html', context)
 
 
-@login_required
+@parent_required("Only parents can remove students.")
 def delete_student(request, student_id):
     """
     Delete a student (removes relationship, not the student profile itself)
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can remove students.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
-
-    student = get_object_or_404(StudentProfile, id=student_id)
+    parent_profile = request.parent_profile
 
-    # Find and delete the relationship
-    relationship = ParentStudentRelationship.objects.filter(
-        parent=parent_profile,
-        student=student
-    ).first()
-
-    if not relationship:
-        raise PermissionDenied("You don't have permission to remove this student.")
+    student = get_accessible_student(request, student_id, "You don't have permission to remove this student.")
 
     if request.method == 'POST':
         student_name = f"{student.first_name} {student.last_name}"
-        relationship.delete()
+        ParentStudentRelationship.objects.filter(parent=parent_profile, student=student).delete()
         messages.success(request, f'Student {student_name} removed from your account.')
         return redirect('parent_dashboard')
 
@@ -370,88 +359,197 @@ def delete_student(request, student_id):
     return render(request, 'parent/delete_student.html', context)
 
 
-@login_required
+@parent_required("Only parents can export student reports.")
 def export_student_hours_pdf(request, student_id):
     """
     Export student driving hours as PDF for DMV submission
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can export student reports.")
+    parent_profile = request.parent_profile
+
+    student = get_accessible_student(request, student_id, "You don't have permission to export this student's report.")
+
+    ledger = get_student_ledger(student)
+    if not ledger.approved_session_count:
+        messages.warning(request,
+                         f"No approved driving sessions found for {student.first_name}. Approve some trips first.")
+        return redirect('view_student', student_id=student.id)
+
+    # Reports are cached by a fingerprint of their content, which is also the ETag
+    fingerprint = report_fingerprint(student, parent_profile, ledger)
+    etag = f'"{fingerprint}"'
+
+    path = None
+    # Nothing to look up or render when the browser's copy is current
+    if get_conditional_response(request, etag=etag) is None:
+        # Generate PDF
+        try:
+            path = get_cached_report(fingerprint)
+            if path is None and should_render_in_background(ledger):
+                # Long logs are rendered by a worker process; the job page polls until it is ready
+                job = enqueue_export(student, parent_profile, fingerprint)
+                return redirect('export_job_status', job_id=job.job_id)
+            if path is None:
+                path = render_cached_report(student, parent_profile, ledger, fingerprint)
+        except Exception as e:
+            messages.error(request, f'Error generating PDF: {str(e)}')
+            return redirect('view_student', student_id=student.id)
+
+    # The same URL serves newer reports later, so it is always revalidated
+    return send_file(
+        request,
+        path,
+        etag=etag,
+        content_type='application/pdf',
+        filename=report_filename(student),
+        as_attachment=True,
+    )
+
+
+@parent_required("Only parents can export driving hours.")
+def export_students_zip(request):
+    """
+    Export the driving hours reports of several students as one ZIP
+
+    Takes the students to include as repeated ?student= parameters, or all of
+    the parent's students when none are given.
+    """
+    accessible_ids = get_accessible_student_ids(request.parent_profile)
 
     try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+        student_ids = {int(student_id) for student_id in request.GET.getlist('student')}
+    except ValueError:
+        messages.error(request, 'Invalid student selection.')
+        return redirect('parent_dashboard')
 
-    student = get_object_or_404(StudentProfile, id=student_id)
+    if not student_ids:
+        student_ids = set(accessible_ids)
+    elif not student_ids <= accessible_ids:
+        raise PermissionDenied("You don't have permission to export one of these students' reports.")
 
-    # Verify relationship
-    relationship = ParentStudentRelationship.objects.filter(
-        parent=parent_profile,
-        student=student
-    ).first()
+    if not student_ids:
+        messages.warning(request, 'Select at least one student to export.')
+        return redirect('parent_dashboard')
 
-    if not relationship:
-        raise PermissionDenied("You don't have permission to export this student's report.")
+    response = StreamingHttpResponse(
+        iter_reports_zip(sorted(student_ids), request.parent_profile),
+        content_type='application/zip',
+    )
+    response['Content-Disposition'] = f'attachment; filename="driving_hours_{timezone.localdate():%Y%m%d}.zip"'
+    return response
 
-    # Get only approved trips (these are the official hours)
-    trips = Trip.objects.filter(
-        student=student,
-        is_approved=True,
-        is_active=False
-    ).order_by('start_time')
 
-    if not trips.exists():
-        messages.warning(request,
-                         f"No approved driving sessions found for {student.first_name}. Approve some trips first.")
+def _trip_export_response(trips, export_format, filename):
+    if export_format not in TRIP_EXPORT_FORMATS:
+        raise Http404("Unknown export format.")
+
+    content_type, encode = TRIP_EXPORT_FORMATS[export_format]
+    response = StreamingHttpResponse(encode(trips), content_type=content_type)
+    response['Content-Disposition'] = f'attachment; filename="{filename}.{export_format}"'
+    return response
+
+
+@parent_required("Only parents can export driving sessions.")
+def export_student_trips(request, student_id, export_format):
+    """
+    Export a student's driving sessions as CSV or JSON Lines
+
+    Takes the same start_date, end_date and type filters as the trip history.
+    """
+    student = get_accessible_student(request, student_id, "You don't have permission to export this student's sessions.")
+
+    try:
+        filters = parse_trip_filters(request.GET)
+    except ValueError as e:
+        messages.error(request, str(e))
         return redirect('view_student', student_id=student.id)
 
-    # Generate PDF
+    trips = filter_trips(get_export_trips([student.id]), **filters)
+    return _trip_export_response(trips, export_format, f"driving_sessions_{student.first_name}_{student.last_name}")
+
+
+@parent_required("Only parents can export driving sessions.")
+def export_trips(request, export_format):
+    """
+    Export the driving sessions of all of the parent's students as CSV or JSON Lines
+
+    Takes the same start_date, end_date and type filters as the trip history.
+    """
     try:
-        pdf = generate_driving_hours_pdf(student, trips, parent_profile)
+        filters = parse_trip_filters(request.GET)
+    except ValueError as e:
+        messages.error(request, str(e))
+        return redirect('parent_dashboard')
 
-        # Create the response
-        response = HttpResponse(content_type='application/pdf')
-        response[
-            'Content-Disposition'] = f'attachment; filename="driving_hours_{student.first_name}_{student.last_name}.pdf"'
-        response.write(pdf)
+    trips = filter_trips(get_export_trips(get_accessible_student_ids(request.parent_profile)), **filters)
+    return _trip_export_response(trips, export_format, f"driving_sessions_{timezone.localdate():%Y%m%d}")
 
-        return response
 
-    except Exception as e:
-        messages.error(request, f'Error generating PDF: {str(e)}')
-        return redirect('view_student', student_id=student.id)
+def _get_export_job(request, job_id):
+    # Another parent's job is answered like one that doesn't exist
+    return get_object_or_404(
+        PdfExportJob.objects.select_related('student'),
+        job_id=job_id,
+        requested_by=request.parent_profile,
+    )
+
+
+@parent_required("Only parents can export driving hours.")
+def export_job_status(request, job_id):
+    """
+    Progress page of a background PDF export, or its status as JSON for polling
+    """
+    job = _get_export_job(request, job_id)
+
+    if 'application/json' in request.headers.get('Accept', ''):
+        return JsonResponse({
+            'status': job.status,
+            'error': job.error,
+            'download_url': reverse('download_export_job', args=[job.job_id]) if job.status == 'DONE' else None,
+        })
+
+    return render(request, 'parent/export_job.html', {'job': job, 'student': job.student})
+
+
+@parent_required("Only parents can export driving hours.")
+def download_export_job(request, job_id):
+    """
+    Download the PDF of a finished background export
+    """
+    job = _get_export_job(request, job_id)
+    if job.status != 'DONE':
+        return redirect('export_job_status', job_id=job.job_id)
+
+    student = job.student
+    path = get_cached_report(job.fingerprint)
+    if path is None:
+        # Evicted from the report cache since the job finished
+        requeue_export(job)
+        return redirect('export_job_status', job_id=job.job_id)
+
+    # A job is for one fingerprint, so its download never changes
+    return send_file(
+        request,
+        path,
+        etag=f'"{job.fingerprint}"',
+        immutable=True,
+        content_type='application/pdf',
+        filename=report_filename(student),
+        as_attachment=True,
+    )
 
 
 # ============================================
 # PARENT INVITATION VIEWS
 # ============================================
 
-@login_required
+@parent_required("Only parents can invite other parents.")
 def invite_parent(request, student_id):
     """
     Send an invitation to another parent/guardian to access a student
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can invite other parents.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
-
-    student = get_object_or_404(StudentProfile, id=student_id)
+    parent_profile = request.parent_profile
 
-    # Verify relationship
-    relationship = ParentStudentRelationship.objects.filter(
-        parent=parent_profile,
-        student=student
-    ).first()
-
-    if not relationship:
-        raise PermissionDenied("You don't have permission to invite parents for this student.")
+    student = get_accessible_student(request, student_id, "You don't have permission to invite parents for this student.")
 
     if request.method == 'POST':
         invited_email = request.POST.get('invited_email', '').strip().lower()
@@ -502,56 +600,18 @@ def invite_parent(request, student_id):
                 existing_invitation.mark_expired()
 
         try:
-            # Create invitation
-            invitation = ParentInvitation.objects.create(
-                inviter=parent_profile,
-                student=student,
-                invited_email=invited_email,
-                invited_first_name=invited_first_name,
-                invited_last_name=invited_last_name,
-                message=message
-            )
-
-            # Send invitation email
-            current_site = get_current_site(request)
-            invitation_url = request.build_absolute_uri(
-                reverse('accept_invitation', kwargs={'token': invitation.token})
-            )
-
-            subject = f"You've been invited to help track {student.first_name}'s driving hours"
-
-            email_message = f"""Hello{' ' + invited_first_name if invited_first_name else ''},
-
-{request.user.get_full_name()} has invited you to help track driving hours for {student.first_name} {student.last_name} on DMV+.
-
-"""
-            if message:
-                email_message += f"Personal message from {request.user.get_full_name()}:\n\"{message}\"\n\n"
-
-            email_message += f"""To accept this invitation and create your account (or link to your existing account), click the link below:
-
-{invitation_url}
-
-This invitation will expire on {invitation.expires_at.strftime('%B %d, %Y at %I:%M %p')}.
-
-Once you accept, you'll be able to:
-- Log driving sessions for {student.first_name}
-- Approve driving hours
-- View {student.first_name}'s progress
-- Export reports for the DMV
-
----
-DMV+ - Drive, Manage, Verify
-This is an automated message. Please do not reply to this email.
-"""
-
-            send_mail(
-                subject,
-                email_message,
-                settings.DEFAULT_FROM_EMAIL,
-                [invited_email],
-                fail_silently=False,
-            )
+            # Create the invitation and queue its email together: the email is
+            # sent only if the invitation is saved, after the request returns
+            with transaction.atomic():
+                invitation = ParentInvitation.objects.create(
+                    inviter=parent_profile,
+                    student=student,
+                    invited_email=invited_email,
+                    invited_first_name=invited_first_name,
+                    invited_last_name=invited_last_name,
+                    message=message
+                )
+                queue_invitation_email(request, invitation)
 
             messages.success(request,
                              f'Invitation sent to {invited_email}! They will receive an email with instructions.')
@@ -568,30 +628,12 @@ This is an automated message. Please do not reply to this email.
     return render(request, 'parent/invite_parent.html', context)
 
 
-@login_required
+@parent_required("Only parents can view invitations.")
 def view_invitations(request, student_id):
     """
     View all invitations for a student
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can view invitations.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
-
-    student = get_object_or_404(StudentProfile, id=student_id)
-
-    # Verify relationship
-    relationship = ParentStudentRelationship.objects.filter(
-        parent=parent_profile,
-        student=student
-    ).first()
-
-    if not relationship:
-        raise PermissionDenied("You don't have permission to view invitations for this student.")
+    student = get_accessible_student(request, student_id, "You don't have permission to view invitations for this student.")
 
     # Get all invitations for this student
     invitations = ParentInvitation.objects.filter(
@@ -611,24 +653,17 @@ def view_invitations(request, student_id):
     return render(request, 'parent/view_invitations.html', context)
 
 
-@login_required
+@parent_required("Only parents can cancel invitations.")
 def cancel_invitation(request, invitation_id):
     """
     Cancel a pending invitation
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can cancel invitations.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+    parent_profile = request.parent_profile
 
     invitation = get_object_or_404(ParentInvitation, invitation_id=invitation_id)
 
     # Verify the current user is the inviter
-    if invitation.inviter != parent_profile:
+    if invitation.inviter_id != parent_profile.id:
         raise PermissionDenied("You don't have permission to cancel this invitation.")
 
     if request.method == 'POST':
@@ -637,7 +672,7 @@ def cancel_invitation(request, invitation_id):
         else:
             messages.warning(request, 'Invitation could not be cancelled (may already be accepted or expired).')
 
-        return redirect('view_invitations', student_id=invitation.student.id)
+        return redirect('view_invitations', student_id=invitation.student_id)
 
     context = {
         'invitation': invitation,
@@ -705,6 +740,15 @@ def accept_invitation(request, token):
                     'invitation': invitation,
                 })
 
+            retry_after = throttle_login(request, email)
+            if retry_after:
+                messages.error(request, f'Too many login attempts. Please try again in {retry_after} seconds.')
+                response = render(request, 'parent/accept_invitation.html', {
+                    'invitation': invitation,
+                }, status=429)
+                response['Retry-After'] = retry_after
+                return response
+
             user = authenticate(request, username=email, password=password)
 
             if user is not None:
@@ -824,30 +868,14 @@ def accept_invitation(request, token):
 # TRIP LOGGING VIEWS
 # ============================================
 
-@login_required
+@parent_required("Only parents can log trips.")
 def log_trip(request, student_id):
     """
     Log a new driving trip for a student
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can log trips.")
+    parent_profile = request.parent_profile
 
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
-
-    student = get_object_or_404(StudentProfile, id=student_id)
-
-    # Verify relationship
-    relationship = ParentStudentRelationship.objects.filter(
-        parent=parent_profile,
-        student=student
-    ).first()
-
-    if not relationship:
-        raise PermissionDenied("You don't have permission to log trips for this student.")
+    student = get_accessible_student(request, student_id, "You don't have permission to log trips for this student.")
 
     if request.method == 'POST':
         start_date = request.POST.get('start_date')
@@ -908,24 +936,17 @@ def log_trip(request, student_id):
     return render(request, 'parent/log_trip.html', context)
 
 
-@login_required
+@parent_required("Only parents can view trip details.")
 def view_trip(request, trip_id):
     """
     View details of a specific trip
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can view trip details.")
+    parent_profile = request.parent_profile
 
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
-
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = get_object_or_404(Trip.objects.select_related('student'), trip_id=trip_id)
 
     # Verify parent owns this trip
-    if trip.parent != parent_profile:
+    if trip.parent_id != parent_profile.id:
         raise PermissionDenied("You don't have permission to view this trip.")
 
     context = {
@@ -935,24 +956,17 @@ def view_trip(request, trip_id):
 
     return render(request, 'parent/view_trip.html', context)
 
-@login_required
+@parent_required("Only parents can approve trips.")
 def approve_trip(request, trip_id):
     """
     Approve a trip - makes it read-only
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can approve trips.")
+    parent_profile = request.parent_profile
 
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
-
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = get_object_or_404(Trip.objects.select_related('student'), trip_id=trip_id)
 
     # Verify parent owns this trip
-    if trip.parent != parent_profile:
+    if trip.parent_id != parent_profile.id:
         raise PermissionDenied("You don't have permission to approve this trip.")
 
     if trip.is_approved:
@@ -974,25 +988,17 @@ def approve_trip(request, trip_id):
 
 # Replace the existing edit_trip function in parent/views.py
 
-@login_required
-@login_required
+@parent_required("Only parents can edit trips.")
 def edit_trip(request, trip_id):
     """
     Edit an existing trip (not allowed for active or approved trips)
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can edit trips.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+    parent_profile = request.parent_profile
 
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = get_object_or_404(Trip.objects.select_related('student'), trip_id=trip_id)
 
     # Verify parent owns this trip
-    if trip.parent != parent_profile:
+    if trip.parent_id != parent_profile.id:
         raise PermissionDenied("You don't have permission to edit this trip.")
 
     # Check if trip is active (NEW)
@@ -1053,24 +1059,17 @@ def edit_trip(request, trip_id):
     return render(request, 'parent/edit_trip.html', context)
 
 
-@login_required
+@parent_required("Only parents can delete trips.")
 def delete_trip(request, trip_id):
     """
     Delete a trip (including active trips if under minimum duration)
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can delete trips.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+    parent_profile = request.parent_profile
 
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = get_object_or_404(Trip.objects.select_related('student'), trip_id=trip_id)
 
     # Verify parent owns this trip
-    if trip.parent != parent_profile:
+    if trip.parent_id != parent_profile.id:
         raise PermissionDenied("You don't have permission to delete this trip.")
 
     student_id = trip.student.id
@@ -1100,30 +1099,14 @@ def delete_trip(request, trip_id):
 # TIMER-BASED TRIP VIEWS (NEW)
 # ============================================
 
-@login_required
+@parent_required("Only parents can start trips.")
 def start_trip(request, student_id):
     """
     Start a new trip with timer
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can start trips.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+    parent_profile = request.parent_profile
 
-    student = get_object_or_404(StudentProfile, id=student_id)
-
-    # Verify relationship
-    relationship = ParentStudentRelationship.objects.filter(
-        parent=parent_profile,
-        student=student
-    ).first()
-
-    if not relationship:
-        raise PermissionDenied("You don't have permission to log trips for this student.")
+    student = get_accessible_student(request, student_id, "You don't have permission to log trips for this student.")
 
     # Check if there's already an active trip for this student
     active_trip = Trip.objects.filter(
@@ -1162,24 +1145,17 @@ def start_trip(request, student_id):
     return render(request, 'parent/start_trip.html', context)
 
 
-@login_required
+@parent_required("Only parents can view trip details.")
 def active_trip(request, trip_id):
     """
     Display active trip with timer
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can view trip details.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+    parent_profile = request.parent_profile
 
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = get_object_or_404(Trip.objects.select_related('student'), trip_id=trip_id)
 
     # Verify parent owns this trip
-    if trip.parent != parent_profile:
+    if trip.parent_id != parent_profile.id:
         raise PermissionDenied("You don't have permission to view this trip.")
 
     # Verify trip is active
@@ -1195,24 +1171,17 @@ def active_trip(request, trip_id):
     return render(request, 'parent/active_trip.html', context)
 
 
-@login_required
+@parent_required("Only parents can stop trips.")
 def stop_trip(request, trip_id):
     """
     Stop an active trip (must be at least 5 minutes) or cancel it
     """
-    if request.user.user_type != 'PARENT':
-        raise PermissionDenied("Only parents can stop trips.")
-
-    try:
-        parent_profile = ParentProfile.objects.get(user=request.user)
-    except ParentProfile.DoesNotExist:
-        messages.error(request, "Parent profile not found.")
-        return redirect('dashboard')
+    parent_profile = request.parent_profile
 
-    trip = get_object_or_404(Trip, trip_id=trip_id)
+    trip = get_object_or_404(Trip.objects.select_related('student'), trip_id=trip_id)
 
     # Verify parent owns this trip
-    if trip.parent != parent_profile:
+    if trip.parent_id != parent_profile.id:
         raise PermissionDenied("You don't have permission to stop this trip.")
 
     # Verify trip is active
@@ -2,6 +2,8 @@ from django.contrib import admin
 from student.models.student_profile import StudentProfile
 from student.models.driving_sessions import Trip
 from student.models.driving_session_audit import TripSessionAudit
+from student.models.student_hours_ledger import StudentHoursLedger
+from student.models.pdf_export_job import PdfExportJob
 
 @admin.register(StudentProfile)
 class StudentProfileAdmin(admin.ModelAdmin):
@@ -10,5 +12,16 @@ class StudentProfileAdmin(admin.ModelAdmin):
 
 @admin.register(Trip)
 class TripAdmin(admin.ModelAdmin):
-    list_display = ['trip_id', 'student', 'parent', 'start_time', 'end_time', 'duration', 'is_night']
+    list_display = ['trip_id', 'student', 'parent', 'start_time', 'end_time', 'duration', 'night_minutes', 'is_night']
     list_filter = ['is_night', 'is_approved']
+
+@admin.register(StudentHoursLedger)
+class StudentHoursLedgerAdmin(admin.ModelAdmin):
+    list_display = ['student', 'approved_total_minutes', 'approved_night_minutes', 'approved_session_count', 'pending_session_count', 'updated_at']
+    readonly_fields = ['updated_at']
+
+@admin.register(PdfExportJob)
+class PdfExportJobAdmin(admin.ModelAdmin):
+    list_display = ['job_id', 'student', 'requested_by', 'status', 'created_at', 'finished_at']
+    list_filter = ['status']
+    readonly_fields = ['fingerprint', 'created_at', 'started_at', 'finished_at']
@@ -3,3 +3,7 @@ from django.apps import AppConfig
 
 class StudentConfig(AppConfig):
     name = 'student'
+
+    def ready(self):
+        import student.services.hours_ledger_service
+        import student.services.report_cache_service
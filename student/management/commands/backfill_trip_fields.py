@@ -0,0 +1,143 @@
+import os
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ProcessPoolExecutor, wait
+
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from student.services.trip_backfill_service import (
+    clear_checkpoint,
+    load_checkpoint,
+    next_chunk_bound,
+    recompute_trip_range,
+    save_checkpoint,
+)
+
+
+def _init_worker():
+    import django
+    django.setup()
+
+
+class Command(BaseCommand):
+    help = (
+        'Recompute derived Trip fields (duration, day/night minutes, is_night) in '
+        'trip_id-ordered chunks. Progress is checkpointed so an interrupted run '
+        'resumes where it stopped.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--chunk-size',
+            type=int,
+            default=2000,
+            help='Trips per chunk (default 2000).',
+        )
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes to spread chunks across (default 1, in-process).',
+        )
+        parser.add_argument(
+            '--checkpoint',
+            default=os.path.join(settings.BASE_DIR, 'trip_backfill.checkpoint.json'),
+            help='Checkpoint file path.',
+        )
+        parser.add_argument(
+            '--restart',
+            action='store_true',
+            help='Ignore any existing checkpoint and start from the first trip.',
+        )
+
+    def handle(self, *args, **options):
+        chunk_size = options['chunk_size']
+        workers = options['workers']
+        path = options['checkpoint']
+
+        if chunk_size < 1:
+            raise CommandError('--chunk-size must be at least 1.')
+        if workers < 1:
+            raise CommandError('--workers must be at least 1.')
+
+        if options['restart']:
+            clear_checkpoint(path)
+
+        checkpoint = load_checkpoint(path)
+        if checkpoint['last_trip_id']:
+            self.stdout.write(f"Resuming after trip {checkpoint['last_trip_id']} "
+                              f"({checkpoint['scanned']} trips already scanned).")
+
+        started = time.monotonic()
+        if workers == 1:
+            self._run_serial(checkpoint, path, chunk_size)
+        else:
+            self._run_parallel(checkpoint, path, chunk_size, workers)
+        clear_checkpoint(path)
+
+        elapsed = time.monotonic() - started
+        self.stdout.write(self.style.SUCCESS(
+            f"Done: {checkpoint['scanned']} trips scanned, {checkpoint['updated']} updated "
+            f"in {elapsed:.1f}s."
+        ))
+
+    def _record(self, checkpoint, path, upper, scanned, updated):
+        checkpoint['scanned'] += scanned
+        checkpoint['updated'] += updated
+        if upper is not None:
+            checkpoint['last_trip_id'] = str(upper)
+            save_checkpoint(path, checkpoint)
+        self.stdout.write(f"  {checkpoint['scanned']} scanned, {checkpoint['updated']} updated")
+
+    def _run_serial(self, checkpoint, path, chunk_size):
+        lower = checkpoint['last_trip_id']
+        while True:
+            upper, has_rows = next_chunk_bound(lower, chunk_size)
+            if not has_rows:
+                return
+
+            scanned, updated = recompute_trip_range(lower, upper)
+            self._record(checkpoint, path, upper, scanned, updated)
+
+            if upper is None:
+                return
+            lower = upper
+
+    def _run_parallel(self, checkpoint, path, chunk_size, workers):
+        # Chunks can finish out of order; the checkpoint only advances past a
+        # chunk once every chunk before it has finished as well.
+        connections.close_all()
+
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker) as pool:
+            pending = {}
+            in_order = deque()
+            lower = checkpoint['last_trip_id']
+            exhausted = False
+
+            while pending or not exhausted:
+                while not exhausted and len(pending) < workers * 2:
+                    upper, has_rows = next_chunk_bound(lower, chunk_size)
+                    if not has_rows:
+                        exhausted = True
+                        break
+
+                    chunk = {'upper': upper, 'result': None}
+                    pending[pool.submit(recompute_trip_range, lower, upper)] = chunk
+                    in_order.append(chunk)
+
+                    if upper is None:
+                        exhausted = True
+                    lower = upper
+
+                if not pending:
+                    break
+
+                done, _ = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    pending.pop(future)['result'] = future.result()
+
+                while in_order and in_order[0]['result'] is not None:
+                    chunk = in_order.popleft()
+                    self._record(checkpoint, path, chunk['upper'], *chunk['result'])
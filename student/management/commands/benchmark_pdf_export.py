@@ -0,0 +1,88 @@
+import gc
+import statistics
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from parent.models.parent_profile import ParentProfile
+from student.models.driving_sessions import Trip
+from student.models.student_profile import StudentProfile
+from student.services.hours_ledger_service import get_student_ledger
+from student.services.pdf_export_service import generate_driving_hours_pdf, iter_formatted_session_rows
+from student.services.report_template_service import ReportTemplate, get_report_template
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the CPU time of rendering one hours report, with the styles and '
+        'static blocks rebuilt for every report versus reused from the shared template.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('student_id', type=int, help='Student whose report is rendered.')
+        parser.add_argument(
+            '--runs',
+            type=int,
+            default=20,
+            help='Reports rendered per variant (default 20).',
+        )
+        parser.add_argument(
+            '--sessions',
+            type=int,
+            help='Only include the first N approved sessions.',
+        )
+
+    def handle(self, *args, **options):
+        runs = options['runs']
+        if runs < 1:
+            raise CommandError('--runs must be at least 1.')
+
+        try:
+            student = StudentProfile.objects.get(id=options['student_id'])
+        except StudentProfile.DoesNotExist:
+            raise CommandError(f"Student {options['student_id']} does not exist.")
+
+        trip = Trip.objects.filter(student=student).select_related('parent').first()
+        parent_profile = (
+            ParentProfile.objects.select_related('user').get(id=trip.parent_id) if trip
+            else ParentProfile.objects.select_related('user').first()
+        )
+        if parent_profile is None:
+            raise CommandError('No parent profile to sign the report.')
+
+        ledger = get_student_ledger(student)
+        trips = Trip.objects.filter(student=student, is_approved=True, is_active=False).order_by('start_time', 'trip_id')
+        if options['sessions'] is not None:
+            trips = trips[:options['sessions']]
+        # Read and format the rows once up front, so both variants lay out the
+        # same list and the query cost is not part of the comparison
+        rows = list(iter_formatted_session_rows(trips))
+
+        variants = [
+            ('rebuilt per report', ReportTemplate),
+            ('shared template', get_report_template),
+        ]
+        # Warm up imports, fonts and the shared template
+        generate_driving_hours_pdf(student, None, parent_profile, ledger=ledger, template=get_report_template(), session_rows=rows)
+
+        # Alternate the variants and collect garbage between runs so neither
+        # one pays for the other's allocations
+        timings = {label: [] for label, _ in variants}
+        for _ in range(runs):
+            for label, make_template in variants:
+                gc.collect()
+                started = time.process_time()
+                generate_driving_hours_pdf(
+                    student, None, parent_profile, ledger=ledger, template=make_template(), session_rows=rows,
+                )
+                timings[label].append((time.process_time() - started) * 1000)
+
+        results = {}
+        for label, _ in variants:
+            results[label] = statistics.median(timings[label])
+            self.stdout.write(f"{label:>20}: {results[label]:8.2f} ms CPU per report (median)")
+
+        before, after = results['rebuilt per report'], results['shared template']
+        self.stdout.write(self.style.SUCCESS(
+            f"{len(rows)} sessions, {runs} runs: {before - after:.2f} ms ({(before - after) / before:.0%}) saved per report."
+        ))
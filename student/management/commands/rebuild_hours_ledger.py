@@ -0,0 +1,47 @@
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from student.services.hours_ledger_service import rebuild_ledgers, verify_ledgers
+
+
+class Command(BaseCommand):
+    help = 'Rebuild or verify the per-student driving hours ledger from the Trip table.'
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verify',
+            action='store_true',
+            help='Only compare stored ledgers against the Trip table; exit non-zero on any mismatch.',
+        )
+        parser.add_argument(
+            '--student',
+            type=int,
+            action='append',
+            dest='student_ids',
+            help='Limit to this StudentProfile id. May be given more than once.',
+        )
+
+    def handle(self, *args, **options):
+        student_ids = options['student_ids']
+
+        if options['verify']:
+            mismatches = verify_ledgers(student_ids)
+            missing = set()
+            for student_id, field, expected, actual in mismatches:
+                if actual is None:
+                    if student_id not in missing:
+                        missing.add(student_id)
+                        self.stdout.write(f'Student {student_id}: no ledger row')
+                    continue
+                self.stdout.write(f'Student {student_id}: {field} is {actual}, expected {expected}')
+
+            if mismatches:
+                raise CommandError(f'{len(mismatches)} ledger mismatch(es) found.')
+
+            self.stdout.write(self.style.SUCCESS('All ledgers match the Trip table.'))
+            return
+
+        with transaction.atomic():
+            count = rebuild_ledgers(student_ids)
+
+        self.stdout.write(self.style.SUCCESS(f'Rebuilt {count} ledger(s).'))
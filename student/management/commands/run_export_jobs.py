@@ -0,0 +1,48 @@
+from concurrent.futures import ProcessPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+
+from student.models.pdf_export_job import PdfExportJob
+from student.services.export_job_service import requeue_stale_jobs, run_export_job
+from student.services.export_worker import init_worker
+
+
+class Command(BaseCommand):
+    help = (
+        'Render queued PDF export jobs. Jobs left RUNNING by a worker that died '
+        'are put back in the queue first.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--workers',
+            type=int,
+            default=1,
+            help='Worker processes to render jobs in (default 1, in-process).',
+        )
+
+    def handle(self, *args, **options):
+        workers = options['workers']
+        if workers < 1:
+            raise CommandError('--workers must be at least 1.')
+
+        requeued = requeue_stale_jobs()
+        if requeued:
+            self.stdout.write(f"Requeued {requeued} stale job(s).")
+
+        job_ids = list(
+            PdfExportJob.objects.filter(status='PENDING').order_by('created_at').values_list('job_id', flat=True)
+        )
+
+        if workers == 1:
+            statuses = [run_export_job(job_id) for job_id in job_ids]
+        else:
+            # Child processes must not inherit this process's database connection
+            connections.close_all()
+            with ProcessPoolExecutor(max_workers=workers, initializer=init_worker) as executor:
+                statuses = list(executor.map(run_export_job, job_ids))
+
+        self.stdout.write(self.style.SUCCESS(
+            f"Rendered {statuses.count('DONE')} job(s), {statuses.count('FAILED')} failed."
+        ))
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-17 02:46
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0004_studentprofile_photo'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StudentHoursLedger',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('approved_total_minutes', models.IntegerField(default=0)),
+                ('approved_day_minutes', models.IntegerField(default=0)),
+                ('approved_night_minutes', models.IntegerField(default=0)),
+                ('approved_session_count', models.IntegerField(default=0)),
+                ('pending_total_minutes', models.IntegerField(default=0)),
+                ('pending_day_minutes', models.IntegerField(default=0)),
+                ('pending_night_minutes', models.IntegerField(default=0)),
+                ('pending_session_count', models.IntegerField(default=0)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('student', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, related_name='hours_ledger', to='student.studentprofile')),
+            ],
+        ),
+    ]
@@ -0,0 +1,97 @@
+# Generated by Django 6.0 on 2026-10-17 02:48
+
+import calendar
+from datetime import timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.db import migrations, models
+from django.utils import timezone
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+
+# A frozen copy of student.services.night_time_service.split_night_minutes as
+# it stood when this migration was written, so later changes to the service
+# cannot change what this migration does.
+
+def _night_seconds_before(wall_seconds, window_start, window_end):
+    days, remainder = divmod(wall_seconds, SECONDS_PER_DAY)
+    if window_start > window_end:
+        per_day = window_end + (SECONDS_PER_DAY - window_start)
+        partial = min(remainder, window_end) + max(remainder - window_start, 0)
+    else:
+        per_day = window_end - window_start
+        partial = min(max(remainder - window_start, 0), per_day)
+    return days * per_day + partial
+
+
+def _aware(value):
+    return value if timezone.is_aware(value) else timezone.make_aware(value)
+
+
+def _wall_seconds(value):
+    local = timezone.localtime(_aware(value))
+    return calendar.timegm(local.timetuple()), int(local.utcoffset().total_seconds())
+
+
+def split_night_minutes(start_time, end_time):
+    elapsed = _aware(end_time).astimezone(dt_timezone.utc) - _aware(start_time).astimezone(dt_timezone.utc)
+    duration = max(elapsed // timedelta(minutes=1), 0)
+
+    night_start, night_end = settings.NIGHT_START, settings.NIGHT_END
+    window_start = night_start.hour * 3600 + night_start.minute * 60 + night_start.second
+    window_end = night_end.hour * 3600 + night_end.minute * 60 + night_end.second
+    if window_start == window_end:
+        return duration, 0
+
+    start_wall, start_offset = _wall_seconds(start_time)
+    end_wall, end_offset = _wall_seconds(end_time)
+    night_seconds = (
+        _night_seconds_before(end_wall, window_start, window_end)
+        - _night_seconds_before(start_wall, window_start, window_end)
+        - (end_offset - start_offset)
+    )
+    night = min(max(night_seconds // 60, 0), duration)
+    return duration - night, night
+
+
+def split_existing_trips(apps, schema_editor):
+    Trip = apps.get_model('student', 'Trip')
+    StudentHoursLedger = apps.get_model('student', 'StudentHoursLedger')
+
+    batch = []
+    trips = Trip.objects.filter(start_time__isnull=False, end_time__isnull=False).only('start_time', 'end_time')
+    for trip in trips.iterator(chunk_size=1000):
+        trip.day_minutes, trip.night_minutes = split_night_minutes(trip.start_time, trip.end_time)
+        trip.duration = trip.day_minutes + trip.night_minutes
+        trip.is_night = trip.night_minutes > 0
+        batch.append(trip)
+        if len(batch) >= 1000:
+            Trip.objects.bulk_update(batch, ['day_minutes', 'night_minutes', 'duration', 'is_night'])
+            batch = []
+    Trip.objects.bulk_update(batch, ['day_minutes', 'night_minutes', 'duration', 'is_night'])
+
+    # Ledgers were built from the old all-or-nothing night flag; they are
+    # rebuilt from the new columns on next read.
+    StudentHoursLedger.objects.all().delete()
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0005_studenthoursledger'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='trip',
+            name='day_minutes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='trip',
+            name='night_minutes',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(split_existing_trips, migrations.RunPython.noop),
+    ]
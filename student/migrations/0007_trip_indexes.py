@@ -0,0 +1,52 @@
+# Generated by Django 6.0 on 2026-10-17 03:05
+
+from django.db import migrations, models
+
+
+def check_duplicate_active_trips(apps, schema_editor):
+    # The partial unique constraint below allows one running timer per
+    # student/parent. Ending a timer needs its real end time, so duplicates
+    # are listed for someone to end in the app rather than guessed at here.
+    Trip = apps.get_model('student', 'Trip')
+    running = {}
+    for trip in Trip.objects.filter(is_active=True).order_by('start_time').only('student_id', 'parent_id', 'start_time'):
+        running.setdefault((trip.student_id, trip.parent_id), []).append(trip)
+    duplicates = [
+        f"student {student_id}, parent {parent_id}: "
+        + ', '.join(f"{trip.pk} (started {trip.start_time})" for trip in trips)
+        for (student_id, parent_id), trips in running.items() if len(trips) > 1
+    ]
+    if duplicates:
+        raise ValueError(
+            'These students have more than one running trip timer from the same parent. '
+            'End all but one of each and migrate again:\n' + '\n'.join(duplicates)
+        )
+
+
+def allow_duplicate_active_trips(apps, schema_editor):
+    # Nothing to undo: the check changes no rows, and unapplying drops the constraint
+    pass
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parent', '0004_parentinvitation'),
+        ('student', '0006_trip_day_night_minutes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(condition=models.Q(('is_active', False), ('is_approved', True)), fields=['student', 'start_time'], name='trip_student_approved_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['parent', 'start_time'], name='trip_parent_start_idx'),
+        ),
+        migrations.RunPython(check_duplicate_active_trips, allow_duplicate_active_trips),
+        migrations.AddConstraint(
+            model_name='trip',
+            constraint=models.UniqueConstraint(condition=models.Q(('is_active', True)), fields=('student', 'parent'), name='trip_one_active_per_student_parent'),
+        ),
+    ]
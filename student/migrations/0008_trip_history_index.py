@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 03:30
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parent', '0004_parentinvitation'),
+        ('student', '0007_trip_indexes'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(fields=['student', 'start_time', 'trip_id'], name='trip_student_history_idx'),
+        ),
+    ]
@@ -0,0 +1,30 @@
+# Generated by Django 6.0 on 2026-10-17 03:52
+
+from django.db import migrations, models
+from django.db.models import F
+
+
+def stamp_existing_ledgers(apps, schema_editor):
+    StudentHoursLedger = apps.get_model('student', 'StudentHoursLedger')
+    StudentHoursLedger.objects.filter(approved_changed_at__isnull=True).update(approved_changed_at=F('updated_at'))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0008_trip_history_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studenthoursledger',
+            name='approved_changed_at',
+            field=models.DateTimeField(blank=True, null=True),
+        ),
+        migrations.AddField(
+            model_name='studenthoursledger',
+            name='approved_version',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.RunPython(stamp_existing_ledgers, migrations.RunPython.noop),
+    ]
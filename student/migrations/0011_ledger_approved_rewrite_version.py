@@ -0,0 +1,18 @@
+# Generated by Django 6.0 on 2026-10-17 09:14
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0010_pdfexportjob'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='studenthoursledger',
+            name='approved_rewrite_version',
+            field=models.IntegerField(default=0),
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 6.0 on 2026-10-17 10:02
+
+import core.storage
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('student', '0012_profile_photo_variants'),
+    ]
+
+    operations = [
+        migrations.AlterField(
+            model_name='studentprofile',
+            name='photo',
+            field=models.ImageField(blank=True, null=True, storage=core.storage.get_photo_storage, upload_to='profile_photos/students/'),
+        ),
+    ]
@@ -0,0 +1,22 @@
+# Generated by Django 6.0 on 2026-10-17 10:40
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('parent', '0006_profile_photo_storage'),
+        ('student', '0013_profile_photo_storage'),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='trip',
+            name='trip_student_approved_idx',
+        ),
+        migrations.AddIndex(
+            model_name='trip',
+            index=models.Index(condition=models.Q(('is_active', False), ('is_approved', True)), fields=['student', 'start_time', 'trip_id'], name='trip_student_approved_idx'),
+        ),
+    ]
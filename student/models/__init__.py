@@ -1 +1,3 @@
-from .student_profile import StudentProfile
\ No newline at end of file
+from .student_profile import StudentProfile
+from .student_hours_ledger import StudentHoursLedger
+from .pdf_export_job import PdfExportJob
@@ -1,5 +1,5 @@
 import uuid
-from django.db import models
+from django.db import models, transaction
 
 
 class Trip(models.Model):
@@ -14,18 +14,47 @@ class Trip(models.Model):
     is_active = models.BooleanField(default=False)
 
     duration = models.IntegerField(default=0)
+    day_minutes = models.IntegerField(default=0)
+    night_minutes = models.IntegerField(default=0)
 
     # This is not currently used.
     gps_data = models.JSONField(blank=True, null=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
+    class Meta:
+        indexes = [
+            # Student progress pages and the PDF export: approved, completed trips ordered by start time,
+            # trip_id breaking ties.
+            # Boolean filters are compiled to bare column tests, which SQLite can match against a
+            # partial index condition but not against boolean columns inside a composite index.
+            models.Index(
+                fields=['student', 'start_time', 'trip_id'],
+                condition=models.Q(is_approved=True, is_active=False),
+                name='trip_student_approved_idx',
+            ),
+            # Student trip history: keyset pages ordered by (start_time, trip_id)
+            models.Index(fields=['student', 'start_time', 'trip_id'], name='trip_student_history_idx'),
+            # Parent dashboard: most recent trips logged by a parent
+            models.Index(fields=['parent', 'start_time'], name='trip_parent_start_idx'),
+        ]
+        constraints = [
+            # A parent can only have one running timer per student
+            models.UniqueConstraint(
+                fields=['student', 'parent'],
+                condition=models.Q(is_active=True),
+                name='trip_one_active_per_student_parent',
+            ),
+        ]
+
     def __str__(self):
         return f"{self.trip_id} Duration: {self.duration}"
 
     def save(self, *args, **kwargs):
         if self.start_time and self.end_time:
-            from student.services.driving_session_service import determine_night
-            is_night = determine_night(self.start_time, self.end_time)
-            self.is_night = is_night
-            self.duration = int((self.end_time - self.start_time).total_seconds() / 60)
-        super().save(*args, **kwargs)
\ No newline at end of file
+            from student.services.night_time_service import split_night_minutes
+            self.day_minutes, self.night_minutes = split_night_minutes(self.start_time, self.end_time)
+            self.duration = self.day_minutes + self.night_minutes
+            self.is_night = self.night_minutes > 0
+        # The hours ledger is updated from the save signals, keep both in one transaction
+        with transaction.atomic():
+            super().save(*args, **kwargs)
\ No newline at end of file
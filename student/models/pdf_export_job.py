@@ -0,0 +1,47 @@
+import uuid
+from django.db import models
+
+
+class PdfExportJob(models.Model):
+    '''
+    A driving hours PDF rendered in the background.
+
+    Large reports are queued here instead of being built in the request. The
+    rendered file lives in the report cache under the job's fingerprint.
+    '''
+    STATUS_CHOICES = [
+        ('PENDING', 'Pending'),
+        ('RUNNING', 'Running'),
+        ('DONE', 'Done'),
+        ('FAILED', 'Failed'),
+    ]
+
+    job_id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    student = models.ForeignKey('student.StudentProfile', on_delete=models.CASCADE, related_name='export_jobs')
+    requested_by = models.ForeignKey('parent.ParentProfile', on_delete=models.CASCADE, related_name='export_jobs')
+
+    # Report cache key of the rendered PDF
+    fingerprint = models.CharField(max_length=64)
+
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='PENDING')
+    error = models.TextField(blank=True)
+
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(blank=True, null=True)
+    finished_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [
+            # Worker queue: oldest jobs in a given status
+            models.Index(fields=['status', 'created_at'], name='pdfexportjob_status_idx'),
+            # Reusing a job for an identical report
+            models.Index(fields=['requested_by', 'fingerprint'], name='pdfexportjob_fingerprint_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.student_id} export {self.status}"
+
+    @property
+    def is_finished(self):
+        return self.status in ('DONE', 'FAILED')
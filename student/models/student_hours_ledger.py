@@ -0,0 +1,47 @@
+from django.db import models
+
+
+class StudentHoursLedger(models.Model):
+    '''
+    Running totals of a student's driving minutes.
+
+    Kept up to date by the Trip save/delete signals so progress displays
+    are a single row read instead of a sum over the whole driving log.
+    Only completed (non-active) trips are counted. Approved trips are the
+    official hours; pending trips are completed but not yet approved.
+    '''
+    student = models.OneToOneField('student.StudentProfile', on_delete=models.CASCADE, related_name='hours_ledger')
+
+    approved_total_minutes = models.IntegerField(default=0)
+    approved_day_minutes = models.IntegerField(default=0)
+    approved_night_minutes = models.IntegerField(default=0)
+    approved_session_count = models.IntegerField(default=0)
+
+    pending_total_minutes = models.IntegerField(default=0)
+    pending_day_minutes = models.IntegerField(default=0)
+    pending_night_minutes = models.IntegerField(default=0)
+    pending_session_count = models.IntegerField(default=0)
+
+    # Bumped whenever the approved bucket changes; identifies a version of the official hours
+    approved_version = models.IntegerField(default=0)
+    approved_changed_at = models.DateTimeField(blank=True, null=True)
+    # Bumped when an approved trip is edited or removed, but not when one is added;
+    # while it holds, earlier reports only miss sessions at the end of the log
+    approved_rewrite_version = models.IntegerField(default=0)
+
+    updated_at = models.DateTimeField(auto_now=True)
+
+    def __str__(self):
+        return f"{self.student_id} Approved: {self.approved_total_minutes} min"
+
+    @property
+    def total_hours(self):
+        return round(self.approved_total_minutes / 60, 2)
+
+    @property
+    def day_hours(self):
+        return round(self.approved_day_minutes / 60, 2)
+
+    @property
+    def night_hours(self):
+        return round(self.approved_night_minutes / 60, 2)
@@ -1,7 +1,9 @@
 from django.db import models
 from django.conf import settings
+from core.models.profile_photo import ProfilePhotoMixin
+from core.storage import get_photo_storage
 
-class StudentProfile(models.Model):
+class StudentProfile(ProfilePhotoMixin, models.Model):
     # currently the student wont be able to login. only the parent can see the students.
     # at a later time the student will be able to create an AccountUser from an invite and claim.
     # their profile.
@@ -9,7 +11,8 @@ class StudentProfile(models.Model):
     first_name = models.CharField(max_length=100)
     last_name = models.CharField(max_length=100)
     permit_number = models.CharField(max_length=20, blank=True)
-    photo = models.ImageField(upload_to="profile_photos/students/", blank=True, null=True)
+    photo = models.ImageField(upload_to="profile_photos/students/", storage=get_photo_storage, blank=True, null=True)
+    photo_variants = models.JSONField(default=dict, blank=True)
     created_at = models.DateTimeField(auto_now_add=True)
 
     drivers_ed_date_completed = models.DateTimeField(blank=True, null=True)
@@ -18,10 +21,4 @@ class StudentProfile(models.Model):
     road_test_passed = models.BooleanField(default=False)
 
     def __str__(self):
-        return f"{self.first_name} {self.last_name} - Permit Number: {self.permit_number}"
-
-    def get_photo_url(self):
-        ''' Returns the photo url or default image '''
-        if self.photo:
-            return self.photo.url
-        return '/static/images/default_user.png'
\ No newline at end of file
+        return f"{self.first_name} {self.last_name} - Permit Number: {self.permit_number}"
\ No newline at end of file
@@ -0,0 +1,125 @@
+"""
+Service for exporting the hours reports of several students as one ZIP
+
+Reports are rendered in parallel by the export worker pool and the archive
+is written as a stream, each PDF added as soon as it is ready, so the
+download starts before the last report is rendered.
+"""
+import logging
+import zipfile
+from concurrent.futures import as_completed
+
+from django.utils import timezone
+
+from parent.models.parent_profile import ParentProfile
+from student.models.student_profile import StudentProfile
+from student.services.export_job_service import get_executor
+from student.services.hours_ledger_service import get_student_ledger
+from student.services.pdf_export_service import render_cached_report, report_filename
+from student.services.report_cache_service import get_cached_report, report_fingerprint
+
+logger = logging.getLogger(__name__)
+
+COPY_BLOCK_SIZE = 64 * 1024
+
+
+class _ZipStream:
+    '''
+    Write-only file object that hands out what zipfile wrote so far.
+
+    Having no tell() or seek() makes zipfile write a streaming archive
+    (sizes in data descriptors after each file) instead of seeking back.
+    '''
+
+    def __init__(self):
+        self._chunks = []
+
+    def write(self, data):
+        self._chunks.append(bytes(data))
+        return len(data)
+
+    def flush(self):
+        pass
+
+    def take(self):
+        data = b''.join(self._chunks)
+        self._chunks = []
+        return data
+
+
+def render_student_report(student_id, parent_profile_id):
+    """
+    Render the hours report of one student into the report cache, unless it
+    is already there. Runs in a worker process.
+
+    Returns:
+        tuple: (student_id, file name, path of the cached PDF), or
+               (student_id, None, None) when the student has no approved sessions
+    """
+    student = StudentProfile.objects.get(id=student_id)
+    parent_profile = ParentProfile.objects.select_related('user').get(id=parent_profile_id)
+    ledger = get_student_ledger(student)
+    if not ledger.approved_session_count:
+        return student_id, None, None
+
+    fingerprint = report_fingerprint(student, parent_profile, ledger)
+    path = get_cached_report(fingerprint) or render_cached_report(student, parent_profile, ledger, fingerprint)
+    return student_id, report_filename(student), str(path)
+
+
+def iter_reports_zip(student_ids, parent_profile):
+    """
+    Stream a ZIP archive of the hours reports of several students
+
+    Reports are added in the order they finish rendering. Students without
+    approved sessions are left out; reports that fail to render are logged
+    and listed in an errors.txt at the end of the archive instead of
+    aborting the download.
+
+    Args:
+        student_ids: ids of students the parent may access
+        parent_profile: ParentProfile of the parent generating the reports
+
+    Yields:
+        bytes: consecutive pieces of the archive
+    """
+    executor = get_executor()
+    futures = {
+        executor.submit(render_student_report, student_id, parent_profile.id): student_id
+        for student_id in student_ids
+    }
+
+    stream = _ZipStream()
+    names = set()
+    errors = []
+    date_time = timezone.localtime().timetuple()[:6]
+
+    with zipfile.ZipFile(stream, 'w', compression=zipfile.ZIP_STORED) as archive:
+        for future in as_completed(futures):
+            try:
+                student_id, filename, path = future.result()
+                if path is None:
+                    continue
+                pdf = open(path, 'rb')
+            except Exception:
+                logger.exception("Could not export the report of student %s", futures[future])
+                errors.append(f"Student {futures[future]}: the report could not be generated. Please try again later.")
+                continue
+
+            if filename in names:
+                # Two students with the same name
+                filename = filename.replace('.pdf', f'_{student_id}.pdf')
+            names.add(filename)
+
+            # Copied from the cache file a block at a time. PDF page streams are
+            # already compressed; storing avoids paying for deflate twice
+            with pdf, archive.open(zipfile.ZipInfo(filename, date_time), 'w') as entry:
+                for block in iter(lambda: pdf.read(COPY_BLOCK_SIZE), b''):
+                    entry.write(block)
+                    yield stream.take()
+            yield stream.take()
+
+        if errors:
+            archive.writestr(zipfile.ZipInfo('errors.txt', date_time), '\n'.join(errors) + '\n')
+
+    yield stream.take()
@@ -0,0 +1,179 @@
+"""
+Service for rendering driving hours PDFs in background processes
+
+Jobs are rows in the PdfExportJob table, so the queue needs nothing beyond
+the database. Each web process keeps a small pool of worker processes that
+have Django set up and reportlab imported, and hands them job ids once the
+enqueuing transaction commits. Finished PDFs go into the report cache.
+"""
+import logging
+import multiprocessing
+import threading
+from concurrent.futures import ProcessPoolExecutor
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+
+from parent.models.parent_profile import ParentProfile
+from student.models.pdf_export_job import PdfExportJob
+from student.models.student_profile import StudentProfile
+from student.services.export_worker import init_worker
+from student.services.hours_ledger_service import get_student_ledger
+from student.services.report_cache_service import report_fingerprint
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+
+
+def should_render_in_background(ledger):
+    """
+    Reports with more approved sessions than EXPORT_JOB_TRIP_THRESHOLD are
+    rendered by a background job instead of in the request
+    """
+    return ledger.approved_session_count > getattr(settings, 'EXPORT_JOB_TRIP_THRESHOLD', 500)
+
+
+def get_executor():
+    """
+    The process pool of this web process, started on first use
+    """
+    global _executor
+    with _executor_lock:
+        if _executor is None:
+            _executor = ProcessPoolExecutor(
+                max_workers=getattr(settings, 'EXPORT_JOB_WORKERS', 2),
+                # Forking a threaded web server is unsafe; start clean interpreters instead
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=init_worker,
+            )
+        return _executor
+
+
+def _reset_executor(executor):
+    global _executor
+    with _executor_lock:
+        if _executor is executor:
+            _executor = None
+    executor.shutdown(wait=False, cancel_futures=True)
+
+
+def submit_job(job_id):
+    """
+    Hand a job to the process pool
+
+    A job whose worker dies stays RUNNING until run_export_jobs requeues it.
+    """
+    executor = get_executor()
+    try:
+        future = executor.submit(run_export_job, job_id)
+    except RuntimeError:
+        # The pool is broken (a worker was killed); start a new one
+        _reset_executor(executor)
+        future = get_executor().submit(run_export_job, job_id)
+
+    def _log_failure(done):
+        if done.exception() is not None:
+            logger.error("Export job %s crashed", job_id, exc_info=done.exception())
+
+    future.add_done_callback(_log_failure)
+
+
+def enqueue_export(student, parent_profile, fingerprint):
+    """
+    Queue a PDF export, reusing an identical job that is already queued
+
+    Args:
+        student: StudentProfile object
+        parent_profile: ParentProfile of the parent requesting the report
+        fingerprint: report cache key of the report
+
+    Returns:
+        PdfExportJob
+    """
+    job = PdfExportJob.objects.filter(
+        requested_by=parent_profile,
+        fingerprint=fingerprint,
+        status__in=['PENDING', 'RUNNING'],
+    ).first()
+    if job is None:
+        job = PdfExportJob.objects.create(student=student, requested_by=parent_profile, fingerprint=fingerprint)
+
+    if job.status == 'PENDING':
+        # Also resubmits a job whose web process went away before a worker
+        # picked it up; only one worker can claim it
+        transaction.on_commit(lambda: submit_job(job.job_id))
+    return job
+
+
+def requeue_export(job):
+    """
+    Render a finished job again, e.g. after its PDF was evicted from the cache
+    """
+    PdfExportJob.objects.filter(job_id=job.job_id).update(
+        status='PENDING', error='', started_at=None, finished_at=None,
+    )
+    job.status = 'PENDING'
+    transaction.on_commit(lambda: submit_job(job.job_id))
+
+
+def _claim_job(job_id):
+    # Only one worker wins the PENDING -> RUNNING transition
+    return PdfExportJob.objects.filter(job_id=job_id, status='PENDING').update(
+        status='RUNNING', started_at=timezone.now(),
+    ) == 1
+
+
+def run_export_job(job_id):
+    """
+    Render one queued export. Runs in a worker process.
+
+    The fingerprint is recomputed from the current data, so a job always
+    produces the report as it is when it runs.
+
+    Returns:
+        str: the job's final status
+    """
+    from student.services.pdf_export_service import render_cached_report
+
+    if not _claim_job(job_id):
+        return None
+
+    job = PdfExportJob.objects.get(job_id=job_id)
+    try:
+        student = StudentProfile.objects.get(id=job.student_id)
+        parent_profile = ParentProfile.objects.select_related('user').get(id=job.requested_by_id)
+        ledger = get_student_ledger(student)
+
+        fingerprint = report_fingerprint(student, parent_profile, ledger)
+        render_cached_report(student, parent_profile, ledger, fingerprint)
+    except Exception as e:
+        logger.exception("Export job %s failed", job_id)
+        status, changes = 'FAILED', {'error': str(e)}
+    else:
+        status, changes = 'DONE', {'fingerprint': fingerprint}
+
+    PdfExportJob.objects.filter(job_id=job_id).update(status=status, finished_at=timezone.now(), **changes)
+    return status
+
+
+def requeue_stale_jobs(older_than=None):
+    """
+    Put RUNNING jobs whose worker died back in the queue
+
+    Args:
+        older_than: timedelta a job may run before it counts as stale
+                    (defaults to settings.EXPORT_JOB_STALE_SECONDS)
+
+    Returns:
+        int: number of jobs requeued
+    """
+    if older_than is None:
+        older_than = timedelta(seconds=getattr(settings, 'EXPORT_JOB_STALE_SECONDS', 600))
+    return PdfExportJob.objects.filter(
+        status='RUNNING',
+        started_at__lt=timezone.now() - older_than,
+    ).update(status='PENDING', started_at=None)
@@ -0,0 +1,14 @@
+"""
+Start-up of background PDF export worker processes
+
+Kept apart from export_job_service: a spawned worker imports this module
+before Django is set up, so it must not import any models.
+"""
+
+
+def init_worker():
+    import django
+    django.setup()
+
+    # Pay for the reportlab imports and font setup once per worker, not per job
+    import student.services.pdf_export_service  # noqa: F401
@@ -0,0 +1,239 @@
+"""
+Service for keeping StudentHoursLedger rows in step with the Trip table
+"""
+from collections import defaultdict
+
+from django.db.models import Count, F, Sum
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from student.models.driving_sessions import Trip
+from student.models.student_hours_ledger import StudentHoursLedger
+from student.models.student_profile import StudentProfile
+
+LEDGER_FIELDS = [
+    'approved_total_minutes',
+    'approved_day_minutes',
+    'approved_night_minutes',
+    'approved_session_count',
+    'pending_total_minutes',
+    'pending_day_minutes',
+    'pending_night_minutes',
+    'pending_session_count',
+]
+
+APPROVED_FIELDS = [field for field in LEDGER_FIELDS if field.startswith('approved_')]
+
+# Trip columns that decide how a trip counts toward the ledger or reads in the hours report
+TRIP_LEDGER_COLUMNS = [
+    'student_id', 'is_active', 'is_approved', 'start_time', 'end_time', 'duration', 'day_minutes', 'night_minutes',
+    'parent_id',
+]
+
+
+def trip_contribution(values):
+    """
+    Work out what a single trip adds to its student's ledger
+
+    Args:
+        values: dict of TRIP_LEDGER_COLUMNS, or None for a trip that does not exist
+
+    Returns:
+        dict: ledger field -> amount (empty when the trip does not count)
+    """
+    if not values or values['is_active'] or not values['end_time']:
+        return {}
+
+    bucket = 'approved' if values['is_approved'] else 'pending'
+    return {
+        f'{bucket}_total_minutes': values['duration'] or 0,
+        f'{bucket}_day_minutes': values['day_minutes'] or 0,
+        f'{bucket}_night_minutes': values['night_minutes'] or 0,
+        f'{bucket}_session_count': 1,
+    }
+
+
+def _trip_values(trip):
+    return {column: getattr(trip, column) for column in TRIP_LEDGER_COLUMNS}
+
+
+def apply_trip_change(previous, current):
+    """
+    Move a trip's contribution from its previous state to its current state.
+
+    Ledgers are adjusted in place with F() expressions so concurrent writers
+    don't lose updates. Any change to the approved bucket also bumps
+    approved_version, and editing or removing an approved trip bumps
+    approved_rewrite_version. A student without a ledger row is skipped; the
+    row is rebuilt from the Trip table the next time it is read.
+
+    Args:
+        previous: dict of TRIP_LEDGER_COLUMNS before the change, or None
+        current: dict of TRIP_LEDGER_COLUMNS after the change, or None
+    """
+    deltas = defaultdict(lambda: defaultdict(int))
+
+    if previous:
+        for field, amount in trip_contribution(previous).items():
+            deltas[previous['student_id']][field] -= amount
+    if current:
+        for field, amount in trip_contribution(current).items():
+            deltas[current['student_id']][field] += amount
+
+    # An approved trip that changed in any way, even one that leaves the totals
+    # alone, reads differently in the session log of the hours report
+    rewritten = bool(previous) and 'approved_session_count' in trip_contribution(previous) and previous != current
+
+    for student_id, delta in deltas.items():
+        changes = {field: F(field) + amount for field, amount in delta.items() if amount}
+        rewrites = rewritten and student_id == previous['student_id']
+        if student_id is None or not (changes or rewrites):
+            continue
+        if rewrites or any(field.startswith('approved_') for field in changes):
+            changes['approved_version'] = F('approved_version') + 1
+            changes['approved_changed_at'] = timezone.now()
+        if rewrites:
+            changes['approved_rewrite_version'] = F('approved_rewrite_version') + 1
+        StudentHoursLedger.objects.filter(student_id=student_id).update(**changes)
+
+
+def compute_ledger_totals(student_ids=None):
+    """
+    Aggregate ledger totals straight from the Trip table
+
+    Args:
+        student_ids: iterable of StudentProfile ids, or None for every student
+
+    Returns:
+        dict: student id -> {ledger field: value}
+    """
+    students = StudentProfile.objects.all()
+    trips = Trip.objects.filter(is_active=False, end_time__isnull=False)
+    if student_ids is not None:
+        students = students.filter(id__in=student_ids)
+        trips = trips.filter(student_id__in=student_ids)
+
+    totals = {student_id: dict.fromkeys(LEDGER_FIELDS, 0) for student_id in students.values_list('id', flat=True)}
+
+    rows = trips.values('student_id', 'is_approved').annotate(
+        total=Sum('duration'),
+        day=Sum('day_minutes'),
+        night=Sum('night_minutes'),
+        sessions=Count('pk'),
+    )
+
+    for row in rows:
+        if row['student_id'] not in totals:
+            continue
+        bucket = 'approved' if row['is_approved'] else 'pending'
+        totals[row['student_id']].update({
+            f'{bucket}_total_minutes': row['total'] or 0,
+            f'{bucket}_day_minutes': row['day'] or 0,
+            f'{bucket}_night_minutes': row['night'] or 0,
+            f'{bucket}_session_count': row['sessions'],
+        })
+
+    return totals
+
+
+def rebuild_ledgers(student_ids=None):
+    """
+    Recompute ledgers from the Trip table and write them back
+
+    Args:
+        student_ids: iterable of StudentProfile ids, or None for every student
+
+    Returns:
+        int: number of ledgers written
+    """
+    totals = compute_ledger_totals(student_ids)
+
+    existing = {
+        ledger.student_id: ledger
+        for ledger in StudentHoursLedger.objects.filter(student_id__in=totals.keys())
+    }
+
+    now = timezone.now()
+    to_update = []
+    to_create = []
+    for student_id, values in totals.items():
+        ledger = existing.get(student_id) or StudentHoursLedger(student_id=student_id, approved_changed_at=now)
+        ledger.updated_at = now
+        if any(getattr(ledger, field) != values[field] for field in APPROVED_FIELDS):
+            ledger.approved_version += 1
+            ledger.approved_rewrite_version += 1
+            ledger.approved_changed_at = now
+        for field, value in values.items():
+            setattr(ledger, field, value)
+        (to_update if student_id in existing else to_create).append(ledger)
+
+    StudentHoursLedger.objects.bulk_update(
+        to_update,
+        LEDGER_FIELDS + ['approved_version', 'approved_rewrite_version', 'approved_changed_at', 'updated_at'],
+        batch_size=500,
+    )
+    StudentHoursLedger.objects.bulk_create(to_create, batch_size=500, ignore_conflicts=True)
+
+    return len(totals)
+
+
+def verify_ledgers(student_ids=None):
+    """
+    Compare stored ledgers against the Trip table
+
+    A student without a ledger row is reported with an actual value of
+    None for every field.
+
+    Returns:
+        list: (student_id, field, expected, actual) for every mismatch
+    """
+    totals = compute_ledger_totals(student_ids)
+    stored = {
+        row['student_id']: row
+        for row in StudentHoursLedger.objects.filter(student_id__in=totals.keys()).values('student_id', *LEDGER_FIELDS)
+    }
+
+    mismatches = []
+    for student_id, expected in totals.items():
+        actual = stored.get(student_id, dict.fromkeys(LEDGER_FIELDS))
+        for field in LEDGER_FIELDS:
+            if actual[field] != expected[field]:
+                mismatches.append((student_id, field, expected[field], actual[field]))
+
+    return mismatches
+
+
+def get_student_ledger(student):
+    """
+    Return the student's ledger, rebuilding it from the Trip table if missing
+    """
+    try:
+        return StudentHoursLedger.objects.get(student=student)
+    except StudentHoursLedger.DoesNotExist:
+        rebuild_ledgers([student.id])
+        return StudentHoursLedger.objects.get(student=student)
+
+
+# ============================================
+# SIGNALS
+# ============================================
+
+@receiver(pre_save, sender=Trip)
+def remember_trip_state(sender, instance, raw=False, **kwargs):
+    if raw or instance._state.adding:
+        instance._ledger_previous = None
+        return
+    instance._ledger_previous = Trip.objects.filter(pk=instance.pk).values(*TRIP_LEDGER_COLUMNS).first()
+
+
+@receiver(post_save, sender=Trip)
+def update_ledger_on_save(sender, instance, created, raw=False, **kwargs):
+    if raw:
+        return
+    apply_trip_change(getattr(instance, '_ledger_previous', None), _trip_values(instance))
+
+
+@receiver(post_delete, sender=Trip)
+def update_ledger_on_delete(sender, instance, **kwargs):
+    apply_trip_change(_trip_values(instance), None)
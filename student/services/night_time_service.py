@@ -0,0 +1,196 @@
+"""
+Service for splitting driving time into day and night minutes
+
+Night is the window from settings.NIGHT_START to settings.NIGHT_END in the
+current time zone. When NIGHT_END is earlier than NIGHT_START the window
+wraps past midnight (the default 8:00 PM - 5:00 AM).
+
+Both the single-trip and the batch functions use the same model: count the
+night seconds that fall before a local wall-clock instant, and take the
+difference between the end and the start of the trip. Daylight saving
+changes happen at 2:00 AM, inside the night window, so the hour gained or
+lost on the wall clock is counted as night. Night minutes are capped at the
+trip duration so day + night always equals the duration.
+"""
+import calendar
+from datetime import datetime, timedelta, timezone as dt_timezone
+
+from django.conf import settings
+from django.utils import timezone
+
+SECONDS_PER_DAY = 24 * 60 * 60
+
+# UTC offsets are looked up per 15-minute bucket in the batch path, which
+# lines up with every real-world DST transition.
+OFFSET_BUCKET_SECONDS = 15 * 60
+
+EPOCH = datetime(1970, 1, 1, tzinfo=dt_timezone.utc)
+
+
+def _night_window():
+    """
+    Return the night window as seconds after local midnight
+    """
+    night_start = settings.NIGHT_START
+    night_end = settings.NIGHT_END
+    start = night_start.hour * 3600 + night_start.minute * 60 + night_start.second
+    end = night_end.hour * 3600 + night_end.minute * 60 + night_end.second
+    return start, end
+
+
+def _night_seconds_before(wall_seconds, window_start, window_end):
+    """
+    Night seconds between the epoch and a local wall-clock instant
+    """
+    days, remainder = divmod(wall_seconds, SECONDS_PER_DAY)
+
+    if window_start > window_end:
+        # Window wraps midnight: [00:00, end) and [start, 24:00)
+        per_day = window_end + (SECONDS_PER_DAY - window_start)
+        partial = min(remainder, window_end) + max(remainder - window_start, 0)
+    else:
+        per_day = window_end - window_start
+        partial = min(max(remainder - window_start, 0), per_day)
+
+    return days * per_day + partial
+
+
+def _aware(value):
+    return value if timezone.is_aware(value) else timezone.make_aware(value)
+
+
+def _wall_seconds(value):
+    """
+    Seconds since the epoch on the local wall clock, and the UTC offset used
+    """
+    local = timezone.localtime(_aware(value))
+    return calendar.timegm(local.timetuple()), int(local.utcoffset().total_seconds())
+
+
+def split_night_minutes(start_time, end_time):
+    """
+    Split a trip into day and night minutes
+
+    Args:
+        start_time: datetime the trip started
+        end_time: datetime the trip ended
+
+    Returns:
+        tuple: (day_minutes, night_minutes). Their sum is the trip duration
+               in whole minutes.
+    """
+    # Subtract in UTC; aware datetimes sharing a tzinfo subtract as wall time
+    elapsed = _aware(end_time).astimezone(dt_timezone.utc) - _aware(start_time).astimezone(dt_timezone.utc)
+    duration = max(elapsed // timedelta(minutes=1), 0)
+
+    window_start, window_end = _night_window()
+    if window_start == window_end:
+        return duration, 0
+
+    start_wall, start_offset = _wall_seconds(start_time)
+    end_wall, end_offset = _wall_seconds(end_time)
+    night_seconds = (
+        _night_seconds_before(end_wall, window_start, window_end)
+        - _night_seconds_before(start_wall, window_start, window_end)
+        - (end_offset - start_offset)
+    )
+    night = min(max(night_seconds // 60, 0), duration)
+
+    return duration - night, night
+
+
+# ============================================
+# BATCH (NUMPY) API
+# ============================================
+
+def _epoch_microseconds(values):
+    """
+    Convert datetimes to an int64 array of UTC epoch microseconds.
+
+    datetime64 and integer (epoch seconds) arrays are converted without a
+    Python loop. Sequences of datetime objects are accepted for convenience.
+    """
+    import numpy as np
+
+    array = np.asarray(values)
+    if array.dtype.kind == 'M':
+        return array.astype('datetime64[us]').astype(np.int64)
+    if array.dtype.kind in 'iu':
+        return array.astype(np.int64) * 1_000_000
+    return np.fromiter(
+        ((_aware(value) - EPOCH) // timedelta(microseconds=1) for value in array),
+        dtype=np.int64,
+        count=len(array),
+    )
+
+
+def _utc_offsets(epoch_seconds):
+    """
+    UTC offset in seconds of the current time zone for each instant
+    """
+    import numpy as np
+
+    tz = timezone.get_current_timezone()
+    buckets, inverse = np.unique(epoch_seconds // OFFSET_BUCKET_SECONDS, return_inverse=True)
+    offsets = np.fromiter(
+        (datetime.fromtimestamp(int(bucket) * OFFSET_BUCKET_SECONDS, dt_timezone.utc)
+         .astimezone(tz).utcoffset().total_seconds() for bucket in buckets),
+        dtype=np.int64,
+        count=len(buckets),
+    )
+    return offsets[inverse.reshape(-1)]
+
+
+def _night_seconds_before_array(wall_seconds, window_start, window_end):
+    import numpy as np
+
+    days, remainder = np.divmod(wall_seconds, SECONDS_PER_DAY)
+
+    if window_start > window_end:
+        per_day = window_end + (SECONDS_PER_DAY - window_start)
+        partial = np.minimum(remainder, window_end) + np.maximum(remainder - window_start, 0)
+    else:
+        per_day = window_end - window_start
+        partial = np.clip(remainder - window_start, 0, per_day)
+
+    return days * per_day + partial
+
+
+def split_night_minutes_batch(start_times, end_times):
+    """
+    Split many trips into day and night minutes in one vectorized pass
+
+    Args:
+        start_times: array-like of trip starts. numpy datetime64 (UTC) or
+                     integer epoch seconds avoid any per-row Python work;
+                     datetime objects are also accepted.
+        end_times: array-like of trip ends, same length and form
+
+    Returns:
+        tuple: (day_minutes, night_minutes) as int64 numpy arrays
+    """
+    import numpy as np
+
+    starts_us = _epoch_microseconds(start_times)
+    ends_us = _epoch_microseconds(end_times)
+    if starts_us.shape != ends_us.shape:
+        raise ValueError("start_times and end_times must have the same length")
+
+    duration = np.maximum((ends_us - starts_us) // 60_000_000, 0)
+    starts = starts_us // 1_000_000
+    ends = ends_us // 1_000_000
+
+    window_start, window_end = _night_window()
+    if window_start == window_end or not len(starts):
+        return duration, np.zeros_like(duration)
+
+    start_offsets = _utc_offsets(starts)
+    end_offsets = _utc_offsets(ends)
+    night_seconds = (
+        _night_seconds_before_array(ends + end_offsets, window_start, window_end)
+        - _night_seconds_before_array(starts + start_offsets, window_start, window_end)
+        - (end_offsets - start_offsets)
+    )
+    night = np.minimum(np.maximum(night_seconds // 60, 0), duration)
+
+    return duration - night, night
@@ -1,136 +1,184 @@
 """
 Service for generating PDF reports of student driving hours
 """
-from reportlab.lib.pagesizes import letter
-from reportlab.lib.styles import getSampleStyleSheet, ParagraphStyle
+import logging
+from copy import copy
+from datetime import datetime
+from itertools import chain
+
 from reportlab.lib.units import inch
-from reportlab.platypus import SimpleDocTemplate, Table, TableStyle, Paragraph, Spacer
-from reportlab.lib import colors
-from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.platypus import SimpleDocTemplate, Table, Paragraph, Spacer
 from io import BytesIO
 from django.utils import timezone
+from student.models.driving_sessions import Trip
+from student.services.hours_ledger_service import get_student_ledger
+from student.services.report_cache_service import (
+    get_cached_report,
+    get_report_manifest,
+    report_approvers,
+    report_as_of,
+    report_path,
+    save_report_manifest,
+    write_report,
+)
+from student.services.report_template_service import PAGE_MARGIN, PAGE_SIZE, PagedTable, get_report_template
+from student.services.state_form_service import form_field_values, get_state_form
+
+logger = logging.getLogger(__name__)
+
+SESSION_ROW_FIELDS = (
+    'start_time',
+    'end_time',
+    'duration',
+    'is_night',
+    'parent__user__first_name',
+    'parent__user__last_name',
+    'parent__user__email',
+)
+
+
+def report_filename(student):
+    return f"driving_hours_{student.first_name}_{student.last_name}.pdf"
+
+
+def iter_session_rows(trips, chunk_size=500):
+    """
+    Stream the session log rows of a trip queryset
 
+    The parent's name is joined into the same query and rows are fetched in
+    chunks with iterator(), so memory does not grow with the log and the
+    query count stays constant.
 
-def generate_driving_hours_pdf(student, trips, parent_profile):
+    Args:
+        trips: QuerySet of Trip objects, already filtered and ordered
+        chunk_size: rows fetched from the database at a time
+
+    Yields:
+        tuple: (start_time, end_time, duration, is_night, approver name) with
+               times in the current time zone
+    """
+    rows = trips.values_list(*SESSION_ROW_FIELDS).iterator(chunk_size=chunk_size)
+    for start_time, end_time, duration, is_night, first_name, last_name, email in rows:
+        approver = f"{first_name} {last_name}".strip() or email
+        yield (
+            timezone.localtime(start_time),
+            timezone.localtime(end_time) if end_time else None,
+            duration,
+            is_night,
+            approver,
+        )
+
+
+def iter_formatted_session_rows(trips):
+    """
+    Session log rows as the text printed in a report
+
+    Yields:
+        tuple: (date, start time, end time, duration, type, approver)
+    """
+    for start_time, end_time, duration, is_night, approver in iter_session_rows(trips):
+        yield (
+            start_time.strftime('%m/%d/%Y'),
+            start_time.strftime('%I:%M %p'),
+            end_time.strftime('%I:%M %p') if end_time else 'N/A',
+            str(duration),
+            'Night' if is_night else 'Day',
+            approver,
+        )
+
+
+def generate_driving_hours_pdf(student, trips, parent_profile, ledger=None, as_of=None, template=None, output=None,
+                               session_rows=None):
     """
     Generate a PDF report of driving hours for DMV submission
 
     Args:
         student: StudentProfile object
-        trips: QuerySet of approved Trip objects
+        trips: QuerySet of approved Trip objects, ordered by start time
         parent_profile: ParentProfile of the parent generating the report
+        ledger: the student's StudentHoursLedger, if the caller already has it
+        as_of: time the report describes, printed as the report date
+               (defaults to now)
+        template: ReportTemplate with the styles and static blocks
+                  (defaults to the one cached for this thread)
+        output: binary file to write the PDF to instead of returning it
+        session_rows: rows already read with iter_formatted_session_rows(),
+                      printed instead of reading them from trips
 
     Returns:
-        BytesIO: PDF file buffer
+        bytes: the PDF, or None when it was written to output
     """
-    buffer = BytesIO()
+    buffer = output if output is not None else BytesIO()
+    # Rows are read straight from one joined query; no Trip instances are built
+    if session_rows is None:
+        session_rows = iter_formatted_session_rows(trips)
+    _build_report(buffer, student, session_rows, parent_profile, ledger, as_of, template)
+
+    if output is not None:
+        return None
+
+    # Get the value of the BytesIO buffer and return it
+    pdf = buffer.getvalue()
+    buffer.close()
+
+    return pdf
+
+
+def _build_report(buffer, student, session_rows, parent_profile, ledger=None, as_of=None, template=None):
+    """
+    Lay out the generic report with the given session log rows
+
+    Returns:
+        list: number of session rows on each page of the log
+    """
+    as_of = timezone.localtime(as_of or timezone.now())
+    template = template or get_report_template()
 
     # Create the PDF document
     doc = SimpleDocTemplate(
         buffer,
-        pagesize=letter,
-        rightMargin=0.75 * inch,
-        leftMargin=0.75 * inch,
-        topMargin=0.75 * inch,
-        bottomMargin=0.75 * inch
+        pagesize=PAGE_SIZE,
+        rightMargin=PAGE_MARGIN,
+        leftMargin=PAGE_MARGIN,
+        topMargin=PAGE_MARGIN,
+        bottomMargin=PAGE_MARGIN,
+        # Leave out the creation date and random document id so the same
+        # report always renders to the same bytes
+        invariant=True
     )
 
     # Container for the 'Flowable' objects
     elements = []
 
-    # Define styles
-    styles = getSampleStyleSheet()
-
-    # Title style
-    title_style = ParagraphStyle(
-        'CustomTitle',
-        parent=styles['Heading1'],
-        fontSize=16,
-        textColor=colors.HexColor('#333333'),
-        spaceAfter=30,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold'
-    )
-
-    # Header info style
-    header_style = ParagraphStyle(
-        'HeaderInfo',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=6,
-        alignment=TA_LEFT
-    )
-
-    # Footer style
-    footer_style = ParagraphStyle(
-        'Footer',
-        parent=styles['Normal'],
-        fontSize=10,
-        spaceAfter=6,
-        alignment=TA_LEFT
-    )
-
-    # Add title
-    title = Paragraph(
-        "HOURS OBTAINED WHILE IN THE PRESENCE<br/>OF A LICENSED DRIVER",
-        title_style
-    )
-    elements.append(title)
+    # Add title (shared blocks are copied: platypus marks the flowables it lays out)
+    elements.append(copy(template.title))
     elements.append(Spacer(1, 0.2 * inch))
 
     # Add student information - horizontal layout using Paragraphs
+    header_style = template.header_style
     student_info_data = [[
         Paragraph(f"<b>Student Name:</b> {student.first_name} {student.last_name}", header_style),
         Paragraph(f"<b>Permit Number:</b> {student.permit_number or 'Not Provided'}", header_style),
-        Paragraph(f"<b>Report Date:</b> {timezone.now().strftime('%m/%d/%Y')}", header_style)
+        Paragraph(f"<b>Report Date:</b> {as_of.strftime('%m/%d/%Y')}", header_style)
     ]]
 
     student_info_table = Table(student_info_data, colWidths=[2.5 * inch, 2.0 * inch, 1.5 * inch])
-    student_info_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('VALIGN', (0, 0), (-1, -1), 'TOP'),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
+    student_info_table.setStyle(template.student_info_table_style)
 
     elements.append(student_info_table)
     elements.append(Spacer(1, 0.3 * inch))
 
-    # Calculate totals
-    total_minutes = sum(trip.duration for trip in trips if trip.duration)
-    total_hours = total_minutes / 60
-    night_trips = [trip for trip in trips if trip.is_night]
-    night_minutes = sum(trip.duration for trip in night_trips if trip.duration)
-    night_hours = night_minutes / 60
-    day_hours = total_hours - night_hours
+    # Totals come from the hours ledger rather than summing the trips
+    ledger = ledger or get_student_ledger(student)
+    total_hours = ledger.approved_total_minutes / 60
+    night_hours = ledger.approved_night_minutes / 60
+    day_hours = ledger.approved_day_minutes / 60
 
     # Add summary - 4 column layout using Paragraphs for bold text
-    summary_style = ParagraphStyle(
-        'Summary',
-        parent=styles['Normal'],
-        fontSize=11,
-        spaceAfter=6,
-        alignment=TA_LEFT,
-        fontName='Helvetica-Bold'
-    )
-
-    value_style = ParagraphStyle(
-        'Value',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_RIGHT
-    )
-
-    label_style = ParagraphStyle(
-        'Label',
-        parent=styles['Normal'],
-        fontSize=10,
-        alignment=TA_LEFT,
-        fontName='Helvetica-Bold'
-    )
-
+    label_style = template.label_style
+    value_style = template.value_style
     summary_data = [
-        [Paragraph('<b>Summary of Hours</b>', summary_style), '', '', ''],
+        [Paragraph('<b>Summary of Hours</b>', template.summary_style), '', '', ''],
         [Paragraph('Day Driving Hours:', label_style),
          Paragraph(f'{day_hours:.2f}', value_style),
          Paragraph('Total Driving Hours:', label_style),
@@ -138,154 +186,188 @@ def generate_driving_hours_pdf(student, trips, parent_profile):
         [Paragraph('Night Driving Hours:', label_style),
          Paragraph(f'{night_hours:.2f}', value_style),
          Paragraph('Total Sessions:', label_style),
-         Paragraph(str(len(trips)), value_style)],
+         Paragraph(str(ledger.approved_session_count), value_style)],
     ]
 
     summary_table = Table(summary_data, colWidths=[1.8 * inch, 1.0 * inch, 1.8 * inch, 1.4 * inch])
-    summary_table.setStyle(TableStyle([
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4CAF50')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('SPAN', (0, 0), (-1, 0)),  # Merge header across all columns
-        ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
-        ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
-        ('GRID', (0, 0), (-1, -1), 1, colors.black),
-        ('TOPPADDING', (0, 1), (-1, -1), 8),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
-    ]))
+    summary_table.setStyle(template.summary_table_style)
 
     elements.append(summary_table)
     elements.append(Spacer(1, 0.3 * inch))
 
     # Add detailed trip listing
-    elements.append(Paragraph("<b>Detailed Session Log</b>", summary_style))
+    elements.append(Paragraph("<b>Detailed Session Log</b>", template.summary_style))
     elements.append(Spacer(1, 0.1 * inch))
 
-    # Create table data
-    table_data = [
-        ['Date', 'Start Time', 'End Time', 'Duration\n(minutes)', 'Type', 'Approved By']
-    ]
-
-    # Sort trips by date
-    sorted_trips = sorted(trips, key=lambda x: x.start_time)
-
-    for trip in sorted_trips:
-        row = [
-            trip.start_time.strftime('%m/%d/%Y'),
-            trip.start_time.strftime('%I:%M %p'),
-            trip.end_time.strftime('%I:%M %p') if trip.end_time else 'N/A',
-            str(trip.duration),
-            'Night' if trip.is_night else 'Day',
-            trip.parent.user.get_full_name() or trip.parent.user.email
-        ]
-        table_data.append(row)
-
-    # Create the table
-    trip_table = Table(
-        table_data,
-        colWidths=[1.0 * inch, 1.0 * inch, 1.0 * inch, 0.9 * inch, 0.7 * inch, 1.4 * inch]
+    # Laid out a page at a time as the rows stream in, header repeated on each page
+    trip_table = PagedTable(
+        template.session_header,
+        (list(row) for row in session_rows),
+        template.session_col_widths,
+        template.session_table_style,
+        template.session_header_height,
+        template.session_row_height,
     )
-
-    # Style the table
-    trip_table.setStyle(TableStyle([
-        # Header row
-        ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196F3')),
-        ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
-        ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
-        ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
-        ('FONTSIZE', (0, 0), (-1, 0), 9),
-        ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
-        ('TOPPADDING', (0, 0), (-1, 0), 12),
-
-        # Data rows
-        ('BACKGROUND', (0, 1), (-1, -1), colors.white),
-        ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
-        ('FONTSIZE', (0, 1), (-1, -1), 8),
-        ('TOPPADDING', (0, 1), (-1, -1), 6),
-        ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
-
-        # Alternate row colors
-        ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
-    ]))
+    page_row_counts = trip_table.page_row_counts
+    if not trip_table.has_rows:
+        trip_table = Table([template.session_header], colWidths=template.session_col_widths)
+        trip_table.setStyle(template.session_table_style)
 
     elements.append(trip_table)
     elements.append(Spacer(1, 0.5 * inch))
 
-    # Add certification section
-    cert_text = """
-    <b>Certification</b><br/>
-    I hereby certify that the information contained in this report is true and accurate to the best 
-    of my knowledge. All driving sessions listed were conducted under my supervision or the supervision 
-    of another licensed driver, and comply with the requirements set forth by the Department of Motor Vehicles.
-    """
-
-    elements.append(Paragraph(cert_text, footer_style))
-    elements.append(Spacer(1, 0.3 * inch))
-
-    # Signature lines
-    sig_data = [
-        ['Parent/Guardian Signature: _________________________________',
-         'Date: __________________'],
-    ]
-
-    sig_table = Table(sig_data, colWidths=[4 * inch, 2 * inch])
-    sig_table.setStyle(TableStyle([
-        ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
-        ('FONTSIZE', (0, 0), (-1, -1), 10),
-        ('TOPPADDING', (0, 0), (-1, -1), 0),
-        ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
-    ]))
-
-    elements.append(sig_table)
+    # Certification and signature lines
+    elements.append(copy(template.certification))
     elements.append(Spacer(1, 0.1 * inch))
 
     # Printed name
     printed_name = Paragraph(
         f"<b>Printed Name:</b> {parent_profile.user.get_full_name()}",
-        footer_style
+        template.footer_style
     )
     elements.append(printed_name)
 
     # Add footer with generation info and branding
     elements.append(Spacer(1, 0.3 * inch))
-    footer_text = f"Document generated on {timezone.now().strftime('%B %d, %Y at %I:%M %p')}"
-    elements.append(Paragraph(footer_text,
-                              ParagraphStyle('FooterSmall',
-                                             parent=styles['Normal'],
-                                             fontSize=8,
-                                             textColor=colors.grey,
-                                             alignment=TA_CENTER)))
+    footer_text = f"Hours as of {as_of.strftime('%B %d, %Y at %I:%M %p')}"
+    elements.append(Paragraph(footer_text, template.footer_small_style))
 
     elements.append(Spacer(1, 0.1 * inch))
 
     # Add DMV+ branding
-    branding_style = ParagraphStyle(
-        'Branding',
-        parent=styles['Normal'],
-        fontSize=11,
-        alignment=TA_CENTER,
-        fontName='Helvetica-Bold',
-        textColor=colors.HexColor('#4CAF50')
-    )
-
-    tagline_style = ParagraphStyle(
-        'Tagline',
-        parent=styles['Normal'],
-        fontSize=9,
-        alignment=TA_CENTER,
-        textColor=colors.grey
-    )
-
-    elements.append(Paragraph("DMV+", branding_style))
-    elements.append(Spacer(1, 0.05 * inch))
-    elements.append(Paragraph("<b>D</b>rive, <b>M</b>anage, <b>V</b>erify", tagline_style))
+    elements.append(copy(template.branding))
 
     # Build PDF
     doc.build(elements)
 
-    # Get the value of the BytesIO buffer and return it
-    pdf = buffer.getvalue()
-    buffer.close()
+    return page_row_counts
 
-    return pdf
\ No newline at end of file
+
+def _reuse_report(output, previous, manifest, student, trips, parent_profile, ledger, as_of, approvers):
+    """
+    Write an updated generic report that reuses the session log pages of the
+    previous one
+
+    Only works when the trips printed in the previous report are untouched
+    and every new trip comes after them. The first page (summary and the
+    start of the log) and the pages from where the previous log ended are
+    rendered again; the full pages in between are copied from the previous
+    PDF as they are, without laying them out again. The new PDF is written
+    out whole, not appended to the previous file, so it is as large as a
+    full render; what is saved is the layout of the copied pages.
+
+    Args:
+        output: binary file to write the PDF to
+        previous: path of the previous report
+        manifest: the previous report's manifest
+
+    Returns:
+        list: number of session rows on each page of the log, or None when
+              the previous report can't be reused (nothing is written then)
+    """
+    try:
+        from pypdf import PdfReader, PdfWriter
+        from pypdf.errors import PyPdfError
+    except ImportError:
+        return None
+
+    previous_counts = manifest['page_row_counts']
+    # Full pages between the first page and the one the previous log ended on
+    reused_counts = previous_counts[1:-1]
+    if (not reused_counts
+            or not manifest['last_start']
+            or manifest['rewrite_version'] != ledger.approved_rewrite_version
+            or not all(tuple(approver) in approvers for approver in manifest['approvers'])):
+        return None
+
+    # Nothing may have been approved in between the trips already printed
+    last_start = datetime.fromisoformat(manifest['last_start'])
+    if trips.filter(start_time__lte=last_start).count() != sum(previous_counts):
+        return None
+
+    first_count = previous_counts[0]
+    tail_start = first_count + sum(reused_counts)
+    session_rows = chain(
+        iter_formatted_session_rows(trips[:first_count]),
+        iter_formatted_session_rows(trips[tail_start:]),
+    )
+
+    buffer = BytesIO()
+    rendered_counts = _build_report(buffer, student, session_rows, parent_profile, ledger, as_of)
+    if rendered_counts[0] != first_count:
+        return None
+
+    try:
+        rendered_pages = PdfReader(buffer).pages
+        reader = PdfReader(previous)
+        writer = PdfWriter(clone_from=reader)
+        if len(writer.pages) not in (len(previous_counts), len(previous_counts) + 1):
+            return None
+
+        # Keep the reused pages, replace the first page and everything after them
+        for index in reversed(range(len(reused_counts) + 1, len(writer.pages))):
+            writer.remove_page(index)
+        writer.remove_page(0)
+        writer.insert_page(rendered_pages[0], 0)
+        for page in rendered_pages[1:]:
+            writer.add_page(page)
+    except PyPdfError:
+        logger.warning("Could not reuse the pages of %s", previous, exc_info=True)
+        return None
+
+    writer.write(output)
+    return [first_count] + reused_counts + rendered_counts[1:]
+
+
+def render_cached_report(student, parent_profile, ledger, fingerprint):
+    """
+    Render a student's hours report straight into the report cache
+
+    Uses the official form of the parent's state when one is configured,
+    otherwise the generic report. The PDF is written to the cache file as
+    it is built rather than copied out of an in-memory buffer. When the
+    only change since the previous generic report is newly approved trips,
+    the new report copies the previous one's full log pages and only lays
+    out the first page and the end of the log (see _reuse_report).
+
+    Returns:
+        Path: the cached PDF
+    """
+    # Get only approved trips (these are the official hours)
+    # trip_id breaks ties, so trips starting together keep their order from one report to the next
+    trips = Trip.objects.filter(student=student, is_approved=True, is_active=False).order_by('start_time', 'trip_id')
+    as_of = report_as_of(ledger)
+    state_form = get_state_form(parent_profile.state)
+
+    if state_form is not None:
+        with write_report(fingerprint) as output:
+            values = form_field_values(student, parent_profile, ledger, timezone.localtime(as_of))
+            state_form.render(values, iter_formatted_session_rows(trips), output)
+        return report_path(fingerprint)
+
+    # Read before the rows; a trip approved in between only costs the next report its shortcut
+    approvers = report_approvers(student, ledger)
+    last_start = trips.values_list('start_time', flat=True).last()
+
+    manifest = get_report_manifest(student, parent_profile)
+    previous = get_cached_report(manifest['fingerprint']) if manifest else None
+
+    with write_report(fingerprint) as output:
+        page_row_counts = None
+        if previous is not None:
+            page_row_counts = _reuse_report(
+                output, previous, manifest, student, trips, parent_profile, ledger, as_of, approvers,
+            )
+        if page_row_counts is None:
+            page_row_counts = _build_report(
+                output, student, iter_formatted_session_rows(trips), parent_profile, ledger, as_of,
+            )
+
+    save_report_manifest(student, parent_profile, {
+        'fingerprint': fingerprint,
+        'page_row_counts': page_row_counts,
+        'last_start': last_start.isoformat() if last_start else None,
+        'rewrite_version': ledger.approved_rewrite_version,
+        'approvers': approvers,
+    })
+    return report_path(fingerprint)
@@ -0,0 +1,264 @@
+"""
+Service for caching generated driving hours PDFs on disk
+
+Reports are content addressed: the file name is a fingerprint of everything
+that ends up in the document, so an unchanged report is served straight from
+disk and doubles as its ETag. The cache directory is bounded in size and the
+least recently used reports are evicted first.
+
+Next to the reports, a small manifest per student and parent records how
+the latest report's session log was paginated, so a later version can reuse
+its pages when only new sessions were added.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import uuid
+from contextlib import contextmanager
+from pathlib import Path
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db.models.signals import post_save
+from django.dispatch import receiver
+from django.utils import timezone
+
+from core.models.custom_user import AccountUser
+from student.models.driving_sessions import Trip
+from student.services.state_form_service import get_state_form
+
+# Bump when the PDF layout changes so older cached reports are not served
+REPORT_LAYOUT_VERSION = 3
+
+# Changed whenever a user's name or email changes, so cached approver names are not reused
+APPROVER_NAMES_KEY = 'report_approvers:names'
+APPROVER_NAME_FIELDS = {'first_name', 'last_name', 'email'}
+
+
+def get_report_cache_dir():
+    return Path(getattr(settings, 'REPORT_CACHE_DIR', Path(settings.BASE_DIR) / 'report_cache'))
+
+
+def report_as_of(ledger):
+    """
+    The point in time a report describes
+
+    This is when the approved hours last changed, not when the PDF happens to
+    be rendered, so the same approved trips always produce the same document.
+    """
+    return ledger.approved_changed_at or ledger.updated_at or timezone.now()
+
+
+def report_approvers(student, ledger):
+    """
+    The parents who approved a student's trips, as named in the session log
+
+    The approvers only change with the approved trips, that is with the
+    ledger's approved_version, or when one of them is renamed, so they are
+    cached under both and the query only runs for a new version.
+
+    Returns:
+        list: (parent id, first name, last name, email) tuples
+    """
+    names_version = cache.get_or_set(APPROVER_NAMES_KEY, uuid.uuid4().hex, None)
+    key = f'report_approvers:{student.id}:{ledger.approved_version}:{names_version}'
+    approvers = cache.get(key)
+    if approvers is None:
+        approvers = list(Trip.objects.filter(
+            student=student,
+            is_approved=True,
+            is_active=False,
+        ).values_list(
+            'parent_id',
+            'parent__user__first_name',
+            'parent__user__last_name',
+            'parent__user__email',
+        ).distinct().order_by('parent_id'))
+        cache.set(key, approvers, getattr(settings, 'REPORT_APPROVERS_CACHE_TIMEOUT', 24 * 60 * 60))
+    return approvers
+
+
+def _report_base_parts(student, parent_profile):
+    # Everything a report is built from except the trips
+    state_form = get_state_form(parent_profile.state)
+    return [
+        REPORT_LAYOUT_VERSION,
+        state_form.version if state_form else None,
+        settings.TIME_ZONE,
+        student.id,
+        student.first_name,
+        student.last_name,
+        student.permit_number,
+        parent_profile.id,
+        parent_profile.user.get_full_name(),
+    ]
+
+
+def report_fingerprint(student, parent_profile, ledger):
+    """
+    Hash of everything a student's hours report is built from
+
+    The approved trip set is identified by the ledger's approved_version,
+    which changes whenever an approved trip is added, edited or removed.
+    The state form used for the parent's state, if any, is part of it too.
+
+    Args:
+        student: StudentProfile object
+        parent_profile: ParentProfile of the parent generating the report
+        ledger: the student's StudentHoursLedger
+
+    Returns:
+        str: hex digest
+    """
+    parts = [
+        *_report_base_parts(student, parent_profile),
+        ledger.approved_version,
+        ledger.approved_total_minutes,
+        ledger.approved_day_minutes,
+        ledger.approved_night_minutes,
+        ledger.approved_session_count,
+        report_as_of(ledger).isoformat(),
+        *report_approvers(student, ledger),
+    ]
+    return hashlib.sha256(repr(parts).encode()).hexdigest()
+
+
+def report_path(fingerprint):
+    return get_report_cache_dir() / f"{fingerprint}.pdf"
+
+
+def get_cached_report(fingerprint):
+    """
+    Returns:
+        Path: the cached PDF, or None if it isn't cached
+    """
+    path = report_path(fingerprint)
+    try:
+        # Touch the file so eviction sees it as recently used
+        os.utime(path)
+    except FileNotFoundError:
+        return None
+    return path
+
+
+@contextmanager
+def write_report(fingerprint):
+    """
+    Open a cache file to write a report into, then evict old ones if needed
+
+    The file is written under a temporary name and renamed into place on
+    success, so a concurrent reader never sees a partial PDF.
+
+    Yields:
+        file: binary file to write the PDF to
+    """
+    cache_dir = get_report_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+    path = report_path(fingerprint)
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'wb') as tmp:
+            yield tmp
+        os.replace(tmp_path, path)
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+    evict_reports(keep=path)
+
+
+def report_manifest_path(student, parent_profile):
+    """
+    Path of the manifest of a student's latest report for a parent
+
+    Named by everything the report is built from except the trips, so every
+    version of the report shares one manifest.
+    """
+    key = hashlib.sha256(repr(_report_base_parts(student, parent_profile)).encode()).hexdigest()
+    return get_report_cache_dir() / f"{key}.manifest.json"
+
+
+def get_report_manifest(student, parent_profile):
+    """
+    Returns:
+        dict: the manifest saved with save_report_manifest(), or None
+    """
+    try:
+        with open(report_manifest_path(student, parent_profile)) as manifest_file:
+            return json.load(manifest_file)
+    except (FileNotFoundError, ValueError):
+        return None
+
+
+def save_report_manifest(student, parent_profile, manifest):
+    """
+    Record the manifest of the report just written for a student and parent
+
+    Args:
+        manifest: JSON serializable dict; its 'fingerprint' names the report
+    """
+    cache_dir = get_report_cache_dir()
+    cache_dir.mkdir(parents=True, exist_ok=True)
+
+    fd, tmp_path = tempfile.mkstemp(dir=cache_dir, suffix='.tmp')
+    try:
+        with os.fdopen(fd, 'w') as tmp:
+            json.dump(manifest, tmp)
+        os.replace(tmp_path, report_manifest_path(student, parent_profile))
+    except BaseException:
+        os.unlink(tmp_path)
+        raise
+
+
+def evict_reports(keep=None, max_bytes=None):
+    """
+    Delete the least recently used reports until the cache fits its size limit
+
+    Args:
+        keep: a path that is never evicted (the report being served)
+        max_bytes: size limit (defaults to settings.REPORT_CACHE_MAX_BYTES)
+
+    Returns:
+        int: number of reports deleted
+    """
+    if max_bytes is None:
+        max_bytes = getattr(settings, 'REPORT_CACHE_MAX_BYTES', 256 * 1024 * 1024)
+
+    entries = []
+    total = 0
+    for path in get_report_cache_dir().glob('*.pdf'):
+        try:
+            stat = path.stat()
+        except FileNotFoundError:
+            continue
+        entries.append((stat.st_mtime, stat.st_size, path))
+        total += stat.st_size
+
+    deleted = 0
+    for mtime, size, path in sorted(entries):
+        if total <= max_bytes:
+            break
+        if path == keep:
+            continue
+        try:
+            path.unlink()
+        except FileNotFoundError:
+            pass
+        total -= size
+        deleted += 1
+
+    return deleted
+
+
+# ============================================
+# SIGNALS
+# ============================================
+
+@receiver(post_save, sender=AccountUser)
+def approver_renamed(sender, instance, created, update_fields=None, **kwargs):
+    # Logins only save last_login; anything else may have renamed an approver
+    if created or (update_fields is not None and not APPROVER_NAME_FIELDS & set(update_fields)):
+        return
+    cache.set(APPROVER_NAMES_KEY, uuid.uuid4().hex, None)
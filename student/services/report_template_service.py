@@ -0,0 +1,308 @@
+"""
+Service for the reusable parts of the driving hours report
+
+Styles and the blocks that read the same on every report (title,
+certification and signature lines, DMV+ branding) are built and laid out
+once per thread instead of once per report. Each document only replays the
+laid out blocks into a PDF form XObject.
+"""
+import threading
+
+from reportlab.lib import colors
+from reportlab.lib.enums import TA_CENTER, TA_LEFT, TA_RIGHT
+from reportlab.lib.pagesizes import letter
+from reportlab.lib.styles import ParagraphStyle, getSampleStyleSheet
+from reportlab.lib.units import inch
+from reportlab.platypus import Flowable, Paragraph, Spacer, Table, TableStyle
+
+PAGE_SIZE = letter
+PAGE_MARGIN = 0.75 * inch
+# SimpleDocTemplate frames keep 6pt of padding inside the margins
+FRAME_WIDTH = PAGE_SIZE[0] - 2 * PAGE_MARGIN - 2 * 6
+
+CERTIFICATION_TEXT = """
+    <b>Certification</b><br/>
+    I hereby certify that the information contained in this report is true and accurate to the best
+    of my knowledge. All driving sessions listed were conducted under my supervision or the supervision
+    of another licensed driver, and comply with the requirements set forth by the Department of Motor Vehicles.
+    """
+
+_local = threading.local()
+
+
+class StaticBlock(Flowable):
+    '''
+    A run of flowables laid out once and drawn as a PDF form XObject.
+
+    The children are wrapped when the block is built, so reusing the block
+    across documents skips all text measuring. The first time a document
+    draws the block its content is recorded as a named form; the block then
+    places the form like an image.
+
+    platypus marks the flowables it lays out (e.g. one it pushed to the next
+    page), so a document draws copy.copy() of a shared block, never the block
+    itself. Blocks hold laid out flowables, so one must not be drawn by two
+    threads at once.
+    '''
+
+    def __init__(self, name, flowables, width=FRAME_WIDTH):
+        super().__init__()
+        self.name = name
+        self.width = width
+        self._placed = []
+
+        # Same vertical spacing as a Frame: the larger of the previous
+        # flowable's spaceAfter and the next one's spaceBefore
+        y = 0
+        previous_after = None
+        for flowable in flowables:
+            w, h = flowable.wrap(width, 10 * PAGE_SIZE[1])
+            if previous_after is not None:
+                y += max(flowable.getSpaceBefore(), previous_after)
+            self._placed.append((flowable, w, y + h))
+            y += h
+            previous_after = flowable.getSpaceAfter()
+
+        self.height = y
+        self.spaceBefore = flowables[0].getSpaceBefore()
+        self.spaceAfter = flowables[-1].getSpaceAfter()
+
+    def wrap(self, availWidth, availHeight):
+        return self.width, self.height
+
+    def draw(self):
+        canv = self.canv
+        if not canv.hasForm(self.name):
+            canv.beginForm(self.name, lowerx=0, lowery=0, upperx=self.width, uppery=self.height)
+            for flowable, w, bottom in self._placed:
+                flowable.drawOn(canv, 0, self.height - bottom, _sW=self.width - w)
+            canv.endForm()
+        canv.doForm(self.name)
+
+
+class PagedTable(Flowable):
+    '''
+    A long table laid out one page at a time from a row iterator.
+
+    Every time the frame asks it to split, it pulls just enough rows to fill
+    the space left on the page and returns them as a small table with the
+    header repeated, followed by a new PagedTable for the rows still to come
+    (a new one, so nothing platypus marked on this one carries over). Row
+    heights are fixed, so no cell is measured and only one page of rows is
+    ever held in memory, however long the log is.
+
+    page_row_counts lists how many rows went on each page, first page first.
+    '''
+
+    def __init__(self, header, rows, col_widths, style, header_height, row_height):
+        super().__init__()
+        self.header = header
+        self.rows = iter(rows)
+        self.col_widths = col_widths
+        self.style = style
+        self.header_height = header_height
+        self.row_height = row_height
+        self.width = sum(col_widths)
+        self.page_row_counts = []
+        self._next_row = next(self.rows, None)
+
+    @property
+    def has_rows(self):
+        return self._next_row is not None
+
+    def wrap(self, availWidth, availHeight):
+        # Never fit as a whole; the frame then calls split() with the space left
+        return self.width, availHeight + self.row_height
+
+    def _rest(self):
+        # The rows still to come, sharing the iterator and page_row_counts
+        rest = PagedTable(self.header, (), self.col_widths, self.style, self.header_height, self.row_height)
+        rest.rows, rest._next_row, rest.page_row_counts = self.rows, self._next_row, self.page_row_counts
+        return rest
+
+    def split(self, availWidth, availHeight):
+        capacity = int((availHeight - self.header_height) // self.row_height)
+        if capacity < 1 or not self.has_rows:
+            return []
+
+        page_rows = []
+        while self._next_row is not None and len(page_rows) < capacity:
+            page_rows.append(self._next_row)
+            self._next_row = next(self.rows, None)
+        self.page_row_counts.append(len(page_rows))
+
+        table = Table(
+            [self.header] + page_rows,
+            colWidths=self.col_widths,
+            rowHeights=[self.header_height] + [self.row_height] * len(page_rows),
+        )
+        table.setStyle(self.style)
+
+        return [table, self._rest()] if self.has_rows else [table]
+
+    def draw(self):
+        pass
+
+
+class ReportTemplate:
+    '''
+    Styles and static blocks of the driving hours report.
+    '''
+
+    def __init__(self):
+        styles = getSampleStyleSheet()
+
+        self.title_style = ParagraphStyle(
+            'CustomTitle',
+            parent=styles['Heading1'],
+            fontSize=16,
+            textColor=colors.HexColor('#333333'),
+            spaceAfter=30,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold'
+        )
+        self.header_style = ParagraphStyle(
+            'HeaderInfo',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=6,
+            alignment=TA_LEFT
+        )
+        self.footer_style = ParagraphStyle(
+            'Footer',
+            parent=styles['Normal'],
+            fontSize=10,
+            spaceAfter=6,
+            alignment=TA_LEFT
+        )
+        self.footer_small_style = ParagraphStyle(
+            'FooterSmall',
+            parent=styles['Normal'],
+            fontSize=8,
+            textColor=colors.grey,
+            alignment=TA_CENTER
+        )
+        self.summary_style = ParagraphStyle(
+            'Summary',
+            parent=styles['Normal'],
+            fontSize=11,
+            spaceAfter=6,
+            alignment=TA_LEFT,
+            fontName='Helvetica-Bold'
+        )
+        self.value_style = ParagraphStyle(
+            'Value',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_RIGHT
+        )
+        self.label_style = ParagraphStyle(
+            'Label',
+            parent=styles['Normal'],
+            fontSize=10,
+            alignment=TA_LEFT,
+            fontName='Helvetica-Bold'
+        )
+        branding_style = ParagraphStyle(
+            'Branding',
+            parent=styles['Normal'],
+            fontSize=11,
+            alignment=TA_CENTER,
+            fontName='Helvetica-Bold',
+            textColor=colors.HexColor('#4CAF50')
+        )
+        tagline_style = ParagraphStyle(
+            'Tagline',
+            parent=styles['Normal'],
+            fontSize=9,
+            alignment=TA_CENTER,
+            textColor=colors.grey
+        )
+
+        self.student_info_table_style = TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('VALIGN', (0, 0), (-1, -1), 'TOP'),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+        ])
+        self.summary_table_style = TableStyle([
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#4CAF50')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('SPAN', (0, 0), (-1, 0)),  # Merge header across all columns
+            ('ALIGN', (0, 0), (-1, 0), 'CENTER'),
+            ('VALIGN', (0, 0), (-1, -1), 'MIDDLE'),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('BACKGROUND', (0, 1), (-1, -1), colors.beige),
+            ('GRID', (0, 0), (-1, -1), 1, colors.black),
+            ('TOPPADDING', (0, 1), (-1, -1), 8),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 8),
+        ])
+        self.session_table_style = TableStyle([
+            # Header row
+            ('BACKGROUND', (0, 0), (-1, 0), colors.HexColor('#2196F3')),
+            ('TEXTCOLOR', (0, 0), (-1, 0), colors.whitesmoke),
+            ('ALIGN', (0, 0), (-1, -1), 'CENTER'),
+            ('FONTNAME', (0, 0), (-1, 0), 'Helvetica-Bold'),
+            ('FONTSIZE', (0, 0), (-1, 0), 9),
+            ('BOTTOMPADDING', (0, 0), (-1, 0), 12),
+            ('TOPPADDING', (0, 0), (-1, 0), 12),
+
+            # Data rows
+            ('BACKGROUND', (0, 1), (-1, -1), colors.white),
+            ('GRID', (0, 0), (-1, -1), 0.5, colors.grey),
+            ('FONTSIZE', (0, 1), (-1, -1), 8),
+            ('TOPPADDING', (0, 1), (-1, -1), 6),
+            ('BOTTOMPADDING', (0, 1), (-1, -1), 6),
+
+            # Alternate row colors
+            ('ROWBACKGROUNDS', (0, 1), (-1, -1), [colors.white, colors.HexColor('#f5f5f5')]),
+        ])
+
+        self.session_header = ['Date', 'Start Time', 'End Time', 'Duration\n(minutes)', 'Type', 'Approved By']
+        self.session_col_widths = [1.0 * inch, 1.0 * inch, 1.0 * inch, 0.9 * inch, 0.7 * inch, 1.4 * inch]
+        # Session cells are single line strings, so one sample row gives every row's height
+        sample = Table(
+            [self.session_header, ['00/00/0000', '00:00 AM', '00:00 AM', '0', 'Night', 'Sample']],
+            colWidths=self.session_col_widths,
+        )
+        sample.setStyle(self.session_table_style)
+        sample.wrap(FRAME_WIDTH, PAGE_SIZE[1])
+        self.session_header_height, self.session_row_height = sample._rowHeights
+
+        self.title = StaticBlock('ReportTitle', [
+            Paragraph("HOURS OBTAINED WHILE IN THE PRESENCE<br/>OF A LICENSED DRIVER", self.title_style),
+        ])
+
+        # Signature lines
+        sig_table = Table(
+            [['Parent/Guardian Signature: _________________________________',
+              'Date: __________________']],
+            colWidths=[4 * inch, 2 * inch]
+        )
+        sig_table.setStyle(TableStyle([
+            ('ALIGN', (0, 0), (-1, -1), 'LEFT'),
+            ('FONTSIZE', (0, 0), (-1, -1), 10),
+            ('TOPPADDING', (0, 0), (-1, -1), 0),
+            ('BOTTOMPADDING', (0, 0), (-1, -1), 0),
+        ]))
+        self.certification = StaticBlock('Certification', [
+            Paragraph(CERTIFICATION_TEXT, self.footer_style),
+            Spacer(1, 0.3 * inch),
+            sig_table,
+        ])
+
+        self.branding = StaticBlock('Branding', [
+            Paragraph("DMV+", branding_style),
+            Spacer(1, 0.05 * inch),
+            Paragraph("<b>D</b>rive, <b>M</b>anage, <b>V</b>erify", tagline_style),
+        ])
+
+
+def get_report_template():
+    """
+    The ReportTemplate of the current thread, built on first use
+    """
+    template = getattr(_local, 'template', None)
+    if template is None:
+        template = _local.template = ReportTemplate()
+    return template
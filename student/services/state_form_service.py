@@ -0,0 +1,197 @@
+"""
+Service for filling in the official state supervised driving log forms
+
+Each state's form is configured by two files in settings.STATE_FORM_DIR:
+the official blank form (e.g. AZ.pdf) and a field map (AZ.json) that says
+where the variable fields go:
+
+    {
+        "template": "AZ.pdf",
+        "fields": {
+            "student_name": {"page": 0, "x": 120, "y": 650, "size": 10},
+            ...
+        },
+        "sessions": {
+            "page": 1, "first_row_y": 600, "row_height": 18, "rows_per_page": 25, "size": 8,
+            "columns": {"date": 60, "start_time": 130, ...}
+        }
+    }
+
+Field names are the keys of form_field_values(); session columns are
+SESSION_COLUMNS. The session page is repeated as often as the log needs.
+
+Templates are parsed once per process. A report only draws its own text
+onto a plain overlay, with no platypus layout, and each overlay page is
+merged over a copy of its template page; only the small overlay content is
+parsed, the template's is copied as is. Reading the templates needs the
+optional pypdf package; without it, or without a form for the state,
+reports fall back to the generic layout.
+"""
+import hashlib
+import json
+import logging
+import threading
+from io import BytesIO
+from pathlib import Path
+
+from django.conf import settings
+from reportlab.pdfgen import canvas
+
+logger = logging.getLogger(__name__)
+
+SESSION_COLUMNS = ('date', 'start_time', 'end_time', 'duration', 'type', 'approver')
+
+_forms = {}
+_forms_lock = threading.Lock()
+
+
+def get_state_form_dir():
+    return Path(getattr(settings, 'STATE_FORM_DIR', Path(settings.BASE_DIR) / 'state_forms'))
+
+
+class StateForm:
+    '''
+    One state's official form: the parsed template pages and the field map.
+    '''
+
+    def __init__(self, state, spec, template_bytes):
+        from pypdf import PdfReader
+
+        self.state = state
+        self.fields = spec['fields']
+        self.sessions = spec['sessions']
+        self.pages = PdfReader(BytesIO(template_bytes)).pages
+        self.page_sizes = [(float(page.mediabox.width), float(page.mediabox.height)) for page in self.pages]
+        # The cached pages read lazily from one shared stream
+        self._lock = threading.Lock()
+        # Identifies this exact template and field map in report fingerprints
+        self.version = hashlib.sha256(template_bytes + json.dumps(spec, sort_keys=True).encode()).hexdigest()[:16]
+
+    def render(self, values, session_rows, output):
+        """
+        Write the filled in form
+
+        Args:
+            values: dict of field name to text, see form_field_values()
+            session_rows: iterable of session log rows, each a tuple in
+                          SESSION_COLUMNS order
+            output: binary file to write the PDF to
+        """
+        from pypdf import PdfReader, PdfWriter
+
+        session_page = self.sessions['page']
+        rows_per_page = self.sessions['rows_per_page']
+
+        # One overlay page per output page, in output order
+        overlay_buffer = BytesIO()
+        overlay = canvas.Canvas(overlay_buffer, invariant=True)
+        layout = []
+
+        rows = iter(session_rows)
+        next_row = next(rows, None)
+        for index in range(len(self.pages)):
+            while True:
+                self._draw_fields(overlay, index, values)
+                if index == session_page:
+                    page_rows = []
+                    while next_row is not None and len(page_rows) < rows_per_page:
+                        page_rows.append(next_row)
+                        next_row = next(rows, None)
+                    self._draw_sessions(overlay, page_rows)
+                overlay.showPage()
+                layout.append(index)
+
+                # Repeat the session page until the whole log is written
+                if index != session_page or next_row is None:
+                    break
+
+        overlay.save()
+        overlay_pages = PdfReader(overlay_buffer).pages
+
+        writer = PdfWriter()
+        for template_index, overlay_page in zip(layout, overlay_pages):
+            page = writer.add_page(overlay_page)
+            with self._lock:
+                # The form goes under the overlay's text
+                page.merge_page(self.pages[template_index], over=False)
+            page.compress_content_streams()
+        writer.write(output)
+
+    def _draw_fields(self, overlay, page_index, values):
+        overlay.setPageSize(self.page_sizes[page_index])
+        for name, field in self.fields.items():
+            if field.get('page', 0) != page_index or name not in values:
+                continue
+            overlay.setFont(field.get('font', 'Helvetica'), field.get('size', 10))
+            overlay.drawString(field['x'], field['y'], values[name])
+
+    def _draw_sessions(self, overlay, page_rows):
+        spec = self.sessions
+        columns = spec['columns']
+        overlay.setFont(spec.get('font', 'Helvetica'), spec.get('size', 8))
+
+        y = spec['first_row_y']
+        for row in page_rows:
+            for name, text in zip(SESSION_COLUMNS, row):
+                if name in columns:
+                    overlay.drawString(columns[name], y, text)
+            y -= spec['row_height']
+
+
+def _load_state_form(state):
+    spec_path = get_state_form_dir() / f"{state}.json"
+    if not spec_path.exists():
+        return None
+
+    try:
+        import pypdf  # noqa: F401
+    except ImportError:
+        logger.warning("pypdf is not installed; using the generic report for %s", state)
+        return None
+
+    with open(spec_path) as spec_file:
+        spec = json.load(spec_file)
+    template_bytes = (spec_path.parent / spec.get('template', f"{state}.pdf")).read_bytes()
+    return StateForm(state, spec, template_bytes)
+
+
+def get_state_form(state):
+    """
+    The configured form of a state, loaded and parsed on first use
+
+    Args:
+        state: two letter state code, e.g. 'AZ'
+
+    Returns:
+        StateForm, or None when the state has no usable form
+    """
+    if not state:
+        return None
+    state = state.upper()
+
+    with _forms_lock:
+        if state not in _forms:
+            try:
+                _forms[state] = _load_state_form(state)
+            except Exception:
+                logger.exception("Could not load the %s state form", state)
+                _forms[state] = None
+        return _forms[state]
+
+
+def form_field_values(student, parent_profile, ledger, as_of):
+    """
+    Text of the single value fields of a state form
+    """
+    return {
+        'student_name': f"{student.first_name} {student.last_name}",
+        'student_first_name': student.first_name,
+        'student_last_name': student.last_name,
+        'permit_number': student.permit_number or '',
+        'day_hours': f"{ledger.approved_day_minutes / 60:.2f}",
+        'night_hours': f"{ledger.approved_night_minutes / 60:.2f}",
+        'total_hours': f"{ledger.approved_total_minutes / 60:.2f}",
+        'session_count': str(ledger.approved_session_count),
+        'parent_name': parent_profile.user.get_full_name(),
+        'report_date': as_of.strftime('%m/%d/%Y'),
+    }
@@ -0,0 +1,149 @@
+"""
+Service for recomputing the derived Trip columns in bulk
+
+Trip.save() recomputes duration, day/night minutes and is_night for a single
+row. This module does the same for ranges of trips, ordered by trip_id, using
+the vectorized night-time engine and a single executemany UPDATE per chunk.
+"""
+import json
+import os
+
+from django.db import connection, transaction
+
+from student.models.driving_sessions import Trip
+from student.services.hours_ledger_service import rebuild_ledgers
+from student.services.night_time_service import split_night_minutes_batch
+
+DERIVED_FIELDS = ['duration', 'day_minutes', 'night_minutes', 'is_night']
+
+
+def completed_trips():
+    """
+    Trips that have both a start and an end time (derived fields apply)
+    """
+    return Trip.objects.filter(start_time__isnull=False, end_time__isnull=False)
+
+
+def next_chunk_bound(after, chunk_size):
+    """
+    Find the last trip_id of the chunk that starts after the given trip_id
+
+    Args:
+        after: trip_id the previous chunk ended on, or None to start at the beginning
+        chunk_size: number of trips per chunk
+
+    Returns:
+        tuple: (upper trip_id or None when this is the last chunk, has_rows)
+    """
+    trips = completed_trips()
+    if after is not None:
+        trips = trips.filter(trip_id__gt=after)
+
+    trip_ids = list(trips.order_by('trip_id').values_list('trip_id', flat=True)[chunk_size - 1:chunk_size])
+    if trip_ids:
+        return trip_ids[0], True
+
+    return None, trips.exists()
+
+
+def _write_derived_fields(changed):
+    """
+    Write (duration, day_minutes, night_minutes, is_night, trip_id) tuples.
+
+    QuerySet.bulk_update builds a CASE expression per row and field, which
+    costs more than the night-time calculation itself; a parameterised
+    executemany UPDATE does the same work in a fraction of the time.
+    """
+    meta = Trip._meta
+    quote = connection.ops.quote_name
+    assignments = ', '.join(f'{quote(meta.get_field(name).column)} = %s' for name in DERIVED_FIELDS)
+    sql = f'UPDATE {quote(meta.db_table)} SET {assignments} WHERE {quote(meta.pk.column)} = %s'
+
+    params = [
+        (*values, meta.pk.get_db_prep_value(trip_id, connection))
+        for *values, trip_id in changed
+    ]
+    with connection.cursor() as cursor:
+        cursor.executemany(sql, params)
+
+
+def recompute_trip_range(lower=None, upper=None):
+    """
+    Recompute the derived columns for trips with lower < trip_id <= upper
+
+    Only rows whose values actually change are written. The ledgers of the
+    students touched are rebuilt in the same transaction, since the bulk
+    write does not send the save signals that normally keep them current.
+
+    Args:
+        lower: exclusive trip_id lower bound, or None
+        upper: inclusive trip_id upper bound, or None
+
+    Returns:
+        tuple: (trips scanned, trips updated)
+    """
+    trips = completed_trips()
+    if lower is not None:
+        trips = trips.filter(trip_id__gt=lower)
+    if upper is not None:
+        trips = trips.filter(trip_id__lte=upper)
+
+    rows = list(trips.order_by('trip_id').values_list(
+        'trip_id', 'student_id', 'start_time', 'end_time', *DERIVED_FIELDS
+    ))
+    if not rows:
+        return 0, 0
+
+    day_minutes, night_minutes = split_night_minutes_batch(
+        [row[2] for row in rows],
+        [row[3] for row in rows],
+    )
+
+    changed = []
+    student_ids = set()
+    for row, day, night in zip(rows, day_minutes.tolist(), night_minutes.tolist()):
+        trip_id, student_id, _, _, duration, old_day, old_night, is_night = row
+        if (duration, old_day, old_night, is_night) == (day + night, day, night, night > 0):
+            continue
+        changed.append((day + night, day, night, night > 0, trip_id))
+        student_ids.add(student_id)
+
+    if changed:
+        with transaction.atomic():
+            _write_derived_fields(changed)
+            rebuild_ledgers(student_ids)
+
+    return len(rows), len(changed)
+
+
+# ============================================
+# CHECKPOINTS
+# ============================================
+
+def load_checkpoint(path):
+    """
+    Read a checkpoint file
+
+    Returns:
+        dict: {'last_trip_id': str or None, 'scanned': int, 'updated': int}
+    """
+    if not os.path.exists(path):
+        return {'last_trip_id': None, 'scanned': 0, 'updated': 0}
+
+    with open(path) as checkpoint_file:
+        return json.load(checkpoint_file)
+
+
+def save_checkpoint(path, checkpoint):
+    """
+    Atomically replace the checkpoint file so a kill never leaves it half written
+    """
+    temp_path = f'{path}.tmp'
+    with open(temp_path, 'w') as checkpoint_file:
+        json.dump(checkpoint, checkpoint_file)
+    os.replace(temp_path, path)
+
+
+def clear_checkpoint(path):
+    if os.path.exists(path):
+        os.remove(path)
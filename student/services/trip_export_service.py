@@ -0,0 +1,160 @@
+"""
+Service for exporting raw trip data as CSV or JSON Lines
+
+Exports are streamed: rows are read with a server side iterator() in chunks
+and each chunk is encoded and handed to the response as soon as it is read,
+so the download starts at once and memory stays flat however many trips
+there are.
+"""
+import csv
+import json
+
+from django.utils import timezone
+
+from student.models.driving_sessions import Trip
+
+TRIP_EXPORT_COLUMNS = (
+    'trip_id',
+    'student_id',
+    'student_name',
+    'start_time',
+    'end_time',
+    'duration',
+    'day_minutes',
+    'night_minutes',
+    'is_night',
+    'is_approved',
+    'parent_name',
+    'approved_by',
+)
+
+_TRIP_EXPORT_FIELDS = (
+    'trip_id',
+    'student_id',
+    'student__first_name',
+    'student__last_name',
+    'start_time',
+    'end_time',
+    'duration',
+    'day_minutes',
+    'night_minutes',
+    'is_night',
+    'is_approved',
+    'parent__user__first_name',
+    'parent__user__last_name',
+    'parent__user__email',
+)
+
+
+def get_export_trips(student_ids):
+    """
+    Completed trips of some students, in a stable order the indexes can serve
+
+    Args:
+        student_ids: iterable of StudentProfile ids
+
+    Returns:
+        QuerySet of Trip
+    """
+    return Trip.objects.filter(
+        student_id__in=student_ids,
+        is_active=False,
+        start_time__isnull=False,
+    ).order_by('student_id', 'start_time', 'trip_id')
+
+
+def iter_trip_export_rows(trips, chunk_size=1000):
+    """
+    Stream trips as export rows
+
+    The student and parent names are joined into the same query, so no Trip
+    or related instances are built and the query count stays constant.
+
+    Args:
+        trips: QuerySet of Trip objects, already filtered and ordered
+        chunk_size: rows fetched from the database at a time
+
+    Yields:
+        dict: TRIP_EXPORT_COLUMNS -> value, times as ISO 8601 in the current time zone
+    """
+    rows = trips.values_list(*_TRIP_EXPORT_FIELDS).iterator(chunk_size=chunk_size)
+    for (trip_id, student_id, student_first_name, student_last_name, start_time, end_time, duration,
+         day_minutes, night_minutes, is_night, is_approved, parent_first_name, parent_last_name,
+         parent_email) in rows:
+        parent_name = f"{parent_first_name} {parent_last_name}".strip() or parent_email
+        yield {
+            'trip_id': str(trip_id),
+            'student_id': student_id,
+            'student_name': f"{student_first_name} {student_last_name}".strip(),
+            'start_time': timezone.localtime(start_time).isoformat(),
+            'end_time': timezone.localtime(end_time).isoformat() if end_time else None,
+            'duration': duration,
+            'day_minutes': day_minutes,
+            'night_minutes': night_minutes,
+            'is_night': is_night,
+            'is_approved': is_approved,
+            'parent_name': parent_name,
+            # The parent who logged a trip is the one who approves it
+            'approved_by': parent_name if is_approved else None,
+        }
+
+
+class _LineBuffer:
+    '''
+    Write-only file object that collects what csv.writer wrote so far.
+    '''
+
+    def __init__(self):
+        self._lines = []
+
+    def write(self, line):
+        self._lines.append(line)
+
+    def take(self):
+        data = ''.join(self._lines)
+        self._lines = []
+        return data
+
+
+def iter_trips_csv(trips, chunk_size=1000):
+    """
+    Stream trips as CSV, header row first
+
+    Yields:
+        str: the header, then one piece per chunk of rows
+    """
+    buffer = _LineBuffer()
+    writer = csv.DictWriter(buffer, fieldnames=TRIP_EXPORT_COLUMNS)
+    writer.writeheader()
+    # Sent before the first query so the download starts immediately
+    yield buffer.take()
+
+    for count, row in enumerate(iter_trip_export_rows(trips, chunk_size), 1):
+        writer.writerow(row)
+        if count % chunk_size == 0:
+            yield buffer.take()
+    yield buffer.take()
+
+
+def iter_trips_jsonl(trips, chunk_size=1000):
+    """
+    Stream trips as JSON Lines, one object per trip
+
+    Yields:
+        str: one piece per chunk of rows
+    """
+    lines = []
+    for count, row in enumerate(iter_trip_export_rows(trips, chunk_size), 1):
+        lines.append(json.dumps(row) + '\n')
+        # The first row goes out on its own so the download starts right away
+        if count == 1 or len(lines) == chunk_size:
+            yield ''.join(lines)
+            lines = []
+    yield ''.join(lines)
+
+
+# Export format (also the file extension) -> (content type, encoder)
+TRIP_EXPORT_FORMATS = {
+    'csv': ('text/csv; charset=utf-8', iter_trips_csv),
+    'jsonl': ('application/x-ndjson; charset=utf-8', iter_trips_jsonl),
+}
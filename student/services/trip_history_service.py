@@ -0,0 +1,147 @@
+"""
+Service for paging through a student's trip history
+
+Pages are keyset (cursor) based on (start_time, trip_id), newest first, so
+fetching any page costs the same no matter how long the history is.
+"""
+import base64
+import uuid
+from datetime import datetime, timedelta
+
+from django.conf import settings
+from django.db.models import Q
+from django.utils import timezone
+from django.utils.dateparse import parse_date, parse_datetime
+
+from student.models.driving_sessions import Trip
+
+TRIP_TYPES = ('day', 'night')
+
+
+def encode_cursor(trip):
+    """
+    Build the opaque cursor that points just past the given trip
+    """
+    raw = f"{trip.start_time.isoformat()}|{trip.trip_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    """
+    Returns:
+        tuple: (start_time, trip_id)
+
+    Raises:
+        ValueError: if the cursor is malformed
+    """
+    try:
+        padded = cursor + '=' * (-len(cursor) % 4)
+        start_time, trip_id = base64.urlsafe_b64decode(padded.encode()).decode().split('|')
+        trip_id = uuid.UUID(trip_id)
+    except (ValueError, UnicodeDecodeError):
+        raise ValueError("Invalid cursor.")
+
+    start_time = parse_datetime(start_time)
+    if start_time is None:
+        raise ValueError("Invalid cursor.")
+
+    return start_time, trip_id
+
+
+def parse_trip_filters(params):
+    """
+    Read the history filters from request GET parameters
+
+    Args:
+        params: QueryDict with optional start_date, end_date (YYYY-MM-DD) and type (day/night)
+
+    Returns:
+        dict: start_date, end_date and trip_type (None when not given)
+
+    Raises:
+        ValueError: if a value can't be parsed
+    """
+    filters = {'start_date': None, 'end_date': None, 'trip_type': None}
+
+    for name in ('start_date', 'end_date'):
+        value = params.get(name, '').strip()
+        if value:
+            filters[name] = parse_date(value)
+            if filters[name] is None:
+                raise ValueError(f"Invalid {name.replace('_', ' ')}: {value}")
+
+    trip_type = params.get('type', '').strip().lower()
+    if trip_type:
+        if trip_type not in TRIP_TYPES:
+            raise ValueError(f"Invalid session type: {trip_type}")
+        filters['trip_type'] = trip_type
+
+    return filters
+
+
+def _local_midnight(day):
+    return timezone.make_aware(datetime.combine(day, datetime.min.time()))
+
+
+def filter_trips(trips, start_date=None, end_date=None, trip_type=None):
+    """
+    Apply the history filters (see parse_trip_filters) to a Trip queryset
+    """
+    if start_date:
+        trips = trips.filter(start_time__gte=_local_midnight(start_date))
+    if end_date:
+        trips = trips.filter(start_time__lt=_local_midnight(end_date + timedelta(days=1)))
+    if trip_type:
+        trips = trips.filter(is_night=(trip_type == 'night'))
+    return trips
+
+
+def get_trip_page(student, cursor=None, start_date=None, end_date=None, trip_type=None, page_size=None):
+    """
+    Fetch one page of a student's trips, newest first
+
+    Args:
+        student: StudentProfile object
+        cursor: cursor from the previous page, or None for the first page
+        start_date: only trips starting on or after this local date
+        end_date: only trips starting on or before this local date
+        trip_type: 'day' or 'night'
+        page_size: trips per page (defaults to settings.TRIP_HISTORY_PAGE_SIZE)
+
+    Returns:
+        tuple: (list of Trip, cursor for the next page or None)
+    """
+    page_size = page_size or getattr(settings, 'TRIP_HISTORY_PAGE_SIZE', 25)
+
+    trips = filter_trips(Trip.objects.filter(student=student, start_time__isnull=False), start_date, end_date, trip_type)
+
+    if cursor:
+        start_time, trip_id = decode_cursor(cursor)
+        # The start_time__lte bound lets the index range scan; the OR breaks ties on trip_id
+        trips = trips.filter(start_time__lte=start_time).filter(
+            Q(start_time__lt=start_time) | Q(trip_id__lt=trip_id)
+        )
+
+    page = list(trips.order_by('-start_time', '-trip_id')[:page_size + 1])
+    if len(page) > page_size:
+        page = page[:page_size]
+        return page, encode_cursor(page[-1])
+
+    return page, None
+
+
+def serialize_trip(trip):
+    """
+    Plain dict of a trip for the JSON history endpoint
+    """
+    return {
+        'trip_id': str(trip.trip_id),
+        'start_time': trip.start_time.isoformat() if trip.start_time else None,
+        'end_time': trip.end_time.isoformat() if trip.end_time else None,
+        'duration': trip.duration,
+        'day_minutes': trip.day_minutes,
+        'night_minutes': trip.night_minutes,
+        'is_night': trip.is_night,
+        'is_approved': trip.is_approved,
+        'is_active': trip.is_active,
+    }
@@ -1,3 +1,893 @@
-from django.test import TestCase
+import csv
+import json
+import os
+import shutil
+import tempfile
+import zipfile
+from concurrent.futures import Future
+from copy import copy
+from datetime import datetime, timedelta, timezone as dt_timezone
+from io import BytesIO, StringIO
+from pathlib import Path
+from unittest import mock
 
-# Create your tests here.
+from django.conf import settings
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection
+from django.test import TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import reverse
+from django.utils import timezone
+from pypdf import PdfReader
+from reportlab.platypus import SimpleDocTemplate, Spacer
+
+from core.models.custom_user import AccountUser
+from parent.models.parent_profile import ParentProfile
+from parent.models.parent_student_relationship import ParentStudentRelationship
+from student.models.driving_sessions import Trip
+from student.models.pdf_export_job import PdfExportJob
+from student.models.student_hours_ledger import StudentHoursLedger
+from student.models.student_profile import StudentProfile
+from student.services.export_job_service import _claim_job, run_export_job
+from student.services.hours_ledger_service import get_student_ledger, verify_ledgers
+from student.services import bulk_export_service, pdf_export_service, state_form_service
+from student.services.night_time_service import split_night_minutes, split_night_minutes_batch
+from student.services.report_template_service import PAGE_MARGIN, PAGE_SIZE, PagedTable, ReportTemplate
+from student.services.report_cache_service import get_cached_report, report_fingerprint, report_path, write_report
+from student.services.trip_backfill_service import save_checkpoint
+from student.services.trip_export_service import TRIP_EXPORT_COLUMNS, get_export_trips, iter_trips_csv
+from student.services.trip_history_service import get_trip_page
+
+
+def temporary_report_cache(test):
+    '''
+    Point REPORT_CACHE_DIR at a new directory for one test, and empty the cache.
+    '''
+    directory = tempfile.TemporaryDirectory()
+    test.addCleanup(directory.cleanup)
+    cache_dir = Path(directory.name) / 'reports'
+    settings_override = override_settings(REPORT_CACHE_DIR=cache_dir)
+    settings_override.enable()
+    test.addCleanup(settings_override.disable)
+    cache.clear()
+    return cache_dir
+
+
+class TripIndexTests(TestCase):
+    '''
+    Make sure the SQLite query planner picks the Trip indexes for the hot queries.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        user = AccountUser.objects.create_user(email='parent@example.com', password='password', user_type='PARENT')
+        cls.parent = ParentProfile.objects.get(user=user)
+        cls.students = [
+            StudentProfile.objects.create(first_name='Student', last_name=str(number))
+            for number in range(3)
+        ]
+
+        start = timezone.now() - timedelta(days=200)
+        trips = []
+        for day in range(200):
+            for student in cls.students:
+                trip_start = start + timedelta(days=day)
+                trips.append(Trip(
+                    parent=cls.parent,
+                    student=student,
+                    start_time=trip_start,
+                    end_time=trip_start + timedelta(minutes=45),
+                    is_approved=day % 2 == 0,
+                ))
+        Trip.objects.bulk_create(trips)
+
+    def assertUsesIndex(self, queryset, index_name):
+        plan = queryset.explain()
+        self.assertIn(index_name, plan)
+        self.assertNotIn('USE TEMP B-TREE FOR ORDER BY', plan)
+
+    def test_approved_trips_for_student(self):
+        queryset = Trip.objects.filter(
+            student=self.students[0],
+            is_approved=True,
+            is_active=False,
+        ).order_by('start_time', 'trip_id')
+        self.assertUsesIndex(queryset, 'trip_student_approved_idx')
+
+    def test_active_trip_for_student_and_parent(self):
+        queryset = Trip.objects.filter(
+            student=self.students[0],
+            parent=self.parent,
+            is_active=True,
+        )
+        self.assertUsesIndex(queryset, 'trip_one_active_per_student_parent')
+
+    def test_active_trip_for_student(self):
+        queryset = Trip.objects.filter(student=self.students[0], is_active=True)
+        self.assertUsesIndex(queryset, 'trip_one_active_per_student_parent')
+
+    def test_recent_trips_for_parent(self):
+        queryset = Trip.objects.filter(
+            parent=self.parent,
+            student__in=self.students,
+        ).order_by('-start_time')[:10]
+        self.assertUsesIndex(queryset, 'trip_parent_start_idx')
+
+    def test_trip_history_page(self):
+        newest = Trip.objects.filter(student=self.students[0]).order_by('-start_time').first()
+        queryset = Trip.objects.filter(
+            student=self.students[0],
+            start_time__isnull=False,
+            start_time__lte=newest.start_time,
+        ).order_by('-start_time', '-trip_id')[:26]
+        self.assertUsesIndex(queryset, 'trip_student_history_idx')
+
+
+class HoursLedgerTests(TestCase):
+    '''
+    Make sure the ledger stays in step with the Trip table as trips change.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        user = AccountUser.objects.create_user(email='parent@example.com', password='password', user_type='PARENT')
+        cls.parent = ParentProfile.objects.get(user=user)
+        cls.student = StudentProfile.objects.create(first_name='Student', last_name='Ledger')
+
+    def setUp(self):
+        get_student_ledger(self.student)
+        self.start = timezone.make_aware(datetime(2026, 6, 1, 10, 0))
+
+    def log_trip(self, minutes, **kwargs):
+        return Trip.objects.create(
+            parent=self.parent,
+            student=self.student,
+            start_time=self.start,
+            end_time=self.start + timedelta(minutes=minutes),
+            **kwargs,
+        )
+
+    def assertLedger(self, **expected):
+        self.assertEqual(verify_ledgers([self.student.id]), [])
+        ledger = StudentHoursLedger.objects.get(student=self.student)
+        for field, value in expected.items():
+            self.assertEqual(getattr(ledger, field), value, field)
+
+    def test_new_trip_is_pending(self):
+        self.log_trip(45)
+        self.assertLedger(pending_total_minutes=45, pending_session_count=1, approved_total_minutes=0)
+
+    def test_approving_moves_the_trip(self):
+        trip = self.log_trip(45)
+        trip.is_approved = True
+        trip.save()
+        self.assertLedger(pending_total_minutes=0, approved_total_minutes=45, approved_session_count=1)
+
+    def test_editing_an_approved_trip(self):
+        trip = self.log_trip(45, is_approved=True)
+        version = StudentHoursLedger.objects.get(student=self.student).approved_rewrite_version
+        trip.end_time = self.start + timedelta(minutes=90)
+        trip.save()
+        self.assertLedger(approved_total_minutes=90, approved_rewrite_version=version + 1)
+
+    def test_deleting_a_trip(self):
+        self.log_trip(30, is_approved=True)
+        self.log_trip(45).delete()
+        self.assertLedger(pending_total_minutes=0, pending_session_count=0, approved_total_minutes=30)
+
+    def test_active_trip_does_not_count(self):
+        trip = self.log_trip(45, is_active=True)
+        self.assertLedger(pending_session_count=0)
+        trip.is_active = False
+        trip.save()
+        self.assertLedger(pending_session_count=1, pending_total_minutes=45)
+
+    def test_missing_ledger_is_a_mismatch(self):
+        self.log_trip(45)
+        StudentHoursLedger.objects.filter(student=self.student).delete()
+        mismatches = verify_ledgers([self.student.id])
+        self.assertIn((self.student.id, 'pending_total_minutes', 45, None), mismatches)
+
+
+class NightTimeTests(TestCase):
+    '''
+    Compare the night split against counting the trip minute by minute.
+    '''
+
+    def count_minutes(self, start, end):
+        night_start, night_end = settings.NIGHT_START, settings.NIGHT_END
+        day = night = 0
+        minute = start.astimezone(dt_timezone.utc)
+        end = end.astimezone(dt_timezone.utc)
+        while minute + timedelta(minutes=1) <= end:
+            local = timezone.localtime(minute).time()
+            if night_start > night_end:
+                is_night = local >= night_start or local < night_end
+            else:
+                is_night = night_start <= local < night_end
+            if is_night:
+                night += 1
+            else:
+                day += 1
+            minute += timedelta(minutes=1)
+        return day, night
+
+    def assertSplit(self, start, minutes):
+        start = timezone.make_aware(start)
+        end = start + timedelta(minutes=minutes)
+        expected = self.count_minutes(start, end)
+        self.assertEqual(split_night_minutes(start, end), expected)
+        day, night = split_night_minutes_batch([start], [end])
+        self.assertEqual((day[0], night[0]), expected)
+
+    def test_daytime(self):
+        self.assertSplit(datetime(2026, 6, 1, 10, 0), 90)
+
+    def test_into_the_evening(self):
+        self.assertSplit(datetime(2026, 6, 1, 19, 15), 90)
+
+    def test_across_midnight(self):
+        self.assertSplit(datetime(2026, 6, 1, 23, 30), 60)
+
+    def test_night_into_morning(self):
+        self.assertSplit(datetime(2026, 6, 2, 4, 20), 75)
+
+    def test_spring_forward(self):
+        # Clocks go from 2:00 to 3:00 AM in Denver on 8 March 2026
+        self.assertSplit(datetime(2026, 3, 8, 1, 0), 240)
+
+    def test_fall_back(self):
+        # Clocks go from 2:00 back to 1:00 AM in Denver on 1 November 2026
+        self.assertSplit(datetime(2026, 10, 31, 23, 0), 420)
+
+    def test_several_days(self):
+        self.assertSplit(datetime(2026, 3, 6, 18, 7), 3 * 24 * 60 + 13)
+
+
+class TripBackfillTests(TestCase):
+    '''
+    Make sure the backfill command repairs derived trip fields and resumes from its checkpoint.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        user = AccountUser.objects.create_user(email='parent@example.com', password='password', user_type='PARENT')
+        cls.parent = ParentProfile.objects.get(user=user)
+        cls.student = StudentProfile.objects.create(first_name='Student', last_name='Backfill')
+
+        start = timezone.make_aware(datetime(2026, 6, 1, 18, 0))
+        for day in range(6):
+            trip_start = start + timedelta(days=day)
+            Trip.objects.create(
+                parent=cls.parent,
+                student=cls.student,
+                start_time=trip_start,
+                end_time=trip_start + timedelta(minutes=180),
+                is_approved=True,
+            )
+
+    def setUp(self):
+        get_student_ledger(self.student)
+        # Derived fields written by an older release that got them wrong
+        Trip.objects.update(duration=180, day_minutes=180, night_minutes=0, is_night=False)
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.checkpoint = os.path.join(directory.name, 'checkpoint.json')
+
+    def backfill(self, **options):
+        call_command('backfill_trip_fields', checkpoint=self.checkpoint, chunk_size=2, stdout=StringIO(), **options)
+
+    def test_backfill(self):
+        self.backfill()
+        self.assertFalse(Trip.objects.exclude(day_minutes=120, night_minutes=60, is_night=True).exists())
+        self.assertEqual(verify_ledgers([self.student.id]), [])
+        self.assertEqual(StudentHoursLedger.objects.get(student=self.student).approved_night_minutes, 6 * 60)
+        self.assertFalse(os.path.exists(self.checkpoint))
+
+    def test_resumes_after_the_checkpoint(self):
+        trip_ids = list(Trip.objects.order_by('trip_id').values_list('trip_id', flat=True))
+        save_checkpoint(self.checkpoint, {'last_trip_id': str(trip_ids[3]), 'scanned': 4, 'updated': 4})
+        self.backfill()
+        self.assertEqual(Trip.objects.filter(trip_id__in=trip_ids[:4], night_minutes=0).count(), 4)
+        self.assertEqual(Trip.objects.filter(trip_id__in=trip_ids[4:], night_minutes=60).count(), 2)
+
+
+@override_settings(STATE_FORM_DIR=Path(__file__).resolve().parent / 'fixtures' / 'state_forms')
+class StateFormTests(TestCase):
+    '''
+    Fill in the sample state form shipped in fixtures/state_forms.
+    '''
+
+    def setUp(self):
+        state_form_service._forms.clear()
+        self.addCleanup(state_form_service._forms.clear)
+
+    def test_unknown_state_has_no_form(self):
+        self.assertIsNone(state_form_service.get_state_form('XX'))
+
+    def test_fill_in_form(self):
+        form = state_form_service.get_state_form('zz')
+        rows = [('06/01/2026', '10:00 AM', '10:45 AM', f'{number} min', 'Day', 'Pat Lee') for number in range(60)]
+        output = BytesIO()
+        form.render({'student_name': 'Ann Lee', 'total_hours': '45.00'}, rows, output)
+
+        pages = [page.extract_text() for page in PdfReader(output).pages]
+        # The session page repeats until all 60 rows fit, 25 to a page
+        self.assertEqual(len(pages), 4)
+        self.assertIn('SAMPLE STATE SUPERVISED DRIVING LOG', pages[0])
+        self.assertIn('Ann Lee', pages[0])
+        self.assertIn('45.00', pages[0])
+        for page, (first, last) in zip(pages[1:], [(0, 24), (25, 49), (50, 59)]):
+            self.assertIn('SESSION LOG', page)
+            self.assertIn(f'{first} min', page)
+            self.assertIn(f'{last} min', page)
+            self.assertNotIn(f'{last + 1} min', page)
+
+
+class ReportReuseTests(TestCase):
+    '''
+    A report that reuses the previous one's pages reads the same as one rendered from scratch.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        user = AccountUser.objects.create_user(
+            email='parent@example.com', password='password', user_type='PARENT', first_name='Pat', last_name='Lee',
+        )
+        cls.parent = ParentProfile.objects.select_related('user').get(user=user)
+        cls.student = StudentProfile.objects.create(first_name='Student', last_name='Report')
+        cls.start = timezone.make_aware(datetime(2026, 1, 1, 10, 0))
+        for day in range(120):
+            cls.log_trip(day)
+
+    @classmethod
+    def log_trip(cls, day):
+        trip_start = cls.start + timedelta(days=day)
+        Trip.objects.create(
+            parent=cls.parent,
+            student=cls.student,
+            start_time=trip_start,
+            end_time=trip_start + timedelta(minutes=45),
+            is_approved=True,
+        )
+
+    def setUp(self):
+        self.cache_dir = temporary_report_cache(self)
+
+    def render(self):
+        ledger = get_student_ledger(self.student)
+        fingerprint = report_fingerprint(self.student, self.parent, ledger)
+        return pdf_export_service.render_cached_report(self.student, self.parent, ledger, fingerprint)
+
+    def render_update(self):
+        '''
+        Render the report again, returning its pages, whether the previous one's pages were reused,
+        and how many session rows were laid out.
+        '''
+        reused = []
+        laid_out = []
+        reuse_report = pdf_export_service._reuse_report
+        build_report = pdf_export_service._build_report
+
+        def reuse(*args):
+            page_row_counts = reuse_report(*args)
+            reused.append(page_row_counts is not None)
+            return page_row_counts
+
+        def build(*args):
+            page_row_counts = build_report(*args)
+            laid_out.append(sum(page_row_counts))
+            return page_row_counts
+
+        with mock.patch.object(pdf_export_service, '_reuse_report', side_effect=reuse), \
+                mock.patch.object(pdf_export_service, '_build_report', side_effect=build):
+            pages = [page.extract_text() for page in PdfReader(self.render()).pages]
+        return pages, reused == [True], sum(laid_out)
+
+    def render_from_scratch(self):
+        shutil.rmtree(self.cache_dir)
+        return [page.extract_text() for page in PdfReader(self.render()).pages]
+
+    def test_reused_pages_match_full_render(self):
+        self.render()
+        # Two new trips starting together; trip_id keeps their order
+        self.log_trip(200)
+        self.log_trip(200)
+        pages, reused, laid_out = self.render_update()
+        self.assertTrue(reused)
+        self.assertGreater(len(pages), 3)
+        # Only the first page and the end of the log were laid out again
+        self.assertLess(laid_out, 122 / 2)
+        self.assertRegex(pages[0], r'Total Sessions:\s+122')
+        self.assertEqual(pages, self.render_from_scratch())
+
+    def test_repeated_updates_match_full_render(self):
+        self.render()
+        for day in range(200, 203):
+            self.log_trip(day)
+            pages, reused, laid_out = self.render_update()
+            self.assertTrue(reused)
+        self.assertEqual(pages, self.render_from_scratch())
+
+    def test_trip_among_printed_ones_renders_from_scratch(self):
+        self.render()
+        self.log_trip(119)
+        pages, reused, laid_out = self.render_update()
+        self.assertFalse(reused)
+        self.assertEqual(laid_out, 121)
+        self.assertEqual(pages, self.render_from_scratch())
+
+
+class TripHistoryTests(TestCase):
+    '''
+    Keyset pages list every trip once, newest first, even when start times tie.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AccountUser.objects.create_user(email='parent@example.com', password='password', user_type='PARENT')
+        cls.parent = ParentProfile.objects.get(user=cls.user)
+        cls.student = StudentProfile.objects.create(first_name='Student', last_name='History')
+        ParentStudentRelationship.objects.create(parent=cls.parent, student=cls.student)
+        start = timezone.make_aware(datetime(2026, 6, 1, 10, 0))
+        # Seven trips start together, so pages have to break ties on trip_id
+        for offset in [0] * 7 + [1, 2, 3]:
+            trip_start = start + timedelta(days=offset)
+            Trip.objects.create(
+                parent=cls.parent,
+                student=cls.student,
+                start_time=trip_start,
+                end_time=trip_start + timedelta(minutes=30),
+            )
+
+    def setUp(self):
+        cache.clear()
+
+    def test_pages_list_every_trip_once(self):
+        seen = []
+        cursor = None
+        while True:
+            trips, cursor = get_trip_page(self.student, cursor=cursor, page_size=3)
+            seen += [trip.trip_id for trip in trips]
+            if cursor is None:
+                break
+        expected = Trip.objects.filter(student=self.student).order_by('-start_time', '-trip_id')
+        self.assertEqual(seen, list(expected.values_list('trip_id', flat=True)))
+
+    def test_bad_cursor_is_rejected(self):
+        with self.assertRaises(ValueError):
+            get_trip_page(self.student, cursor='not-a-cursor')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('student_trip_history', args=[self.student.id]), {'cursor': 'not-a-cursor'})
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(response.json(), {'error': 'Invalid cursor.'})
+
+    @override_settings(TRIP_HISTORY_PAGE_SIZE=4)
+    def test_json_pages(self):
+        self.client.force_login(self.user)
+        url = reverse('student_trip_history', args=[self.student.id])
+        first = self.client.get(url).json()
+        second = self.client.get(url, {'cursor': first['next_cursor']}).json()
+        self.assertEqual((len(first['trips']), len(second['trips'])), (4, 4))
+        self.assertFalse({trip['trip_id'] for trip in first['trips']} & {trip['trip_id'] for trip in second['trips']})
+
+    def test_other_parents_student_is_not_found(self):
+        other = AccountUser.objects.create_user(email='other@example.com', password='password', user_type='PARENT')
+        self.client.force_login(other)
+        response = self.client.get(reverse('student_trip_history', args=[self.student.id]))
+        self.assertEqual(response.status_code, 404)
+
+
+class SessionRowQueryTests(TestCase):
+    '''
+    The session log costs the same number of queries however many trips and approvers it has.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.student = StudentProfile.objects.create(first_name='Student', last_name='Queries')
+        cls.parents = []
+        for number in range(3):
+            user = AccountUser.objects.create_user(
+                email=f'parent{number}@example.com', password='password', user_type='PARENT', first_name=f'Parent{number}',
+            )
+            cls.parents.append(ParentProfile.objects.select_related('user').get(user=user))
+        cls.start = timezone.make_aware(datetime(2026, 6, 1, 10, 0))
+
+    def log_trips(self, count):
+        for number in range(count):
+            trip_start = self.start + timedelta(days=number)
+            Trip.objects.create(
+                parent=self.parents[number % len(self.parents)],
+                student=self.student,
+                start_time=trip_start,
+                end_time=trip_start + timedelta(minutes=45),
+                is_approved=True,
+            )
+        return Trip.objects.filter(student=self.student, is_approved=True).order_by('start_time', 'trip_id')
+
+    def report_queries(self, trips):
+        ledger = get_student_ledger(self.student)
+        with CaptureQueriesContext(connection) as queries:
+            pdf_export_service.generate_driving_hours_pdf(self.student, trips, self.parents[0], ledger)
+        return len(queries)
+
+    def test_one_query_for_the_rows(self):
+        trips = self.log_trips(1)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(pdf_export_service.iter_session_rows(trips))), 1)
+        trips = self.log_trips(60)
+        with self.assertNumQueries(1):
+            rows = list(pdf_export_service.iter_session_rows(trips, chunk_size=25))
+        self.assertEqual(len(rows), 61)
+        self.assertEqual({row[4] for row in rows}, {'Parent0', 'Parent1', 'Parent2'})
+
+    def test_report_query_count_is_constant(self):
+        one = self.report_queries(self.log_trips(1))
+        self.assertEqual(self.report_queries(self.log_trips(60)), one)
+
+
+class ReportCacheTests(TestCase):
+    '''
+    Reports are served from the cache until what they are built from changes.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AccountUser.objects.create_user(
+            email='parent@example.com', password='password', user_type='PARENT', first_name='Pat', last_name='Lee',
+        )
+        cls.parent = ParentProfile.objects.get(user=cls.user)
+        cls.student = StudentProfile.objects.create(first_name='Student', last_name='Cache')
+        ParentStudentRelationship.objects.create(parent=cls.parent, student=cls.student)
+        cls.start = timezone.make_aware(datetime(2026, 6, 1, 10, 0))
+        for day in range(3):
+            cls.log_trip(day)
+
+    @classmethod
+    def log_trip(cls, day):
+        trip_start = cls.start + timedelta(days=day)
+        Trip.objects.create(
+            parent=cls.parent,
+            student=cls.student,
+            start_time=trip_start,
+            end_time=trip_start + timedelta(minutes=45),
+            is_approved=True,
+        )
+
+    def setUp(self):
+        self.cache_dir = temporary_report_cache(self)
+        self.client.force_login(self.user)
+        self.url = reverse('export_student_hours_pdf', args=[self.student.id])
+
+    def download(self, **headers):
+        response = self.client.get(self.url, **headers)
+        if response.status_code == 200:
+            response.pdf = b''.join(response.streaming_content)
+        return response
+
+    def test_unchanged_report_is_not_modified(self):
+        etag = self.download()['ETag']
+        with CaptureQueriesContext(connection) as queries:
+            response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+        # Nothing is read from the Trip table to tell the report is current
+        self.assertFalse([query for query in queries if 'student_trip' in query['sql']])
+
+    def test_new_trip_changes_the_report(self):
+        etag = self.download()['ETag']
+        self.log_trip(3)
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response['ETag'], etag)
+        self.assertRegex(PdfReader(BytesIO(response.pdf)).pages[0].extract_text(), r'Total Sessions:\s+4')
+
+    def test_renamed_approver_changes_the_report(self):
+        etag = self.download()['ETag']
+        self.user.last_name = 'Ray'
+        self.user.save()
+        response = self.download(HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertIn('Pat Ray', PdfReader(BytesIO(response.pdf)).pages[0].extract_text())
+
+    @override_settings(REPORT_CACHE_MAX_BYTES=250)
+    def test_least_recently_used_reports_are_evicted(self):
+        for number, fingerprint in enumerate(['a', 'b', 'c']):
+            with write_report(fingerprint) as output:
+                output.write(b'%' * 100)
+            os.utime(report_path(fingerprint), (1000 + number, 1000 + number))
+        # 'a' was evicted to fit 'c'; reading 'b' makes 'c' the least recently used
+        self.assertIsNone(get_cached_report('a'))
+        self.assertIsNotNone(get_cached_report('b'))
+        with write_report('d') as output:
+            output.write(b'%' * 100)
+        self.assertEqual(sorted(path.stem for path in self.cache_dir.glob('*.pdf')), ['b', 'd'])
+
+
+@override_settings(EXPORT_JOB_TRIP_THRESHOLD=2)
+class ExportJobTests(TestCase):
+    '''
+    Reports over the size threshold are rendered by a background job the parent polls.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AccountUser.objects.create_user(email='parent@example.com', password='password', user_type='PARENT')
+        cls.parent = ParentProfile.objects.get(user=cls.user)
+        cls.student = StudentProfile.objects.create(first_name='Student', last_name='Job')
+        ParentStudentRelationship.objects.create(parent=cls.parent, student=cls.student)
+        start = timezone.make_aware(datetime(2026, 6, 1, 10, 0))
+        for day in range(3):
+            trip_start = start + timedelta(days=day)
+            Trip.objects.create(
+                parent=cls.parent,
+                student=cls.student,
+                start_time=trip_start,
+                end_time=trip_start + timedelta(minutes=45),
+                is_approved=True,
+            )
+
+    def setUp(self):
+        self.cache_dir = temporary_report_cache(self)
+        self.client.force_login(self.user)
+
+    def queue_export(self):
+        # The job is handed to the process pool on commit; the tests run it in-process instead
+        with self.captureOnCommitCallbacks() as callbacks:
+            response = self.client.get(reverse('export_student_hours_pdf', args=[self.student.id]))
+        self.assertEqual(len(callbacks), 1)
+        job = PdfExportJob.objects.get()
+        self.assertRedirects(response, reverse('export_job_status', args=[job.job_id]), fetch_redirect_response=False)
+        return job
+
+    def status(self, job):
+        return self.client.get(reverse('export_job_status', args=[job.job_id]), HTTP_ACCEPT='application/json')
+
+    def test_large_report_is_queued(self):
+        job = self.queue_export()
+        self.assertEqual(job.status, 'PENDING')
+        self.assertEqual(list(self.cache_dir.glob('*.pdf')), [])
+
+    @override_settings(EXPORT_JOB_TRIP_THRESHOLD=3)
+    def test_small_report_is_rendered_in_the_request(self):
+        response = self.client.get(reverse('export_student_hours_pdf', args=[self.student.id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertFalse(PdfExportJob.objects.exists())
+
+    def test_job_is_claimed_once(self):
+        job = self.queue_export()
+        self.assertTrue(_claim_job(job.job_id))
+        self.assertFalse(_claim_job(job.job_id))
+        self.assertIsNone(run_export_job(job.job_id))
+
+    def test_status_is_polled_as_json(self):
+        job = self.queue_export()
+        self.assertEqual(self.status(job).json(), {'status': 'PENDING', 'error': '', 'download_url': None})
+        self.assertEqual(run_export_job(job.job_id), 'DONE')
+        self.assertEqual(self.status(job).json()['download_url'], reverse('download_export_job', args=[job.job_id]))
+
+    def test_finished_job_is_downloaded(self):
+        job = self.queue_export()
+        run_export_job(job.job_id)
+        job.refresh_from_db()
+        response = self.client.get(reverse('download_export_job', args=[job.job_id]))
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['ETag'], f'"{job.fingerprint}"')
+        self.assertTrue(b''.join(response.streaming_content).startswith(b'%PDF'))
+
+    def test_other_parents_job_is_not_found(self):
+        job = self.queue_export()
+        run_export_job(job.job_id)
+        other = AccountUser.objects.create_user(email='other@example.com', password='password', user_type='PARENT')
+        self.client.force_login(other)
+        self.assertEqual(self.status(job).status_code, 404)
+        self.assertEqual(self.client.get(reverse('download_export_job', args=[job.job_id])).status_code, 404)
+
+
+class InlineExecutor:
+    '''
+    Runs submitted calls at once, in the test's own database transaction.
+    '''
+
+    def submit(self, func, *args):
+        future = Future()
+        try:
+            future.set_result(func(*args))
+        except Exception as e:
+            future.set_exception(e)
+        return future
+
+
+class BulkExportTests(TestCase):
+    '''
+    The ZIP export holds one report per accessible student with approved sessions.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AccountUser.objects.create_user(email='parent@example.com', password='password', user_type='PARENT')
+        cls.parent = ParentProfile.objects.get(user=cls.user)
+        cls.students = [StudentProfile.objects.create(first_name=name, last_name='Zip') for name in ('Ann', 'Ben', 'Cy')]
+        for student in cls.students:
+            ParentStudentRelationship.objects.create(parent=cls.parent, student=student)
+        # Cy has no approved sessions, and the other parent's student is not the parent's to export
+        other_user = AccountUser.objects.create_user(email='other@example.com', password='password', user_type='PARENT')
+        cls.other_student = StudentProfile.objects.create(first_name='Dee', last_name='Zip')
+        ParentStudentRelationship.objects.create(parent=ParentProfile.objects.get(user=other_user), student=cls.other_student)
+
+        start = timezone.make_aware(datetime(2026, 6, 1, 10, 0))
+        for student, approved in [(cls.students[0], True), (cls.students[1], True), (cls.students[2], False), (cls.other_student, True)]:
+            Trip.objects.create(
+                parent=cls.parent,
+                student=student,
+                start_time=start,
+                end_time=start + timedelta(minutes=45),
+                is_approved=approved,
+            )
+
+    def setUp(self):
+        temporary_report_cache(self)
+        self.client.force_login(self.user)
+        executor = mock.patch.object(bulk_export_service, 'get_executor', return_value=InlineExecutor())
+        executor.start()
+        self.addCleanup(executor.stop)
+
+    def download(self, **params):
+        response = self.client.get(reverse('export_students_zip'), params)
+        self.assertEqual(response.status_code, 200)
+        return zipfile.ZipFile(BytesIO(b''.join(response.streaming_content)))
+
+    def test_one_report_per_student(self):
+        archive = self.download()
+        self.assertIsNone(archive.testzip())
+        self.assertEqual(sorted(archive.namelist()), ['driving_hours_Ann_Zip.pdf', 'driving_hours_Ben_Zip.pdf'])
+        for name in archive.namelist():
+            self.assertRegex(PdfReader(BytesIO(archive.read(name))).pages[0].extract_text(), r'Total Sessions:\s+1')
+
+    def test_other_parents_student_is_refused(self):
+        response = self.client.get(reverse('export_students_zip'), {'student': [self.students[0].id, self.other_student.id]})
+        self.assertEqual(response.status_code, 403)
+
+    def test_failed_report_is_listed_without_details(self):
+        original = bulk_export_service.render_cached_report
+
+        def render(student, *args):
+            if student.first_name == 'Ben':
+                raise OSError('/srv/reports: disk full')
+            return original(student, *args)
+
+        with mock.patch.object(bulk_export_service, 'render_cached_report', side_effect=render), \
+                self.assertLogs('student.services.bulk_export_service', 'ERROR'):
+            archive = self.download()
+        self.assertEqual(archive.namelist(), ['driving_hours_Ann_Zip.pdf', 'errors.txt'])
+        errors = archive.read('errors.txt').decode()
+        self.assertIn(f'Student {self.students[1].id}: the report could not be generated.', errors)
+        self.assertNotIn('disk full', errors)
+
+
+class PagedTableTests(TestCase):
+    '''
+    A long session log is split into one table per page, each with the header.
+    '''
+
+    def setUp(self):
+        self.template = ReportTemplate()
+
+    def paged_table(self, count):
+        rows = ([f'06/{number:04}/2026', '10:00 AM', '10:45 AM', '45', 'Day', 'Pat Lee'] for number in range(count))
+        template = self.template
+        return PagedTable(
+            template.session_header, rows, template.session_col_widths, template.session_table_style,
+            template.session_header_height, template.session_row_height,
+        )
+
+    def build(self, flowables):
+        output = BytesIO()
+        doc = SimpleDocTemplate(
+            output, pagesize=PAGE_SIZE, leftMargin=PAGE_MARGIN, rightMargin=PAGE_MARGIN,
+            topMargin=PAGE_MARGIN, bottomMargin=PAGE_MARGIN,
+        )
+        doc.build(flowables)
+        return [page.extract_text() for page in PdfReader(output).pages]
+
+    def test_header_on_every_page(self):
+        table = self.paged_table(100)
+        pages = self.build([table])
+        self.assertEqual(len(pages), len(table.page_row_counts))
+        self.assertEqual(sum(table.page_row_counts), 100)
+        for page, count in zip(pages, table.page_row_counts):
+            self.assertEqual(page.count('Approved By'), 1)
+            self.assertEqual(page.count('Pat Lee'), count)
+        self.assertIn('06/0099/2026', pages[-1])
+
+    def test_table_pushed_to_the_next_page(self):
+        # Not even one row fits under the spacer, so the whole table moves on
+        table = self.paged_table(3)
+        pages = self.build([Spacer(1, PAGE_SIZE[1] - 2 * PAGE_MARGIN - 40), table])
+        self.assertEqual(table.page_row_counts, [3])
+        self.assertEqual(pages[1].count('Pat Lee'), 3)
+
+    def test_no_rows_prints_the_header(self):
+        self.assertFalse(self.paged_table(0).has_rows)
+        student = StudentProfile(first_name='Student', last_name='Empty')
+        parent = ParentProfile(user=AccountUser(first_name='Pat', last_name='Lee'))
+        ledger = StudentHoursLedger(student=student)
+        pdf = pdf_export_service.generate_driving_hours_pdf(student, None, parent, ledger, session_rows=[])
+        text = PdfReader(BytesIO(pdf)).pages[0].extract_text()
+        self.assertEqual(text.count('Approved By'), 1)
+
+    def test_shared_blocks_survive_being_pushed_to_the_next_page(self):
+        # Each report draws its own copy of a shared block, so one pushed to the
+        # next page in one report is laid out normally in the next
+        for _ in range(2):
+            pages = self.build([Spacer(1, PAGE_SIZE[1] - 2 * PAGE_MARGIN - 40), copy(self.template.certification)])
+            self.assertIn('Certification', pages[1])
+
+
+class TripExportTests(TestCase):
+    '''
+    Trip exports stream the parent's own students' completed trips, in CSV or JSON Lines.
+    '''
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = AccountUser.objects.create_user(
+            email='parent@example.com', password='password', user_type='PARENT', first_name='Pat "PJ"', last_name='Lee, Jr.',
+        )
+        cls.parent = ParentProfile.objects.get(user=cls.user)
+        cls.student = StudentProfile.objects.create(first_name='Ann, Marie', last_name='O"Neil')
+        ParentStudentRelationship.objects.create(parent=cls.parent, student=cls.student)
+        other_user = AccountUser.objects.create_user(email='other@example.com', password='password', user_type='PARENT')
+        other_parent = ParentProfile.objects.get(user=other_user)
+        cls.other_student = StudentProfile.objects.create(first_name='Dee', last_name='Other')
+        ParentStudentRelationship.objects.create(parent=other_parent, student=cls.other_student)
+
+        start = timezone.make_aware(datetime(2026, 6, 1, 10, 0))
+        for day, approved in enumerate([True, False, True]):
+            trip_start = start + timedelta(days=day)
+            Trip.objects.create(
+                parent=cls.parent, student=cls.student, start_time=trip_start,
+                end_time=trip_start + timedelta(minutes=45), is_approved=approved,
+            )
+        # A running timer and another parent's student are never exported
+        Trip.objects.create(parent=cls.parent, student=cls.student, start_time=start + timedelta(days=5), is_active=True)
+        Trip.objects.create(
+            parent=other_parent, student=cls.other_student, start_time=start, end_time=start + timedelta(minutes=45),
+        )
+
+    def setUp(self):
+        cache.clear()
+        self.client.force_login(self.user)
+
+    def export(self, export_format):
+        response = self.client.get(reverse('export_trips', args=[export_format]))
+        self.assertEqual(response.status_code, 200)
+        return b''.join(response.streaming_content).decode()
+
+    def test_csv(self):
+        rows = list(csv.DictReader(StringIO(self.export('csv'))))
+        self.assertEqual(len(rows), 3)
+        self.assertEqual(tuple(rows[0]), TRIP_EXPORT_COLUMNS)
+        self.assertEqual({row['student_name'] for row in rows}, {'Ann, Marie O"Neil'})
+        self.assertEqual([row['approved_by'] for row in rows], ['Pat "PJ" Lee, Jr.', '', 'Pat "PJ" Lee, Jr.'])
+        self.assertEqual([row['parent_name'] for row in rows], ['Pat "PJ" Lee, Jr.'] * 3)
+
+    def test_json_lines(self):
+        rows = [json.loads(line) for line in self.export('jsonl').splitlines()]
+        self.assertEqual([row['student_id'] for row in rows], [self.student.id] * 3)
+        self.assertEqual(rows[0]['student_name'], 'Ann, Marie O"Neil')
+        self.assertEqual([row['approved_by'] for row in rows], ['Pat "PJ" Lee, Jr.', None, 'Pat "PJ" Lee, Jr.'])
+
+    def test_rows_are_streamed_in_chunks(self):
+        pieces = list(iter_trips_csv(get_export_trips([self.student.id]), chunk_size=2))
+        # The header goes out before any row is read, then one piece per chunk
+        self.assertEqual(pieces[0], ','.join(TRIP_EXPORT_COLUMNS) + '\r\n')
+        self.assertEqual([piece.count('\r\n') for piece in pieces[1:]], [2, 1])
+
+    def test_other_parents_student_is_refused(self):
+        response = self.client.get(reverse('export_student_trips', args=[self.other_student.id, 'csv']))
+        self.assertEqual(response.status_code, 403)
+
+    def test_unknown_format(self):
+        self.assertEqual(self.client.get(reverse('export_trips', args=['xml'])).status_code, 404)